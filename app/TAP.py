@@ -0,0 +1,201 @@
+"""TAP, the Text Adventure Parser, sorts the words of a sentence into parts of
+speech so that "Throw Dirty rock at that mangey old goblin" is understood as
+the verb "throw", the adjective "dirty", the noun "rock", the preposition
+"at" and the object "goblin".
+
+The vocabulary is kept in a trie of words, so entries can be several words
+long ("fishing pole") and each word of a sentence is looked at once, however
+large the vocabulary grows.
+"""
+import re
+
+ADJECTIVE = "adjective"
+COMMAND = "command"
+NOUN = "noun"
+PREPOSITION = "preposition"
+VERB = "verb"
+
+PARTS_OF_SPEECH = (ADJECTIVE, COMMAND, NOUN, PREPOSITION, VERB)
+
+# A word is a run of letters, digits and apostrophes.
+WORD = re.compile(r"[\w']+")
+
+
+class GameDictionary:
+    """The words the game understands, and their parts of speech.  A word can
+    have more than one part of speech ("light" is a verb and an adjective)."""
+
+    def __init__(self, adjectives=(), commands=(), nouns=(), prepositions=(), verbs=()):
+        # The root of the trie.  Each node is a dictionary mapping from a word
+        # to the next node; the key None holds the parts of speech of the
+        # entry that ends at that node.
+        self.root = {}
+        self.size = 0
+        self.add_words(ADJECTIVE, adjectives)
+        self.add_words(COMMAND, commands)
+        self.add_words(NOUN, nouns)
+        self.add_words(PREPOSITION, prepositions)
+        self.add_words(VERB, verbs)
+
+    def add_words(self, part_of_speech, entries):
+        """Add entries (each one or more words) with a part of speech."""
+        for entry in entries:
+            words = WORD.findall(entry.lower())
+            if not words:
+                continue
+            node = self.root
+            for word in words:
+                node = node.setdefault(word, {})
+            tags = node.get(None)
+            if tags is None:
+                tags = node[None] = set()
+                self.size += 1
+            tags.add(part_of_speech)
+
+    def merge(self, other):
+        """Add every entry of another GameDictionary to this one, for example
+        to combine the vocabularies of several adventures."""
+        for words, tags in other.entries():
+            for tag in tags:
+                self.add_words(tag, [" ".join(words)])
+        return self
+
+    def entries(self):
+        """Yields (words, parts of speech) for every entry."""
+        stack = [((), self.root)]
+        while stack:
+            words, node = stack.pop()
+            for word, child in node.items():
+                if word is None:
+                    yield words, frozenset(child)
+                else:
+                    stack.append((words + (word,), child))
+
+    def longest_entry(self, words, start):
+        """Returns (length, parts of speech) of the longest entry that begins at
+        words[start], or (0, None) if no entry does."""
+        node = self.root
+        best_length, best_tags = 0, None
+        position = start
+        while position < len(words):
+            node = node.get(words[position])
+            if node is None:
+                break
+            position += 1
+            if None in node:
+                best_length, best_tags = position - start, node[None]
+        return best_length, best_tags
+
+    def __contains__(self, entry):
+        words = WORD.findall(entry.lower())
+        return bool(words) and self.longest_entry(words, 0)[0] == len(words)
+
+    def __len__(self):
+        return self.size
+
+
+class ParsedInput:
+    """The result of parsing a sentence.  The noun is the direct object and the
+    object is the indirect object that follows the preposition."""
+
+    def __init__(self, sentence):
+        self.sentence = sentence
+        self.command = None
+        self.verb = None
+        self.adjectives = []
+        self.noun = None
+        self.preposition = None
+        self.object_adjectives = []
+        self.object = None
+        # Words that aren't in the dictionary ("that", "mangey", "old")
+        self.unknown = []
+
+    def canonical(self):
+        """Returns the sentence rewritten with only the words the game knows,
+        such as "throw rock at goblin", or None if it has no verb or command."""
+        if self.command:
+            return self.command
+        if not self.verb:
+            return None
+        words = [self.verb]
+        if self.noun:
+            words.append(self.noun)
+        if self.preposition and self.object:
+            words.extend([self.preposition, self.object])
+        return " ".join(words)
+
+    def __repr__(self):
+        fields = ["%s=%r" % (name, getattr(self, name))
+                  for name in ("command", "verb", "adjectives", "noun", "preposition",
+                               "object_adjectives", "object", "unknown")
+                  if getattr(self, name)]
+        return "ParsedInput(%s)" % ", ".join(fields)
+
+
+class InputParser:
+    """Parses sentences using a GameDictionary."""
+
+    def __init__(self, game_dictionary):
+        self.game_dictionary = game_dictionary
+
+    def parse_input(self, sentence):
+        """Tag the words of a sentence in a single pass and return a ParsedInput.
+        Entries are matched longest first.  When a word has several parts of
+        speech, the one that fits its place in the sentence is used: a verb
+        first, then adjectives and a noun, then a preposition and its object."""
+        parsed = ParsedInput(sentence)
+        words = WORD.findall(sentence.lower())
+        position = 0
+        while position < len(words):
+            length, tags = self.game_dictionary.longest_entry(words, position)
+            if not length:
+                parsed.unknown.append(words[position])
+                position += 1
+                continue
+            entry = " ".join(words[position:position + length])
+            position += length
+            after_preposition = parsed.preposition is not None
+            if COMMAND in tags and position == length and position == len(words):
+                parsed.command = entry
+            elif VERB in tags and parsed.verb is None and parsed.noun is None:
+                parsed.verb = entry
+            elif PREPOSITION in tags and parsed.preposition is None and parsed.verb is not None:
+                parsed.preposition = entry
+            elif NOUN in tags and (ADJECTIVE not in tags or self.ends_noun_phrase(words, position)):
+                if after_preposition:
+                    parsed.object = entry
+                elif parsed.noun is None:
+                    parsed.noun = entry
+                else:
+                    parsed.unknown.append(entry)
+            elif ADJECTIVE in tags:
+                (parsed.object_adjectives if after_preposition else parsed.adjectives).append(entry)
+            else:
+                parsed.unknown.append(entry)
+        return parsed
+
+    def ends_noun_phrase(self, words, position):
+        """True if the word before position, which could be an adjective or a
+        noun, is a noun because no noun follows it."""
+        length, tags = self.game_dictionary.longest_entry(words, position)
+        return not length or NOUN not in tags
+
+
+# Prepositions that commands in most adventures use.
+COMMON_PREPOSITIONS = ["about", "above", "at", "from", "in", "into", "on", "onto", "to",
+                       "under", "with"]
+
+
+def dictionary_for_world(world, verbs=("examine", "take", "get", "drop", "look", "go")):
+    """Build a GameDictionary from a world (anything with a list of items, such
+    as a WorldTemplate).  Item names and aliases are nouns, and the first
+    word of every special command is a verb."""
+    dictionary = GameDictionary(prepositions=COMMON_PREPOSITIONS, verbs=verbs,
+                                commands=["inventory", "look", "quit"])
+    for item in world.items:
+        dictionary.add_words(NOUN, (item.name,) + tuple(getattr(item, "aliases", ())))
+        for command in item.get_commands():
+            words = WORD.findall(command.lower())
+            if words:
+                dictionary.add_words(VERB, [words[0]])
+    return dictionary
@@ -0,0 +1,47 @@
+"""A text adventure engine, and Action Castle, the adventure built with it.
+
+The names below can be imported straight from the package:
+
+    from app import build_game, Parser
+    game = build_game()
+    Parser(game).parse_command("look")
+
+Each one is imported from its module the first time it is used, so
+importing the package costs nothing and doesn't start a game.
+"""
+
+# Dictionary mapping from each public name to the module that defines it
+_EXPORTS = {
+    "Game": "game",
+    "Item": "items",
+    "Location": "locations",
+    "Parser": "class_parser",
+    "WorldTemplate": "world",
+    "build_game": "action_castle",
+    "build_world": "action_castle",
+    "load_world": "world_loader",
+    "WorldFormatError": "world_loader",
+    "generate_world": "generator",
+    "PagedWorld": "paged_world",
+    "MemorySink": "output",
+    "StdoutSink": "output",
+    "SessionManager": "server",
+    "TurnMetrics": "instrumentation",
+    "Journal": "journal",
+    "solve": "solver",
+}
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError("module %r has no attribute %r" % (__name__, name))
+    from importlib import import_module
+    value = getattr(import_module("." + _EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
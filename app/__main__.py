@@ -0,0 +1,4 @@
+"""Play Action Castle: python -m app"""
+from .action_castle import main
+
+main()
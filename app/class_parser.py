@@ -1,4 +1,60 @@
-from game import Game
+import time
+
+from .fuzzy import BKTree, tolerance
+from .locations import DIRECTION_ABBREVIATIONS
+from .navigation import Navigator
+from .nouns import tokenize
+
+# Commands that are recognised as a whole, mapped to their intent.
+PHRASE_INTENTS = {
+    "look": "redescribe",
+    "l": "redescribe",
+    "inventory": "inventory",
+    "i": "inventory",
+}
+
+# Verbs that take an object, keyed by the first word of the command.
+VERB_INTENTS = {
+    "examine": "examine",
+    "x": "examine",
+    "take": "take",
+    "get": "take",
+    "drop": "drop",
+}
+
+# Intents that depend only on the words of a command, not on the state of the
+# game, so a sequence can classify a repeated command once.
+STATIC_INTENTS = {"redescribe", "inventory", "examine", "take", "drop", "travel"}
+
+# Intents that are about an item, which is found (resolved) before the
+# command is carried out.
+RESOLVED_INTENTS = {"examine", "take", "drop", "special"}
+
+# A BKTree of the verbs, for correcting misspelled ones.
+VERBS = BKTree(VERB_INTENTS)
+
+# The most corrections a Parser remembers for one location, so that a flood
+# of garbage commands can't use up memory.
+MAX_CORRECTIONS = 256
+
+# Ways of asking to travel to a place the player has been before.
+TRAVEL_PREFIXES = ("go to ", "travel to ", "walk to ", "return to ")
+
+# Every accepted spelling of the standard directions, used to recognise a move
+# in a direction that has no exit.
+DIRECTION_ALIASES = {}
+for _direction in list(DIRECTION_ABBREVIATIONS) + ["in", "out"]:
+    for _name in (_direction, DIRECTION_ABBREVIATIONS.get(_direction)):
+        if _name:
+            DIRECTION_ALIASES[_name] = _direction
+            DIRECTION_ALIASES["go " + _name] = _direction
+del _direction, _name
+
+
+def normalize_command(command):
+    """Lowercase a command and collapse its whitespace."""
+    return " ".join(command.lower().split())
+
 
 class Parser:
     """The Parser is the class that handles the player's input.  The player 
@@ -7,42 +63,232 @@ class Parser:
     is reflected in the simulated world...
     """
   
-    def __init__(self, game):
+    def __init__(self, game, input_parser=None):
         # A list of all of the commands that the player has issued.
         self.command_history = []
         # A pointer to the game.
         self.game = game
+        # An optional TAP.InputParser.  Commands that aren't understood as typed
+        # are reduced to the words it knows ("please take the old lantern"
+        # becomes "take lantern") and tried again.
+        self.input_parser = input_parser
+        # Finds routes for "go to <place>".
+        self.navigator = Navigator(game)
+        # A BKTree of the commands that make sense where the player is, and
+        # the (location, scope version) it was built for.  Used to correct
+        # misspelled commands.
+        self._known_commands = None
+        self._known_commands_key = None
+        # Dictionary mapping from a command to its correction (or None) for
+        # the same (location, scope version)
+        self._corrections = {}
+        # Turn observers (see instrumentation.py).  Turns are only timed while
+        # there is at least one.
+        self.observers = []
 
-    def get_player_intent(self,command):
-        command = command.lower()
+    def get_player_intent(self, command):
+        """Classify a command.  The command is tokenized once and the intent is
+        resolved through hash lookups: whole-command phrases (directions, look,
+        inventory), then the leading verb, then the game's index of the special
+        commands in scope."""
         if "," in command:
             # Let the player type in a comma separted sequence of commands
             return "sequence"
-        elif self.get_direction(command):
+        command = normalize_command(command)
+        if command in PHRASE_INTENTS:
+            return PHRASE_INTENTS[command]
+        if self.get_direction(command):
             # Check for the direction intent
             return "direction"
-        elif command.lower() == "look" or command.lower() == "l":
-            # when the user issues a "look" command, re-describe what they see
-            return "redescribe"
-        elif "examine " in command or command.lower().startswith("x "):
-            return "examine"
-        elif  "take " in command or "get " in command:
-            return "take"
-        elif "drop " in command:
-            return "drop"
-        elif "inventory" in command or command.lower() == "i":
-            return "inventory"
-        else: 
-            for item in self.game.get_items_in_scope():
-                special_commands = item.get_commands()
-                for special_command in special_commands:
-                    if command == special_command.lower():
-                        return "special"
+        if command.startswith(TRAVEL_PREFIXES):
+            return "travel"
+        verb, _, rest = command.partition(" ")
+        if rest and verb in VERB_INTENTS:
+            return VERB_INTENTS[verb]
+        if command in self.game.special_commands:
+            return "special"
+        return None
 
     def parse_command(self, command):
         # add this command to the history
         self.command_history.append(command)
+        if self.observers:
+            return self.parse_observed_command(command)
+
+        intent, command = self.classify(command)
+        end_game = self.dispatch(intent, command)
+        self.game.output.flush()
+        return end_game
+
+    def add_observer(self, observer):
+        """Start telling a TurnObserver about every turn."""
+        self.observers.append(observer)
+
+    def remove_observer(self, observer):
+        self.observers.remove(observer)
+
+    def parse_observed_command(self, command):
+        """parse_command, timing each phase of the turn and reporting it to
+        the observers."""
+        from .instrumentation import Turn
+        for observer in self.observers:
+            observer.before_turn(self, command)
+        turn = Turn(command)
+        clock = time.perf_counter_ns
+        started = clock()
+        turn.intent, command = self.classify(command)
+        classified = clock()
+        resolution = None
+        if turn.intent in RESOLVED_INTENTS:
+            resolution = self.resolve(turn.intent, command)
+            turn.item, _, turn.preconditions_met = resolution
+        resolved = clock()
+        turn.end_game = self.dispatch(turn.intent, command, resolution)
+        executed = clock()
+        self.game.output.flush()
+        rendered = clock()
+        turn.phases = {"classify": classified - started, "resolve": resolved - classified,
+                       "execute": executed - resolved, "render": rendered - executed}
+        for observer in self.observers:
+            observer.after_turn(self, turn)
+        return turn.end_game
+
+    def resolve(self, intent, command):
+        """Returns (item, special command, preconditions met) for a command with
+        one of the RESOLVED_INTENTS: the item it is about, or None, and for
+        special commands the command and whether the item's preconditions are
+        met (None otherwise).  Nothing in the game changes, but a misspelled
+        item name is corrected, and the correction is shown."""
+        if intent == "examine":
+            # check whether any of the items at this location or in the
+            # inventory match the command; the longest match wins
+            words = tokenize(command)
+            item, length = self.game.find_item_at(words)
+            inventory_item, inventory_length = self.game.find_item_in_inventory(words)
+            if inventory_length > length:
+                item, length = inventory_item, inventory_length
+            item = self.find_misspelled_item(words, (item, length),
+                                             (self.game.noun_index_at(), self.game.inventory_noun_index()))
+            return item, None, None
+        if intent == "take":
+            # an item at this location, or else one already in the inventory
+            words = tokenize(command)
+            item, length = self.game.find_item_at(words)
+            inventory_item, inventory_length = self.game.find_item_in_inventory(words)
+            if inventory_length > length:
+                # The inventory item has the longer name, so it's the one meant.
+                return inventory_item, None, None
+            item = self.find_misspelled_item(words, (item, length), (self.game.noun_index_at(),))
+            return item or inventory_item, None, None
+        if intent == "drop":
+            words = tokenize(command)
+            item = self.find_misspelled_item(words, self.game.find_item_in_inventory(words),
+                                             (self.game.inventory_noun_index(),))
+            return item, None, None
+        if intent == "special":
+            match = self.game.find_special_command(normalize_command(command))
+            if match:
+                item, special_command = match
+                function, arguments, preconditions = item.commands[special_command]
+                return item, special_command, preconditions.check(self.game)
+        return None, None, None
+
+    def classify(self, command, cache=None):
+        """Returns (intent, command) for a command.  If the command isn't
+        understood as typed and there is a TAP input parser, the command is
+        replaced by its canonical form.  When a cache dictionary is given,
+        classifications that don't depend on where the player is or what is
+        in scope (phrases, standard directions, verbs, travel) are kept in it
+        and reused for the same command, along with any correction shown
+        for it."""
+        if cache is not None and command in cache:
+            intent, classified, correction = cache[command]
+            if correction is not None:
+                self.game.say(correction)
+            return intent, classified
+        intent = self.get_player_intent(command)
+        classified = command
+        correction = None
+        if intent is None and self.input_parser is not None:
+            canonical = self.input_parser.parse_input(command).canonical()
+            if canonical:
+                intent = self.get_player_intent(canonical)
+                if intent is not None:
+                    classified = canonical
+        if intent is None:
+            corrected = self.correct_command(command)
+            if corrected is not None:
+                intent = self.get_player_intent(corrected)
+                if intent is not None:
+                    correction = "(%s)" % corrected
+                    self.game.say(correction)
+                    classified = corrected
+        if cache is not None and (intent in STATIC_INTENTS or
+                                  (intent == "direction" and normalize_command(classified) in DIRECTION_ALIASES)):
+            cache[command] = (intent, classified, correction)
+        return intent, classified
 
+    def correct_command(self, command):
+        """Returns the command the player probably meant by a command that
+        wasn't understood, or None.  The whole command is matched against the
+        phrases, exits and special commands that make sense here, allowing a
+        few typos; failing that, a misspelled verb is corrected.  Corrections
+        (and failures to correct) are remembered until the player moves or
+        the items in scope change."""
+        command = normalize_command(command)
+        limit = tolerance(command)
+        if not limit:
+            return None
+        key = (self.game.curr_location, self.game.scope_version)
+        if self._known_commands_key != key:
+            self._known_commands = BKTree(list(PHRASE_INTENTS) + list(DIRECTION_ALIASES)
+                                          + list(self.game.curr_location.exit_names())
+                                          + list(self.game.special_commands))
+            self._known_commands_key = key
+            self._corrections = {}
+        if command in self._corrections:
+            return self._corrections[command]
+        corrected = self._known_commands.best(command, limit)
+        if corrected is None:
+            verb, _, rest = command.partition(" ")
+            if rest:
+                verb = VERBS.best(verb, tolerance(verb))
+                if verb is not None:
+                    corrected = verb + " " + rest
+        if len(self._corrections) < MAX_CORRECTIONS:
+            self._corrections[command] = corrected
+        return corrected
+
+    def find_misspelled_item(self, words, found, noun_indexes):
+        """Returns the item named in a command's words (after the verb), allowing
+        a few typos, when the exact match `found` (item, number of words)
+        doesn't account for all of them.  noun_indexes are the NounIndexes to
+        look in.  Returns the exact match if no single closer name is found."""
+        item, length = found
+        nouns = words[1:]
+        if length >= len(nouns):
+            return item
+        best = None
+        tied = False
+        for index in noun_indexes:
+            candidate, candidate_length, distance = index.find_misspelled(nouns, min_words=length + 1)
+            if candidate is None:
+                continue
+            rank = (distance, -candidate_length)
+            if best is None or rank < best[0]:
+                best = (rank, candidate)
+                tied = False
+            elif rank == best[0] and candidate is not best[1]:
+                tied = True
+        if best is None or tied:
+            return item
+        self.game.say("(%s)" % best[1].name)
+        return best[1]
+
+    def dispatch(self, intent, command, resolution=None):
+        """Carry out a classified command.  resolution is what resolve returned
+        for the command, if it has already been resolved.  Returns True if the
+        game has ended."""
         # By default, none of the intents end the game. The following are ways this
         # flag can be changed to True.
         # * Going to a certain place.
@@ -50,27 +296,30 @@ class Parser:
         # * Picking up a certain object.
 
         end_game = False
+        if resolution is None and intent in RESOLVED_INTENTS:
+            resolution = self.resolve(intent, command)
 
         # Intents are functions that can be executed
-        intent = self.get_player_intent(command)
         if intent == "direction":
             end_game = self.go_in_direction(command)
+        elif intent == "travel":
+            end_game = self.travel(command)
         elif intent == "redescribe":
             self.game.describe()
         elif intent == "examine":
-            self.examine(command)
+            self.examine(resolution[0])
         elif intent == "take":
-            end_game = self.take(command)
+            end_game = self.take(resolution[0])
         elif intent == "drop":
-            self.drop(command)
+            self.drop(resolution[0])
         elif intent == "inventory":
             self.check_inventory(command)
         elif intent == "special":
-            end_game = self.run_special_command(command)
+            end_game = self.run_special_command(*resolution)
         elif intent == "sequence":
             end_game = self.execute_sequence(command)
         else:
-            print("I'm not sure what you want to do.")
+            self.game.say("I'm not sure what you want to do.")
         return end_game
 
     ### Intent Functions ###
@@ -83,7 +332,7 @@ class Parser:
             if direction in self.game.curr_location.connections:
                 if self.game.curr_location.is_blocked(direction, self.game):
                     # check to see whether that direction is blocked.
-                    print(self.game.curr_location.get_block_description(direction))
+                    self.game.say(self.game.curr_location.get_block_description(direction))
                 else:
                     # if it's not blocked, then move there 
                     self.game.curr_location = self.game.curr_location.connections[direction]
@@ -95,131 +344,123 @@ class Parser:
                     else:
                         self.game.describe()
             else:
-                print("You can't go %s from here." % direction.capitalize())
+                self.game.say("You can't go %s from here." % direction.capitalize())
+        return self.game.curr_location.end_game
+
+    def travel(self, command):
+        """ The user wants to go to a place they have been before """
+        command = normalize_command(command)
+        place_name = command.split(" to ", 1)[1]
+        destination = self.navigator.find_place(place_name)
+        if destination is None:
+            self.game.say("You don't know the way to %s." % place_name)
+        elif destination is self.game.curr_location:
+            self.game.say("You are already here.")
+        else:
+            route = self.navigator.route(self.game.curr_location, destination)
+            if route is None:
+                self.game.say("You can't find a way to get there from here.")
+            else:
+                travelled = []
+                for direction in route:
+                    location = self.game.curr_location
+                    if location.is_blocked(direction, self.game):
+                        break
+                    self.game.curr_location = location.connections[direction]
+                    travelled.append(direction)
+                if travelled:
+                    self.game.say("You travel %s." % ", ".join(travelled))
+                if len(travelled) < len(route):
+                    # Something is in the way, so the player stops in front of it.
+                    self.game.say(location.get_block_description(direction))
+                if travelled:
+                    if self.game.curr_location.end_game:
+                        self.game.describe_current_location()
+                    else:
+                        self.game.describe()
         return self.game.curr_location.end_game
 
     def check_inventory(self,command):
         """ The player wants to check their inventory"""
         if len(self.game.inventory) == 0:
-            print("You don't have anything.")
+            self.game.say("You don't have anything.")
         else:
             descriptions = []
             for item_name in self.game.inventory:
                 item = self.game.inventory[item_name]
                 descriptions.append(item.description)
-            print("You have: ", end = '')
-            print(*descriptions, sep = ", ",)
+            self.game.say("You have: " + ", ".join(descriptions))
   
 
-    def examine(self, command):
-        """ The player wants to examine something """
-        command = command.lower()
-        matched_item = False
-        # check whether any of the items at this location match the command
-        for item_name in self.game.curr_location.items:
-            if item_name in command:
-                item = self.game.curr_location.items[item_name]
-                if item.examine_text:
-                    print(item.examine_text)
-                    matched_item = True
-                break
-        # check whether any of the items in the inventory match the command
-        for item_name in self.game.inventory:
-            if item_name in command:
-                item = self.game.inventory[item_name]
-                if item.examine_text:
-                    print(item.examine_text)
-                    matched_item = True
-        # fail
-        if not matched_item:
-            print("You don't see anything special.")
+    def examine(self, item):
+        """ The player wants to examine something (see resolve) """
+        if item and item.examine_text:
+            self.game.say(item.examine_text)
+        else:
+            # fail
+            self.game.say("You don't see anything special.")
 
 
-    def take(self, command):
-        """ The player wants to put something in their inventory """
-        command = command.lower()
-        matched_item = False
+    def take(self, item):
+        """ The player wants to put something in their inventory (see resolve) """
 
         # This gets set to True if posession of this object ends the game.
         end_game = False
 
-        # check whether any of the items at this location match the command
-        for item_name in self.game.curr_location.items:
-            if item_name in command:
-                item = self.game.curr_location.items[item_name]
-                if item.gettable:
-                    self.game.add_to_inventory(item)
-                    self.game.curr_location.remove_item(item)
-                    print(item.take_text)
-                    end_game = item.end_game
-                else:
-                    print("You cannot take the %s." % item_name)
-                matched_item = True
-                break
-        # check whether any of the items in the inventory match the command
-        if not matched_item:
-            for item_name in self.game.inventory:
-                if item_name in command:
-                    print("You already have the %s." % item_name)
-                    matched_item = True
-        # fail
-        if not matched_item:
-            print("You can't find it.")
+        if item is None:
+            # fail
+            self.game.say("You can't find it.")
+        elif self.game.items_at().get(item.name) is not item:
+            # the item is already in the inventory
+            self.game.say("You already have the %s." % item.name)
+        elif item.gettable:
+            self.game.add_to_inventory(item)
+            self.game.remove_item_from_location(item)
+            self.game.say(item.take_text)
+            end_game = item.end_game
+        else:
+            self.game.say("You cannot take the %s." % item.name)
 
         return end_game
 
-    def drop(self, command):
-        """ The player wants to remove something from their inventory """
-        command = command.lower()
-        matched_item = False
-        # check whether any of the items in the inventory match the command
-        if not matched_item:
-            for item_name in self.game.inventory:
-                if item_name in command:
-                    matched_item = True
-                    item = self.game.inventory[item_name]
-                    self.game.curr_location.add_item(item_name, item)
-                    self.game.inventory.pop(item_name)
-                    print("You drop the %s." % item_name)
-                    break
-        # fail
-        if not matched_item:
-            print("You don't have that.")
-
-
-    def run_special_command(self, command):
+    def drop(self, item):
+        """ The player wants to remove something from their inventory (see resolve) """
+        if item:
+            self.game.remove_from_inventory(item)
+            self.game.add_item_to_location(item)
+            self.game.say("You drop the %s." % item.name)
+        else:
+            # fail
+            self.game.say("You don't have that.")
+
+
+    def run_special_command(self, item, special_command, preconditions_met):
         """Run a special command associated with one of the items in this location
-        or in the player's inventory"""
-        for item in self.game.get_items_in_scope():
-            special_commands = item.get_commands()
-            for special_command in special_commands:
-                if command == special_command.lower():
-                    return item.do_action(special_command, self.game)
+        or in the player's inventory (see resolve)"""
+        if item:
+            return item.do_action(special_command, self.game, preconditions_met)
 
     def execute_sequence(self, command):
-        for cmd in command.split(","):
-            cmd = cmd.strip()
-            self.parse_command(cmd)
+        """ Run a comma separated sequence of commands as one turn.  The
+        sequence is recorded in the history once, its output is flushed once,
+        and it stops at the first command that ends the game. """
+        parts = [part.strip() for part in command.split(",")]
+        cache = {}
+        for part in parts:
+            if not part:
+                continue
+            intent, part = self.classify(part, cache)
+            if self.dispatch(intent, part):
+                return True
+        return False
 
     def get_direction(self, command):
-        command = command.lower()
-        if command == "n" or "north" in command:
-            return "north" 
-        if command == "s" or "south" in command:
-            return "south"
-        if command == "e" or "east" in command: 
-            return "east"
-        if command == "w" or "west" in command:
-            return "west"
-        if command == "up":
-            return "up"
-        if command == "down":
-            return "down"
-        if command.startswith("go out"):
-            return "out"
-        if command.startswith("go in"):
-            return "in"
-        for exit in self.game.curr_location.connections.keys():
-            if command == exit.lower() or command == "go " + exit.lower():
-                return exit
-        return None
\ No newline at end of file
+        """Returns the direction named by the command, or None.  Only whole
+        commands match: "n", "north" and "go north" all name north, but
+        "northeast" does not.  The exits of the current location are checked
+        first, so custom exits like "out" or "ladder" work too."""
+        command = normalize_command(command)
+        direction = self.game.curr_location.resolve_exit(command)
+        if direction is None:
+            direction = DIRECTION_ALIASES.get(command)
+        return direction
@@ -0,0 +1,132 @@
+"""Typo-tolerant matching.
+
+A BKTree holds a set of strings (special commands, exits, item names) and
+finds the ones within a given edit distance of a misspelled string without
+comparing it to every one: each node's children are filed by their distance
+from the node, and the triangle inequality rules out whole subtrees.
+"""
+
+
+def edit_distance(a, b):
+    """Returns the Damerau-Levenshtein distance between two strings: the number
+    of single character insertions, deletions, substitutions and swaps of
+    two characters that turn one into the other.  Unlike the restricted
+    version, this is a true metric, which the BKTree relies on."""
+    # The row of the last character of a where each character was seen
+    last_row = {}
+    infinity = len(a) + len(b)
+    # distances[i + 1][j + 1] is the distance between a[:i] and b[:j]
+    distances = [[infinity] * (len(b) + 2)]
+    distances.append([infinity] + list(range(len(b) + 1)))
+    for i in range(1, len(a) + 1):
+        distances.append([infinity, i] + [0] * len(b))
+        # The last column in this row where a[i - 1] matched
+        last_match = 0
+        for j in range(1, len(b) + 1):
+            k = last_row.get(b[j - 1], 0)
+            l = last_match
+            if a[i - 1] == b[j - 1]:
+                cost = 0
+                last_match = j
+            else:
+                cost = 1
+            distances[i + 1][j + 1] = min(distances[i][j] + cost,
+                                          distances[i + 1][j] + 1,
+                                          distances[i][j + 1] + 1,
+                                          distances[k][l] + (i - k - 1) + 1 + (j - l - 1))
+        last_row[a[i - 1]] = i
+    return distances[len(a) + 1][len(b) + 1]
+
+
+def tolerance(text):
+    """Returns how many typos to allow in a string: none in very short words,
+    where almost anything is one typo away from something, and more in
+    longer ones."""
+    if len(text) < 3:
+        return 0
+    if len(text) <= 5:
+        return 1
+    if len(text) <= 10:
+        return 2
+    return 3
+
+
+def letter_counts(text):
+    """Returns a dictionary mapping from each character of text to how many
+    times it appears."""
+    counts = {}
+    for character in text:
+        counts[character] = counts.get(character, 0) + 1
+    return counts
+
+
+class BKTree:
+    """A Burkhard-Keller tree of strings under edit distance."""
+
+    def __init__(self, words=()):
+        # Each node is a (word, children, letter counts) tuple, where children
+        # is a dictionary mapping from a distance to the child node at that
+        # distance
+        self.root = None
+        self.size = 0
+        for word in words:
+            self.add(word)
+
+    def add(self, word):
+        if self.root is None:
+            self.root = (word, {}, letter_counts(word))
+            self.size = 1
+            return
+        node = self.root
+        while True:
+            distance = edit_distance(word, node[0])
+            if distance == 0:
+                return
+            child = node[1].get(distance)
+            if child is None:
+                node[1][distance] = (word, {}, letter_counts(word))
+                self.size += 1
+                return
+            node = child
+
+    def search(self, word, max_distance):
+        """Returns a list of (distance, word) for every word within max_distance
+        of word, closest first."""
+        matches = []
+        if self.root is None:
+            return matches
+        letters = letter_counts(word)
+        pending = [self.root]
+        while pending:
+            node_word, children, node_letters = pending.pop()
+            # Every typo changes the letters of a word by at most one, so the
+            # number of letters that one word has and the other lacks is a
+            # lower bound on their distance.  It is much cheaper to work out,
+            # and when it is too big the node can't match, and the bound is
+            # enough to rule out some of its children.
+            surplus = 0
+            for character, count in node_letters.items():
+                if count > letters.get(character, 0):
+                    surplus += count - letters.get(character, 0)
+            bound = max(surplus, surplus + len(word) - len(node_word))
+            if bound > max_distance:
+                for child_distance, child in children.items():
+                    if child_distance >= bound - max_distance:
+                        pending.append(child)
+                continue
+            distance = edit_distance(word, node_word)
+            if distance <= max_distance:
+                matches.append((distance, node_word))
+            for child_distance, child in children.items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    pending.append(child)
+        matches.sort()
+        return matches
+
+    def best(self, word, max_distance):
+        """Returns the closest word within max_distance of word, or None if
+        there is none or if several are equally close."""
+        matches = self.search(word, max_distance)
+        if not matches or (len(matches) > 1 and matches[1][0] == matches[0][0]):
+            return None
+        return matches[0][1]
@@ -1,5 +1,12 @@
+import json
 import sys,time
 
+from .nouns import NounIndex
+from .output import StdoutSink
+
+# The version of the snapshot format written by Game.snapshot
+SNAPSHOT_VERSION = 1
+
 class Game:
     """The Game class represents the world.  Internally, we use a 
     graph of Location objects and Item objects, which can be at a
@@ -7,69 +14,339 @@ class Game:
     exits which are the directions that a player can move to get to an
     adjacent location. The player can move from one location to another
     location by typing a command like "Go North".
+
+    A Game never changes the Location objects it is played on.  When an item
+    is moved into or out of a location, the game copies that location's items
+    into its own location_items overlay and changes the copy, so any number
+    of games can share one world (see world.WorldTemplate).
     """
 
-    def __init__(self, start_at):
-        # start_at is the location in the game where the player starts
-        self.curr_location = start_at
-        self.curr_location.has_been_visited = True
+    def __init__(self, start_at, output=None, world=None):
+        # The WorldTemplate this game is played in, if any.  Games need one to
+        # be saved and restored.
+        self.world = world
+        # The location where the game started
+        self.start_at = start_at
+        # Where the text of each turn is collected before being flushed.
+        self.output = output if output is not None else StdoutSink()
         # inventory is the set of objects that the player has collected/
         self.inventory = {}
+        # Dictionary mapping from the lowercased text of each special command in
+        # scope to the (item, command) pairs that define it.  It is kept up to
+        # date as items enter and leave the current location and the inventory.
+        self.special_commands = {}
+        # Incremented whenever special_commands changes
+        self.scope_version = 0
+        # Dictionary mapping from Location to this game's copy of the items
+        # there, for the locations whose items have changed during the game.
+        self.location_items = {}
+        # The set of locations the player has been to.
+        self.visited = set()
+        # Set to True by win_game when the player wins.
+        self.won = False
+        # NounIndexes for the inventory and for the locations in location_items,
+        # built when first needed and updated as their items change.
+        self._inventory_nouns = None
+        self._location_nouns = {}
+        # Dictionary mapping from each location in location_items to (key, text)
+        # of its last rendering; dropped when its items change.
+        self._renderings = {}
+        self._curr_location = None
+        # start_at is the location in the game where the player starts
+        self.curr_location = start_at
         # Print the special commands associated with items in the game (helpful 
         # for debugging and for novice players).
         self.print_commands = True
         
 
+    @property
+    def curr_location(self):
+        """The location the player is in."""
+        return self._curr_location
+
+    @curr_location.setter
+    def curr_location(self, location):
+        old_location = self._curr_location
+        if old_location is location:
+            return
+        if old_location is not None:
+            for item in self.items_at(old_location).values():
+                self.item_left_scope(item)
+        self._curr_location = location
+        self.visited.add(location)
+        for item in self.items_at(location).values():
+            self.item_entered_scope(item)
+
+    def items_at(self, location=None):
+        """Returns the dictionary of items at a location (by default the current
+        location) in this game.  Treat it as read-only; use add_item_to_location
+        and remove_item_from_location to change it."""
+        if location is None:
+            location = self._curr_location
+        return self.location_items.get(location, location.items)
+
+    def add_item_to_location(self, item, location=None):
+        """Put an item in a location (by default the current location)."""
+        if location is None:
+            location = self._curr_location
+        items = self._writable_items_at(location)
+        replaced = items.get(item.name)
+        if replaced is item:
+            return
+        items[item.name] = item
+        nouns = self._location_nouns.get(location)
+        if nouns is not None:
+            if replaced is not None:
+                nouns.remove(replaced)
+            nouns.add(item)
+        self._renderings.pop(location, None)
+        if location is self._curr_location:
+            if replaced is not None:
+                self.item_left_scope(replaced)
+            self.item_entered_scope(item)
+
+    def remove_item_from_location(self, item, location=None):
+        """Remove an item from a location (by default the current location)."""
+        if location is None:
+            location = self._curr_location
+        self._writable_items_at(location).pop(item.name)
+        nouns = self._location_nouns.get(location)
+        if nouns is not None:
+            nouns.remove(item)
+        self._renderings.pop(location, None)
+        if location is self._curr_location:
+            self.item_left_scope(item)
+
+    def find_item_at(self, words, location=None):
+        """Returns (item, number of words matched) for the item at a location
+        (by default the current location) named in a list of words."""
+        return self.noun_index_at(location).find(words)
+
+    def find_item_in_inventory(self, words):
+        """Returns (item, number of words matched) for the inventory item named
+        in a list of words."""
+        return self.inventory_noun_index().find(words)
+
+    def noun_index_at(self, location=None):
+        """Returns the NounIndex of the items at a location (by default the
+        current location) in this game."""
+        if location is None:
+            location = self._curr_location
+        if location not in self.location_items:
+            # Nothing has changed here, so use the index shared by every game.
+            return location.get_noun_index()
+        nouns = self._location_nouns.get(location)
+        if nouns is None:
+            nouns = self._location_nouns[location] = NounIndex(self.location_items[location].values())
+        return nouns
+
+    def inventory_noun_index(self):
+        """Returns the NounIndex of the items in the inventory."""
+        if self._inventory_nouns is None:
+            self._inventory_nouns = NounIndex(self.inventory.values())
+        return self._inventory_nouns
+
+    def _writable_items_at(self, location):
+        """Returns this game's own copy of the items at a location, making the
+        copy the first time the location is changed."""
+        items = self.location_items.get(location)
+        if items is None:
+            items = self.location_items[location] = dict(location.items)
+        return items
+
+    def snapshot(self):
+        """Save the game.  Returns bytes holding only what has changed since the
+        start of the game: the player's location, their inventory, the items
+        at every location whose items have changed, and the locations
+        visited.  Locations and items are referred to by their position in
+        the WorldTemplate."""
+        return json.dumps(self.state(), separators=(",", ":")).encode()
+
+    def state(self):
+        """Returns the saved game (see snapshot) as a dictionary."""
+        self._require_world()
+        location_ids = self.world.location_ids
+        item_ids = self.world.item_ids
+        state = {
+            "v": SNAPSHOT_VERSION,
+            "at": location_ids[self.curr_location],
+            "inv": [item_ids[item] for item in self.inventory.values()],
+            "items": {str(location_ids[location]): [item_ids[item] for item in items.values()]
+                      for location, items in self.location_items.items()},
+            "seen": sorted(location_ids[location] for location in self.visited),
+        }
+        if not self.print_commands:
+            state["quiet"] = 1
+        if self.won:
+            state["won"] = 1
+        return state
+
+    def _require_world(self):
+        if self.world is None:
+            raise ValueError("Only a game played in a WorldTemplate can be saved or restored")
+
+    def restore(self, data):
+        """Load a game saved by snapshot, replacing this game's state."""
+        self.restore_state(json.loads(data))
+
+    def restore_state(self, state):
+        """Load a game saved by state, replacing this game's state."""
+        if state.get("v") != SNAPSHOT_VERSION:
+            raise ValueError("Unsupported snapshot version: %r" % state.get("v"))
+        self._require_world()
+        locations = self.world.locations
+        items = self.world.items
+        self.location_items = {}
+        for location_id, item_ids in state["items"].items():
+            self.location_items[locations[int(location_id)]] = {
+                items[i].name: items[i] for i in item_ids}
+        self.visited = {locations[i] for i in state["seen"]}
+        self.print_commands = not state.get("quiet")
+        self.won = bool(state.get("won"))
+        self.inventory = {}
+        self.special_commands = {}
+        self.scope_version += 1
+        self._inventory_nouns = None
+        self._location_nouns = {}
+        self._renderings = {}
+        self._curr_location = None
+        self.curr_location = locations[state["at"]]
+        for i in state["inv"]:
+            self.add_to_inventory(items[i])
+
+    def say(self, *values, sep=" ", end="\n"):
+        """Write some text to the output of the current turn."""
+        self.output.write(*values, sep=sep, end=end)
+
     def describe(self):
         """Describe the current game state by first describing the current 
         location, then listing any exits, and then describing any objects
         in the current location."""
-        self.describe_current_location()
-        self.describe_exits()
-        self.describe_items()
+        self.say(self.render_location(), end="")
+
+    def render_location(self, location=None):
+        """Returns the full description of a location (by default the current
+        location), as shown by describe.  Renderings are cached: with the
+        location, while its items are the ones that start there, or in this
+        game once they have changed.  A rendering is reused until the
+        location's version or the print_commands flag changes."""
+        if location is None:
+            location = self._curr_location
+        key = (location.version, self.print_commands)
+        if location in self.location_items:
+            rendered = self._renderings.get(location)
+        else:
+            rendered = location.rendered
+        if rendered is not None and rendered[0] == key:
+            return rendered[1]
+        items = self.items_at(location)
+        text = location.description + "\n" + self.render_exits(location) + self.render_items(items)
+        if location in self.location_items:
+            self._renderings[location] = (key, text)
+        else:
+            location.rendered = (key, text)
+        return text
+
+    def render_exits(self, location):
+        exits = []
+        for exit in location.connections.keys():
+            exits.append(exit.capitalize())
+        if len(exits) > 0:
+            return "Exits: " + ", ".join(exits) + "\n"
+        return ""
+
+    def render_items(self, items):
+        lines = []
+        if len(items) > 0:
+            lines.append("You see: \n")
+            for item_name in items:
+                item = items[item_name]
+                lines.append(item.description + "\n")
+                if self.print_commands:
+                    special_commands = item.get_commands()
+                    for cmd in special_commands:
+                        lines.append("\t " + cmd + "\n")
+        return "".join(lines)
 
     def describe_current_location(self):
         """Describe the current location by printing its description field."""
-        print(self.curr_location.description)
+        self.say(self.curr_location.description)
 
     def describe_exits(self):
         """List the directions that the player can take to exit from the current
         location."""
-        exits = []
-        for exit in self.curr_location.connections.keys():
-            exits.append(exit.capitalize())
-            if len(exits) > 0:
-                print("Exits: ", end = '')
-                print(*exits, sep = ", ",)
+        self.say(self.render_exits(self.curr_location), end="")
 
     def describe_items(self):
         """Describe what objects are in the current location."""
-        if len(self.curr_location.items) > 0:
-            print("You see: ")
-            for item_name in self.curr_location.items:
-                item = self.curr_location.items[item_name]
-                print(item.description)
-                if self.print_commands:
-                    special_commands = item.get_commands()
-                    for cmd in special_commands:
-                        print('\t', cmd)
+        self.say(self.render_items(self.items_at()), end="")
 
     def add_to_inventory(self, item):
         """Add an item to the player's inventory."""
+        replaced = self.inventory.get(item.name)
+        if replaced is item:
+            return
+        if replaced is not None:
+            self.item_left_scope(replaced)
         self.inventory[item.name] = item
-  
+        if self._inventory_nouns is not None:
+            if replaced is not None:
+                self._inventory_nouns.remove(replaced)
+            self._inventory_nouns.add(item)
+        self.item_entered_scope(item)
+
+    def remove_from_inventory(self, item):
+        """Remove an item from the player's inventory."""
+        self.inventory.pop(item.name)
+        if self._inventory_nouns is not None:
+            self._inventory_nouns.remove(item)
+        self.item_left_scope(item)
+
     def is_in_inventory(self,item):
         return item.name in self.inventory
 
     def get_items_in_scope(self):
         """Returns a list of items in the current location and in the inventory"""
         items_in_scope = []
-        for item_name in self.curr_location.items:
-            items_in_scope.append(self.curr_location.items[item_name])
+        location_items = self.items_at()
+        for item_name in location_items:
+            items_in_scope.append(location_items[item_name])
         for item_name in self.inventory:
             items_in_scope.append(self.inventory[item_name])
         return items_in_scope
 
+    def item_entered_scope(self, item):
+        """Add the special commands of an item that has entered the current
+        location or the inventory to the special command index."""
+        for command in item.get_commands():
+            self.special_commands.setdefault(command.lower(), []).append((item, command))
+        self.scope_version += 1
+
+    def item_left_scope(self, item):
+        """Remove the special commands of an item that has left the current
+        location or the inventory from the special command index."""
+        for command in item.get_commands():
+            key = command.lower()
+            entries = self.special_commands[key]
+            entries.remove((item, command))
+            if not entries:
+                del self.special_commands[key]
+        self.scope_version += 1
+
+    def find_special_command(self, command):
+        """Returns the (item, command) pair for a lowercased special command, or
+        None if no item in scope has it.  Items in the current location take
+        precedence over items in the inventory."""
+        entries = self.special_commands.get(command)
+        if not entries:
+            return None
+        if len(entries) > 1:
+            location_items = self.items_at()
+            for entry in entries:
+                if location_items.get(entry[0].name) is entry[0]:
+                    return entry
+        return entries[0]
+
     '''
     SPECIAL FUNCTIONS
     '''
@@ -77,28 +354,28 @@ class Game:
         """ Add a newly created Item and add it to your inventory."""
         (item, action_description, already_done_description) = args[0]
         if(not game.is_in_inventory(item)):
-            print(action_description)
+            game.say(action_description)
             game.add_to_inventory(item)
         else:
-            print(already_done_description)
+            game.say(already_done_description)
         return False
 
 
     def describe_something(game, *args):
         """Describe some aspect of the Item"""
         (description) = args[0]
-        print(description)
+        game.say(description)
         return False
 
     def destroy_item(game, *args):
         """Removes an Item from the game by setting its location is set to None."""
         (item, action_description) = args[0]
         if game.is_in_inventory(item):
-            game.inventory.pop(item.name)
-            print(action_description)
-        elif item.name in game.curr_location.items:
-            game.curr_location.remove_item(item)
-            print(action_description)
+            game.remove_from_inventory(item)
+            game.say(action_description)
+        elif item.name in game.items_at():
+            game.remove_item_from_location(item)
+            game.say(action_description)
         else:
             Game.print_slow(already_done_description)
         return False
@@ -106,7 +383,14 @@ class Game:
     def end_game(game, *args):
         """Ends the game."""
         end_message = args[0]
-        print(end_message)
+        game.say(end_message)
+        return True
+
+    def win_game(game, *args):
+        """Ends the game with the player winning."""
+        end_message = args[0]
+        game.say(end_message)
+        game.won = True
         return True
 
     def perform_multiple_actions(game, *args):
@@ -118,20 +402,20 @@ class Game:
         '''Removes an Item from the game setting its location is set to None.'''
         (item, action_description, already_done_description) = args[0]
         if game.is_in_inventory(item):
-            game.inventory.pop(item.name)
-            print(action_description)
-        elif item.name in game.curr_location.items:
-            game.curr_location.remove_item(item)
-            print(action_description)
+            game.remove_from_inventory(item)
+            game.say(action_description)
+        elif item.name in game.items_at():
+            game.remove_item_from_location(item)
+            game.say(action_description)
         else:
-            print(already_done_description)
+            game.say(already_done_description)
         return False
 
     def create_item(game, *args):
         '''Adds an Item into the game space at the current locaton.'''
         (item, action_description, already_done_description) = args[0]
-        game.curr_location.add_item(item.name, item)
-        print(action_description)
+        game.add_item_to_location(item)
+        game.say(action_description)
 
 
 '''
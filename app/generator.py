@@ -0,0 +1,171 @@
+"""Procedural world generation.
+
+generate_world_spec builds a random world specification in the world file
+format (see world_loader), so a generated world can be saved as JSON, loaded
+like any hand-written adventure, or built straight into Location and Item
+objects with generate_world.  The same seed always gives the same world.
+"""
+import argparse
+import json
+import random
+import sys
+
+from .locations import REVERSE_DIRECTIONS
+from .world_loader import build_world_from_spec
+
+ADJECTIVES = ["dusty", "damp", "bright", "narrow", "grand", "quiet", "ruined", "secret",
+              "cold", "golden", "mossy", "crooked"]
+PLACES = ["hall", "cellar", "garden", "tower", "library", "chapel", "kitchen", "stable",
+          "vault", "gallery", "crypt", "bridge", "grove", "cave"]
+THINGS = ["lamp", "key", "sword", "book", "coin", "rope", "gem", "map", "shield", "bell",
+          "scroll", "cup", "feather", "stone"]
+VERBS = ["polish", "shake", "read", "ring", "wave", "inspect", "turn", "rub"]
+
+
+def generate_world_spec(size=100, branching=2.0, item_density=1.0, block_density=0.1,
+                        precondition_density=0.5, special_actions=1.0, seed=0, name=None):
+    """Returns a world specification (a dictionary in the world file format).
+
+    size is the number of locations.  branching is the average number of
+    exits per location; every location is reachable from the start along a
+    random spanning tree, and extra connections are added until the average
+    is reached.  item_density is the average number of items per location.
+    block_density is the fraction of connections that are blocked by a
+    boulder until it is smashed with some other item of the world.
+    precondition_density is the fraction of
+    special actions with preconditions, and special_actions is the average
+    number of special actions per item.  The game is won by taking the
+    crown from the last location and claiming it.  Raises a ValueError if
+    size is less than 1."""
+    if size < 1:
+        raise ValueError("A world needs at least one location (size=%r)" % (size,))
+    rng = random.Random(seed)
+    location_keys = ["l%d" % i for i in range(size)]
+    locations = {}
+    for i, key in enumerate(location_keys):
+        place = "%s %s" % (rng.choice(ADJECTIVES), rng.choice(PLACES))
+        locations[key] = {"name": "%s %d" % (place.title(), i),
+                          "description": "You are in a %s." % place}
+
+    # Each location's free directions, so that no exit is used twice.
+    free = {key: list(REVERSE_DIRECTIONS) for key in location_keys}
+    connections = []
+
+    def connect(origin, destination):
+        for direction in rng.sample(free[origin], len(free[origin])):
+            if REVERSE_DIRECTIONS[direction] in free[destination]:
+                free[origin].remove(direction)
+                free[destination].remove(REVERSE_DIRECTIONS[direction])
+                connections.append([origin, direction, destination])
+                return True
+        return False
+
+    # A random spanning tree makes every location reachable.
+    for i in range(1, size):
+        destination = location_keys[i]
+        if not any(connect(location_keys[rng.randrange(max(0, i - 8), i)], destination) for _ in range(4)):
+            # The nearby locations are full; use the first one with room.
+            for origin in reversed(location_keys[:i]):
+                if connect(origin, destination):
+                    break
+    # Extra connections, two exits each, up to the branching factor.
+    extra = int(size * branching / 2) - len(connections)
+    for _ in range(max(0, extra) * 2):
+        if extra <= 0:
+            break
+        origin, destination = rng.choice(location_keys), rng.choice(location_keys)
+        if origin != destination and connect(origin, destination):
+            extra -= 1
+
+    items = {}
+    item_count = int(size * item_density)
+    for i in range(item_count):
+        key = "i%d" % i
+        thing = "%s %s" % (rng.choice(ADJECTIVES), rng.choice(THINGS))
+        items[key] = {"name": "%s%d" % (thing.split()[1], i),
+                      "description": "a %s" % thing,
+                      "examine_text": "IT IS A %s." % thing.upper(),
+                      "start_at": rng.choice(location_keys)}
+
+    item_keys = list(items)
+    for key in item_keys:
+        item = items[key]
+        count = int(special_actions) + (rng.random() < special_actions % 1)
+        actions = {}
+        for verb in rng.sample(VERBS, min(count, len(VERBS))):
+            action = {"function": "describe_something",
+                      "text": "You %s the %s." % (verb, item["description"][2:])}
+            if rng.random() < precondition_density:
+                action["preconditions"] = {"inventory_contains": key}
+            actions["%s %s" % (verb, item["name"])] = action
+        if actions:
+            item["actions"] = actions
+
+    blocks = []
+    blocked = int(len(connections) * block_density)
+    for origin, direction, destination in rng.sample(connections, min(blocked, len(connections))):
+        if not item_keys:
+            break
+        obstacle = "o%d" % len(blocks)
+        items[obstacle] = {"name": "boulder%d" % len(blocks), "description": "a huge boulder",
+                           "examine_text": "IT IS TOO HEAVY TO MOVE BY HAND.",
+                           "start_at": origin, "gettable": False}
+        tool = rng.choice(item_keys)
+        items[obstacle]["actions"] = {
+            "smash boulder%d" % len(blocks): {
+                "function": "destroy_item", "item": obstacle,
+                "text": "The boulder crumbles.",
+                "preconditions": {"inventory_contains": tool, "location_has_item": obstacle}}}
+        blocks.append([origin, direction, "A huge boulder blocks the way.", {"block_gone": obstacle}])
+
+    # The goal: a crown in the last location, claimed to win the game.
+    items["goal"] = {"name": "crown", "description": "a jewelled crown",
+                     "examine_text": "IT IS THE CROWN OF THIS LAND.",
+                     "start_at": location_keys[-1],
+                     "actions": {"claim crown": {
+                         "function": "win_game", "text": "You are crowned! THE END.",
+                         "preconditions": {"inventory_contains": "goal"}}}}
+
+    return {
+        "format": 1,
+        "name": name or "Generated world %d" % seed,
+        "start": location_keys[0],
+        "locations": locations,
+        "connections": connections,
+        "items": items,
+        "blocks": blocks,
+    }
+
+
+def generate_world(**options):
+    """Generate a world (see generate_world_spec) and build it.  Returns the
+    Location where the player starts."""
+    return build_world_from_spec(generate_world_spec(**options))
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Generate a random world file.")
+    arg_parser.add_argument("--size", type=int, default=100, help="number of locations")
+    arg_parser.add_argument("--branching", type=float, default=2.0, help="average exits per location")
+    arg_parser.add_argument("--item-density", type=float, default=1.0, help="items per location")
+    arg_parser.add_argument("--block-density", type=float, default=0.1, help="fraction of connections blocked")
+    arg_parser.add_argument("--precondition-density", type=float, default=0.5,
+                            help="fraction of special actions with preconditions")
+    arg_parser.add_argument("--special-actions", type=float, default=1.0, help="special actions per item")
+    arg_parser.add_argument("--seed", type=int, default=0)
+    arg_parser.add_argument("--out", help="file to write (default: standard output)")
+    args = arg_parser.parse_args(argv)
+    spec = generate_world_spec(size=args.size, branching=args.branching, item_density=args.item_density,
+                               block_density=args.block_density,
+                               precondition_density=args.precondition_density,
+                               special_actions=args.special_actions, seed=args.seed)
+    text = json.dumps(spec, separators=(",", ":"))
+    if args.out:
+        with open(args.out, 'w') as out:
+            out.write(text)
+    else:
+        sys.stdout.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
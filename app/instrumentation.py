@@ -0,0 +1,184 @@
+"""Instrumentation of the turns a Parser runs.
+
+An observer added with Parser.add_observer is told about every turn: its
+before_turn method is called with the command, and its after_turn method
+with a Turn that records the intent, the item the command was resolved to,
+whether that item's preconditions were met, and how long each phase of the
+turn took:
+
+    classify   working out the intent of the command
+    resolve    finding the item (or special command) the command is about
+    execute    carrying out the command
+    render     flushing the turn's text to the output
+
+A Parser with no observers doesn't time anything, so instrumentation costs
+nothing until it is turned on.
+
+TurnMetrics is an observer that aggregates turns into latency histograms per
+intent and phase, which can be exported as JSON or in the Prometheus text
+format:
+
+    metrics = TurnMetrics()
+    parser.add_observer(metrics)
+    ...
+    print(metrics.to_prometheus())
+"""
+import json
+from bisect import bisect_left
+
+# The phases of a turn, in order.
+PHASES = ("classify", "resolve", "execute", "render")
+
+# Upper bounds of the histogram buckets, in nanoseconds: four buckets per
+# doubling, from 1 microsecond to about 17 seconds.
+BUCKET_BOUNDS = tuple(int(1000 * 2 ** (i / 4)) for i in range(97))
+
+
+class Turn:
+    """What happened in one turn."""
+
+    __slots__ = ("command", "intent", "item", "preconditions_met", "phases", "end_game")
+
+    def __init__(self, command):
+        self.command = command
+        # The intent of the command, or None if it wasn't understood
+        self.intent = None
+        # The Item the command was about, or None
+        self.item = None
+        # For special commands, whether the item's preconditions were met;
+        # None for every other command
+        self.preconditions_met = None
+        # Dictionary mapping from phase name to nanoseconds spent in it
+        self.phases = {}
+        self.end_game = False
+
+    @property
+    def total_ns(self):
+        return sum(self.phases.values())
+
+
+class TurnObserver:
+    """The interface of turn observers.  Both hooks do nothing by default."""
+
+    def before_turn(self, parser, command):
+        """Called before a command is run."""
+
+    def after_turn(self, parser, turn):
+        """Called with the Turn once a command has run and its output has been
+        flushed."""
+
+
+class Histogram:
+    """A histogram of durations in nanoseconds with fixed, logarithmically
+    spaced buckets.  Recording a value is one binary search and an
+    increment; quantiles are estimated as the upper bound of the bucket they
+    fall in, so they are accurate to within one bucket (about 19%)."""
+
+    __slots__ = ("counts", "count", "sum", "max")
+
+    def __init__(self):
+        # counts[i] is the number of values <= BUCKET_BOUNDS[i] (and greater than
+        # the bound before it); the last count is for values above every bound
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.sum = 0
+        self.max = 0
+
+    def record(self, value):
+        self.counts[bisect_left(BUCKET_BOUNDS, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        """Returns an estimate of the q quantile (0 <= q <= 1), or 0 if no
+        values have been recorded."""
+        if not self.count:
+            return 0
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= rank:
+                if i == len(BUCKET_BOUNDS):
+                    return self.max
+                return min(BUCKET_BOUNDS[i], self.max)
+        return self.max
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "sum_ns": self.sum,
+            "max_ns": self.max,
+            "p50_ns": self.quantile(0.5),
+            "p90_ns": self.quantile(0.9),
+            "p99_ns": self.quantile(0.99),
+        }
+
+
+class TurnMetrics(TurnObserver):
+    """Aggregates turns into a Histogram for each intent and phase (and the
+    turn as a whole, under the phase "total"), and counts the precondition
+    outcomes of special commands."""
+
+    def __init__(self):
+        # Dictionary mapping from (intent, phase) to Histogram
+        self.histograms = {}
+        # Dictionary mapping from (intent, "met" or "failed") to a count
+        self.preconditions = {}
+
+    def after_turn(self, parser, turn):
+        intent = turn.intent or "unknown"
+        histograms = self.histograms
+        for phase, elapsed in turn.phases.items():
+            histogram = histograms.get((intent, phase))
+            if histogram is None:
+                histogram = histograms[(intent, phase)] = Histogram()
+            histogram.record(elapsed)
+        histogram = histograms.get((intent, "total"))
+        if histogram is None:
+            histogram = histograms[(intent, "total")] = Histogram()
+        histogram.record(turn.total_ns)
+        if turn.preconditions_met is not None:
+            key = (intent, "met" if turn.preconditions_met else "failed")
+            self.preconditions[key] = self.preconditions.get(key, 0) + 1
+
+    def to_dict(self):
+        """Returns the metrics as a dictionary:
+        {"intents": {intent: {phase: histogram summary}},
+         "preconditions": {intent: {"met": n, "failed": n}}}"""
+        intents = {}
+        for (intent, phase), histogram in sorted(self.histograms.items()):
+            intents.setdefault(intent, {})[phase] = histogram.to_dict()
+        preconditions = {}
+        for (intent, outcome), count in sorted(self.preconditions.items()):
+            preconditions.setdefault(intent, {})[outcome] = count
+        return {"intents": intents, "preconditions": preconditions}
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=2)
+
+    def to_prometheus(self, prefix="adventure"):
+        """Returns the metrics in the Prometheus text exposition format, with
+        durations in seconds."""
+        name = "%s_turn_phase_seconds" % prefix
+        lines = ["# HELP %s Time spent in each phase of a turn." % name,
+                 "# TYPE %s histogram" % name]
+        for (intent, phase), histogram in sorted(self.histograms.items()):
+            labels = 'intent="%s",phase="%s"' % (intent, phase)
+            cumulative = 0
+            # Every bucket is written, empty or not, so each series has the
+            # same buckets from one scrape to the next.
+            for bound, count in zip(BUCKET_BOUNDS, histogram.counts):
+                cumulative += count
+                lines.append('%s_bucket{%s,le="%.9g"} %d' % (name, labels, bound / 1e9, cumulative))
+            lines.append('%s_bucket{%s,le="+Inf"} %d' % (name, labels, histogram.count))
+            lines.append("%s_sum{%s} %.9f" % (name, labels, histogram.sum / 1e9))
+            lines.append("%s_count{%s} %d" % (name, labels, histogram.count))
+        name = "%s_preconditions_total" % prefix
+        lines.append("# HELP %s Outcomes of the preconditions of special commands." % name)
+        lines.append("# TYPE %s counter" % name)
+        for (intent, outcome), count in sorted(self.preconditions.items()):
+            lines.append('%s{intent="%s",outcome="%s"} %d' % (name, intent, outcome, count))
+        return "\n".join(lines) + "\n"
@@ -1,10 +1,14 @@
-from class_parser import Parser
-from game import Game
-from locations import Location
+import sys
+
+from .locations import EMPTY
+from .preconditions import compile_preconditions
 
 class Item:
     """Items are objects that a player can get, or scenery that a player can
     examine."""
+    __slots__ = ("name", "description", "examine_text", "_take_text", "gettable", "end_game",
+                 "aliases", "commands", "__weakref__")
+
     def __init__(
         self,
         name,
@@ -13,25 +17,34 @@ class Item:
         take_text="",
         start_at=None,
         gettable=True,
-        end_game=False):
+        end_game=False,
+        aliases=()):
         
         # The name of the object
-        self.name = name
+        self.name = sys.intern(name)
         # The default description of the object.
         self.description = description
         # The detailed description of the player examines the object.
         self.examine_text = examine_text
         # Text that displays when player takes an object.
-        self.take_text = take_text if take_text else ("You take the %s." % self.name)
+        self._take_text = take_text
         # Indicates whether a player can get the object and put it in their inventory.
         self.gettable = gettable
         # True if entering this location should end the game.
         self.end_game = end_game
+        # Other names the player can use for the object.
+        self.aliases = tuple(sys.intern(alias) for alias in aliases)
         # The location in the Game where the object starts.
         if start_at:
             start_at.add_item(name, self)
-        self.commands = {}
+        # Dictionary mapping from special commands to (function, arguments,
+        # preconditions)
+        self.commands = EMPTY
 
+    @property
+    def take_text(self):
+        """Text that displays when player takes an object."""
+        return self._take_text or ("You take the %s." % self.name)
 
     def get_commands(self):
         """Returns a list of special commands associated with this object"""
@@ -39,15 +52,24 @@ class Item:
 
     def add_action(self, command_text, function, arguments, preconditions={}):
         """Add a special action associated with this item"""
-        self.commands[command_text] = (function, arguments, preconditions)
+        if self.commands is EMPTY:
+            self.commands = {}
+        self.commands[sys.intern(command_text)] = (function, arguments, compile_preconditions(preconditions))
 
-    def do_action(self, command_text, game):
-        """Perform a special action associated with this item"""
+    def do_action(self, command_text, game, preconditions_met=None):
+        """Perform a special action associated with this item.  preconditions_met
+        is whether the action's preconditions are met, if the caller has
+        already checked."""
         end_game = False  # Switches to True if this action ends the game.
         if command_text in self.commands:
             function, arguments, preconditions = self.commands[command_text]
-        if Location.check_preconditions(preconditions, game):
+        if preconditions_met is None:
+            preconditions_met = preconditions.check(game, print_failure_reasons=True)
+        elif not preconditions_met:
+            # Check again, to tell the player why not.
+            preconditions.check(game, print_failure_reasons=True)
+        if preconditions_met:
             end_game = function(game, arguments)
         else:
-            print("Cannot perform the action %s" % command_text)
+            game.say("Cannot perform the action %s" % command_text)
         return end_game
\ No newline at end of file
@@ -0,0 +1,296 @@
+"""An append-only journal of game sessions, for recovering after a crash.
+
+Every accepted command is recorded with the change it made to its game: the
+player's new location, their inventory if it changed, the items at each
+location whose items changed (which covers taking, dropping, create_item and
+destroy_item) and any newly visited locations.  Each record is one line of
+JSON in a segment file:
+
+    {"s": "4f2a...", "snap": {...}}                       a session started
+    {"s": "4f2a...", "c": "take pole", "d": {"inv": [7]}}   a turn
+    {"s": "4f2a...", "end": 1}                            a session ended
+
+where "snap" and "d" use the dictionary format of Game.state.
+
+Records are written by a background thread.  It waits commit_interval
+seconds after the first pending record so that the turns of many sessions
+are written and fsynced together (group commit); a turn never waits for an
+fsync, and at most commit_interval seconds of turns can be lost in a crash.
+Callers that must know a record is on disk can wait for it.
+
+When a segment grows past segment_bytes a new one is started, and compact
+rewrites every finished segment as a single segment holding one snapshot
+per live session.  replay reads the segments back into game states, and
+SessionManager.recover (see server.py) turns them into games.
+"""
+import json
+import os
+import re
+import threading
+import time
+
+SEGMENT_PATTERN = re.compile(r"^journal-(\d{8})\.log$")
+
+
+class Journal:
+    """A journal in a directory of segment files."""
+
+    def __init__(self, directory, segment_bytes=16 * 1024 * 1024, commit_interval=0.005):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.commit_interval = commit_interval
+        os.makedirs(directory, exist_ok=True)
+        # Dictionary mapping from session id to the last recorded state of its game
+        self.states = {}
+        # Records waiting to be written, the number of records appended, and the
+        # number known to be on disk
+        self._pending = []
+        self._appended = 0
+        self._durable = 0
+        self._closed = False
+        self._error = None
+        self._condition = threading.Condition()
+        # Held while the current segment is written, rotated or compacted
+        self._io_lock = threading.Lock()
+        segments = self.segments()
+        self._number = segment_number(segments[-1]) if segments else 0
+        # A new segment is always started, so nothing is appended after a torn
+        # record at the end of the last one.
+        self._file = None
+        self._size = 0
+        self._open_segment()
+        self._writer = threading.Thread(target=self._write_batches, name="journal", daemon=True)
+        self._writer.start()
+
+    def segments(self):
+        """Returns the paths of the segment files, oldest first."""
+        names = sorted(name for name in os.listdir(self.directory) if SEGMENT_PATTERN.match(name))
+        return [os.path.join(self.directory, name) for name in names]
+
+    '''
+    RECORDING
+    '''
+    def start_session(self, session_id, game):
+        """Record a session starting (or being recovered) with a game."""
+        state = game.state()
+        self.states[session_id] = state
+        return self.append({"s": session_id, "snap": state})
+
+    def record_turn(self, session_id, command, game):
+        """Record a command and the change it made to the session's game.
+        Returns the record's sequence number (see wait), or None if the
+        command changed nothing."""
+        old = self.states[session_id]
+        new = game.state()
+        self.states[session_id] = new
+        delta = state_delta(old, new)
+        if not delta:
+            return None
+        return self.append({"s": session_id, "c": command, "d": delta})
+
+    def end_session(self, session_id):
+        """Record a session ending."""
+        if self.states.pop(session_id, None) is not None:
+            return self.append({"s": session_id, "end": 1})
+
+    def append(self, record):
+        """Queue a record to be written.  Returns its sequence number."""
+        line = json.dumps(record, separators=(",", ":")).encode() + b"\n"
+        with self._condition:
+            if self._closed:
+                raise ValueError("The journal is closed")
+            self._pending.append(line)
+            self._appended += 1
+            self._condition.notify_all()
+            return self._appended
+
+    def wait(self, sequence=None, timeout=None):
+        """Wait until the record with this sequence number (by default, every
+        record appended so far) is on disk.  Returns False on timeout."""
+        with self._condition:
+            if sequence is None:
+                sequence = self._appended
+            done = self._condition.wait_for(
+                lambda: self._durable >= sequence or self._error is not None, timeout)
+            if self._error is not None:
+                raise self._error
+            return done
+
+    def close(self):
+        """Write every pending record and close the journal."""
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify_all()
+        self._writer.join()
+        self._file.close()
+        if self._error is not None:
+            raise self._error
+
+    def _write_batches(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._pending or self._closed)
+                if not self._pending:
+                    return
+                closing = self._closed
+            if not closing and self.commit_interval:
+                # Give other sessions a moment to join this batch.
+                time.sleep(self.commit_interval)
+            with self._condition:
+                batch = self._pending
+                self._pending = []
+                last = self._appended
+            try:
+                with self._io_lock:
+                    data = b"".join(batch)
+                    self._file.write(data)
+                    self._file.flush()
+                    os.fsync(self._file.fileno())
+                    self._size += len(data)
+                    if self._size >= self.segment_bytes:
+                        self._rotate()
+            except OSError as e:
+                with self._condition:
+                    self._error = e
+                    self._condition.notify_all()
+                return
+            with self._condition:
+                self._durable = last
+                self._condition.notify_all()
+
+    '''
+    SEGMENTS
+    '''
+    def _open_segment(self):
+        self._number += 1
+        path = os.path.join(self.directory, "journal-%08d.log" % self._number)
+        self._file = open(path, 'ab')
+        self._size = 0
+        _fsync_directory(self.directory)
+
+    def _rotate(self):
+        self._file.close()
+        self._open_segment()
+
+    def rotate(self):
+        """Finish the current segment and start a new one."""
+        with self._io_lock:
+            self._rotate()
+
+    def compact(self):
+        """Replace every finished segment with a single segment holding a
+        snapshot of each session that is still live at its end.  Returns the
+        path of the compacted segment, or None if there was nothing to
+        compact."""
+        with self._io_lock:
+            self._rotate()
+            finished = [path for path in self.segments()
+                        if segment_number(path) < self._number]
+            if not finished:
+                return None
+            states = replay(finished)
+            target = finished[-1]
+            temp_path = target + ".compacting"
+            with open(temp_path, 'wb') as compacted:
+                for session_id, state in states.items():
+                    compacted.write(json.dumps({"s": session_id, "snap": state},
+                                               separators=(",", ":")).encode() + b"\n")
+                compacted.flush()
+                os.fsync(compacted.fileno())
+            os.replace(temp_path, target)
+            for path in finished[:-1]:
+                os.remove(path)
+            _fsync_directory(self.directory)
+            return target
+
+
+def segment_number(path):
+    return int(SEGMENT_PATTERN.match(os.path.basename(path)).group(1))
+
+
+def state_delta(old, new):
+    """Returns the change from one game state (see Game.state) to another as a
+    dictionary holding only what changed."""
+    delta = {}
+    for key, value in new.items():
+        if key == "items":
+            changed = {location: items for location, items in value.items()
+                       if old["items"].get(location) != items}
+            if changed:
+                delta["items"] = changed
+        elif key == "seen":
+            if len(value) != len(old["seen"]):
+                seen = set(old["seen"])
+                delta["seen"] = [location for location in value if location not in seen]
+        elif old.get(key) != value:
+            delta[key] = value
+    for key in old:
+        if key not in new:
+            delta[key] = 0
+    return delta
+
+
+def apply_delta(state, delta):
+    """Apply a change made by state_delta to a game state, in place."""
+    for key, value in delta.items():
+        if key == "items":
+            state["items"].update(value)
+        elif key == "seen":
+            state["seen"].extend(value)
+        else:
+            state[key] = value
+
+
+def read_records(path):
+    """Yields the records of a segment file.  Reading stops at the first
+    record that is incomplete or corrupt, which is where a crash cut the
+    segment short."""
+    with open(path, 'rb') as segment:
+        for line in segment:
+            if not line.endswith(b"\n"):
+                return
+            try:
+                yield json.loads(line)
+            except ValueError:
+                return
+
+
+def replay(paths):
+    """Read segment files (oldest first) and return a dictionary mapping
+    the id of each session that hadn't ended to its game's last state."""
+    states = {}
+    for path in paths:
+        for record in read_records(path):
+            session_id = record["s"]
+            if "snap" in record:
+                states[session_id] = record["snap"]
+            elif "end" in record:
+                states.pop(session_id, None)
+            elif session_id in states:
+                apply_delta(states[session_id], record["d"])
+    return states
+
+
+def replay_directory(directory):
+    """Replay every segment in a journal directory (see replay)."""
+    if not os.path.isdir(directory):
+        return {}
+    names = sorted(name for name in os.listdir(directory) if SEGMENT_PATTERN.match(name))
+    return replay([os.path.join(directory, name) for name in names])
+
+
+def _fsync_directory(directory):
+    """Make a new or renamed file in a directory durable.  Not every platform
+    can open a directory, so failing is not an error."""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
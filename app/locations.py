@@ -1,74 +1,229 @@
-from game import Game
+import sys
+from collections.abc import Mapping
+from types import MappingProxyType
+
+from .nouns import NounIndex
+from .preconditions import compile_preconditions
+
+# Abbreviations that players can use for the standard directions.
+DIRECTION_ABBREVIATIONS = {
+    "north": "n",
+    "south": "s",
+    "east": "e",
+    "west": "w",
+    "up": "u",
+    "down": "d",
+}
+
+# The directions that get an automatic connection back the other way.
+REVERSE_DIRECTIONS = {
+    "north": "south",
+    "south": "north",
+    "east": "west",
+    "west": "east",
+    "up": "down",
+    "down": "up",
+    "in": "out",
+    "out": "in",
+}
+
+# The empty dictionary that every Location and Item starts with.  It is shared,
+# and replaced by a dictionary of their own when something is first added.
+EMPTY = MappingProxyType({})
+
+# Dictionary mapping from a tuple of exit directions to the exit aliases of
+# a location with those exits (see Location.build_exit_aliases), shared by
+# every location with the same exits.
+_exit_alias_tables = {}
+
+
+class Exits(Mapping):
+    """The connections of a location, packed into parallel tuples of
+    directions, destinations and travel descriptions.  Locations have only a
+    few exits, so finding one by scanning a tuple is as quick as hashing,
+    and takes a fraction of the memory of a dictionary.  Exits are read-only;
+    with_exit returns a new Exits with an exit added or replaced."""
+
+    __slots__ = ("directions", "destinations", "travel")
+
+    def __init__(self, directions=(), destinations=(), travel=None):
+        self.directions = directions
+        self.destinations = destinations
+        # The travel descriptions, or None if they are all empty
+        self.travel = travel
+
+    def __getitem__(self, direction):
+        try:
+            return self.destinations[self.directions.index(direction)]
+        except ValueError:
+            raise KeyError(direction)
+
+    def __contains__(self, direction):
+        return direction in self.directions
+
+    def __iter__(self):
+        return iter(self.directions)
+
+    def __len__(self):
+        return len(self.directions)
+
+    def __repr__(self):
+        return "Exits(%r)" % list(self.directions)
+
+    def keys(self):
+        return self.directions
+
+    def values(self):
+        return self.destinations
+
+    def items(self):
+        return zip(self.directions, self.destinations)
+
+    def travel_description(self, direction):
+        """Returns the travel description of an exit, or ""."""
+        if self.travel is None or direction not in self.directions:
+            return ""
+        return self.travel[self.directions.index(direction)]
+
+    def with_exit(self, direction, destination, travel_description=""):
+        """Returns a copy of these exits with an exit added (or replaced)."""
+        direction = sys.intern(direction)
+        travel = self.travel
+        if travel_description and travel is None:
+            travel = ("",) * len(self.directions)
+        if direction in self.directions:
+            i = self.directions.index(direction)
+            destinations = self.destinations[:i] + (destination,) + self.destinations[i + 1:]
+            if travel is not None:
+                travel = travel[:i] + (travel_description,) + travel[i + 1:]
+            return Exits(self.directions, destinations, travel)
+        if travel is not None:
+            travel = travel + (travel_description,)
+        return Exits(self.directions + (direction,), self.destinations + (destination,), travel)
+
+
+# The exits of a location with no connections.
+NO_EXITS = Exits()
 
 class Location:
     """Locations are the places in the game that a player can visit.
     Internally they are represented nodes in a graph.  Each location stores
     a description of the location, any items in the location, its connections
     to adjacent locations, and any blocks that prevent movement to an adjacent
-    location.  The connections is a dictionary whose keys are directions and
-    whose values are the location that is the result of traveling in that 
-    direction.  The travel_descriptions also has directions as keys, and its 
-    values are an optional short desciption of traveling to that location.
+    location.  The connections is a read-only mapping (an Exits) whose keys
+    are directions and whose values are the location that is the result of
+    traveling in that direction.  The travel_descriptions also has directions
+    as keys, and its values are an optional short desciption of traveling to
+    that location.  Locations use __slots__, and start out sharing empty
+    containers, since a server holds many worlds at once.
+    add_item and remove_item are for building the world; during a game,
+    items are moved with Game.add_item_to_location and
+    Game.remove_item_from_location.
     """
+    __slots__ = ("name", "description", "end_game", "connections", "items", "blocks",
+                 "_exit_aliases", "_noun_index", "version", "rendered", "__weakref__")
+
     def __init__(self, name, description, end_game=False):
         # A short name for the location
-        self.name = name
+        self.name = sys.intern(name)
         # A description of the location
         self.description = description
         # True if entering this location should end the game
         self.end_game = end_game
-        # Dictionary mapping from directions to other Location objects
-        self.connections = {}
-        # Dictionary mapping from directions to text description of the path there
-        self.travel_descriptions = {}
+        # Exits (a read-only mapping) from directions to other Location objects,
+        # which also holds the text description of each path
+        self.connections = NO_EXITS
         # Dictionary mapping from item name to Item objects present in this location
-        self.items = {}
+        self.items = EMPTY
         # Dictionary mapping from direction to Block object in that direction
-        self.blocks = {}
-        # Flag that gets set to True once this location has been visited by player
-        self.has_been_visited = False
+        self.blocks = EMPTY
+        # Dictionary mapping from every way of naming an exit ("n", "north",
+        # "go north") to its direction.  Built when first needed.
+        self._exit_aliases = None
+        # NounIndex of the items that start here.  Built when first needed.
+        self._noun_index = None
+        # Incremented whenever the items, connections or blocks change, so
+        # that renderings of the location can tell they are out of date
+        self.version = 0
+        # (key, text) of the last rendering of the location with the items that
+        # start here (see Game.render_location)
+        self.rendered = None
+
+    @property
+    def travel_descriptions(self):
+        """Dictionary mapping from directions to text description of the path
+        there."""
+        return {direction: self.connections.travel_description(direction)
+                for direction in self.connections}
 
     def add_connection(self, direction, connected_location, travel_description=""):
         """Add a connection from the current location to a connected location.
         Direction is a string that the player can use to get to the connected
         location.  If the direction is a cardinal direction, then we also 
         automatically make a connection in the reverse direction."""
-        self.connections[direction] = connected_location
-        self.travel_descriptions[direction] = travel_description
-        if direction == 'north':
-            connected_location.connections["south"] = self
-            connected_location.travel_descriptions["south"] = ""
-        if direction == 'south':
-            connected_location.connections["north"] = self
-            connected_location.travel_descriptions["north"] = ""
-        if direction == 'east':
-            connected_location.connections["west"] = self
-            connected_location.travel_descriptions["west"] = ""
-        if direction == 'west':
-            connected_location.connections["east"] = self
-            connected_location.travel_descriptions["east"] = ""
-        if direction == 'up':
-            connected_location.connections["down"] = self
-            connected_location.travel_descriptions["down"] = ""
-        if direction == 'down':
-            connected_location.connections["up"] = self
-            connected_location.travel_descriptions["up"] = ""
-        if direction == 'in':
-            connected_location.connections["out"] = self
-            connected_location.travel_descriptions["out"] = ""
-        if direction == 'out':
-            connected_location.connections["in"] = self
-            connected_location.travel_descriptions["in"] = ""
+        self.connections = self.connections.with_exit(direction, connected_location, travel_description)
+        self._exit_aliases = None
+        connected_location._exit_aliases = None
+        self.version += 1
+        connected_location.version += 1
+        if direction in REVERSE_DIRECTIONS:
+            connected_location.connections = connected_location.connections.with_exit(
+                REVERSE_DIRECTIONS[direction], self)
+
+    def resolve_exit(self, command):
+        """Returns the direction of the exit named by a lowercased command, such
+        as "n", "north" or "go north", or None if no exit matches."""
+        if self._exit_aliases is None:
+            directions = tuple(self.connections)
+            if directions not in _exit_alias_tables:
+                _exit_alias_tables[directions] = self.build_exit_aliases()
+            self._exit_aliases = _exit_alias_tables[directions]
+        return self._exit_aliases.get(command)
+
+    def exit_names(self):
+        """Returns every accepted name of this location's exits."""
+        self.resolve_exit("")
+        return self._exit_aliases.keys()
+
+    def build_exit_aliases(self):
+        """Returns a dictionary mapping every accepted name of each exit to its
+        direction."""
+        aliases = {}
+        for direction in self.connections:
+            names = [direction.lower()]
+            if names[0] in DIRECTION_ABBREVIATIONS:
+                names.append(DIRECTION_ABBREVIATIONS[names[0]])
+            for name in names:
+                aliases[name] = direction
+                aliases["go " + name] = direction
+        return aliases
 
+    def get_noun_index(self):
+        """Returns a NounIndex of the items in this location."""
+        if self._noun_index is None:
+            self._noun_index = NounIndex(self.items.values())
+        return self._noun_index
 
     def add_item(self, name, item):
         """Put an item in this location."""
+        if self.items is EMPTY:
+            self.items = {}
+        name = sys.intern(name)
+        replaced = self.items.get(name)
         self.items[name] = item
+        if self._noun_index is not None:
+            if replaced is not None:
+                self._noun_index.remove(replaced)
+            self._noun_index.add(item)
+        self.version += 1
 
     def remove_item(self, item):
         """Remove an item from this location (for instance, if the player picks it
         up and puts it in their inventory)."""
         self.items.pop(item.name)
+        if self._noun_index is not None:
+            self._noun_index.remove(item)
+        self.version += 1
 
 
     def is_blocked(self, direction, game):
@@ -76,7 +231,7 @@ class Location:
         if not direction in self.blocks:
             return False
         (block_description, preconditions) = self.blocks[direction]
-        if Location.check_preconditions(preconditions, game):
+        if preconditions.check(game, location=self):
             # All the preconditions have been met.  You may pass.
             return False
         else: 
@@ -94,38 +249,14 @@ class Location:
     def add_block(self, blocked_direction, block_description, preconditions):
         """Create an obstacle that prevents a player from moving in the blocked 
         location until the preconditions are all met."""
-        self.blocks[blocked_direction] = (block_description, preconditions)
+        if self.blocks is EMPTY:
+            self.blocks = {}
+        self.blocks[blocked_direction] = (block_description, compile_preconditions(preconditions))
+        self.version += 1
 
 
 
+    @staticmethod
     def check_preconditions(preconditions, game, print_failure_reasons=True):
         """Checks whether the player has met all of the specified preconditions"""
-        all_conditions_met = True
-        for check in preconditions:
-            print(check)
-            if check == "inventory_contains":
-                item = preconditions[check]
-                if not game.is_in_inventory(item):
-                    all_conditions_met = False
-                    if print_failure_reasons:
-                        print("You don't have the %s" % item.name)
-            if check == "in_location":
-                location = preconditions[check]
-                if not game.curr_location == location:
-                    all_conditions_met = False
-                    if print_failure_reasons:
-                        print("You aren't in the correct location")
-            if check == "location_has_item":
-                item = preconditions[check]
-                if not item.name in game.curr_location.items:
-                    all_conditions_met = False
-                    if print_failure_reasons:
-                        print("The %s isn't in this location" % item.name)
-            if check == "block_gone":
-                item = preconditions[check]
-                if item.name in game.curr_location.items:
-                    all_conditions_met = False
-                    if print_failure_reasons:
-                        print("The %s is still blocking the way" % item.name)
-        # todo - add other types of preconditions
-        return all_conditions_met
\ No newline at end of file
+        return compile_preconditions(preconditions).check(game, print_failure_reasons)
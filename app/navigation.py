@@ -0,0 +1,142 @@
+from collections import deque
+
+
+class Navigator:
+    """The Navigator finds the shortest way between locations the player has
+    already visited, so that "go to <place>" can cross the map in one
+    command.  Only connections between visited locations are used, and only
+    while they aren't blocked.  Locations that end the game are never passed
+    through on the way somewhere else.
+
+    Shortest paths are kept as a breadth-first tree for each starting point
+    that has been asked about.  When the map changes (a new location is
+    visited, or a block is cleared or comes back) only the trees that the
+    change could affect are thrown away.
+    """
+
+    def __init__(self, game):
+        self.game = game
+        # The visited set the graph was built from, and how big it was
+        self._visited = None
+        self._visited_count = 0
+        # Dictionary mapping from each visited location to a dictionary of its
+        # open exits: direction -> visited location
+        self.edges = {}
+        # Dictionary mapping from a location that hasn't been visited yet to the
+        # (visited location, direction) pairs that lead to it, so that its
+        # connections can be added when it is visited without looking at
+        # every other location
+        self._incoming = {}
+        # The (location, direction) pairs between visited locations that have
+        # a block, and the ones that are blocked right now
+        self._block_edges = []
+        self._closed = set()
+        # Dictionary mapping from a lowercased location name to the location
+        self.places = {}
+        # Dictionary mapping from a starting location to its shortest path tree:
+        # location -> (distance, previous location, direction taken)
+        self.trees = {}
+
+    def find_place(self, name):
+        """Returns the visited location with this name (case insensitive), or
+        None."""
+        self.refresh()
+        name = " ".join(name.lower().split())
+        if name.startswith("the "):
+            name = name[4:]
+        return self.places.get(name)
+
+    def route(self, start, destination):
+        """Returns the list of directions that leads from start to destination,
+        or None if there is no open way."""
+        self.refresh()
+        tree = self.trees.get(start)
+        if tree is None:
+            tree = self.trees[start] = self._shortest_path_tree(start)
+        if destination not in tree:
+            return None
+        directions = []
+        location = destination
+        while location is not start:
+            distance, previous, direction = tree[location]
+            directions.append(direction)
+            location = previous
+        return directions[::-1]
+
+    def refresh(self):
+        """Bring the graph up to date with the game: add newly visited
+        locations and open or close blocked connections."""
+        visited = self.game.visited
+        if visited is not self._visited or len(visited) < self._visited_count:
+            # A different game state (for instance after a restore): start over.
+            self.__init__(self.game)
+            self._visited = visited
+        if len(visited) != self._visited_count:
+            current = self.game.curr_location
+            if len(visited) == self._visited_count + 1 and current in visited and current not in self.edges:
+                # The usual case: the player has just arrived somewhere new.
+                self._add_location(current)
+            else:
+                for location in visited:
+                    if location not in self.edges:
+                        self._add_location(location)
+            self._visited_count = len(visited)
+        for location, direction in self._block_edges:
+            blocked = location.is_blocked(direction, self.game)
+            edge = (location, direction)
+            if blocked and edge not in self._closed:
+                self._closed.add(edge)
+                self._remove_edge(location, direction)
+            elif not blocked and edge in self._closed:
+                self._closed.discard(edge)
+                self._add_edge(location, direction, location.connections[direction])
+
+    def _add_location(self, location):
+        self.edges[location] = {}
+        self.places.setdefault(location.name.lower(), location)
+        for direction, neighbor in location.connections.items():
+            if neighbor in self.edges:
+                self._connect(location, direction, neighbor)
+            else:
+                self._incoming.setdefault(neighbor, []).append((location, direction))
+        for neighbor, direction in self._incoming.pop(location, ()):
+            self._connect(neighbor, direction, location)
+
+    def _connect(self, location, direction, neighbor):
+        if direction in location.blocks:
+            self._block_edges.append((location, direction))
+            if location.is_blocked(direction, self.game):
+                self._closed.add((location, direction))
+                return
+        self._add_edge(location, direction, neighbor)
+
+    def _add_edge(self, location, direction, neighbor):
+        self.edges[location][direction] = neighbor
+        # A new edge can only shorten paths from starting points that reach
+        # its beginning.
+        for start, tree in list(self.trees.items()):
+            if location in tree and (location is start or not location.end_game):
+                if neighbor not in tree or tree[location][0] + 1 < tree[neighbor][0]:
+                    del self.trees[start]
+
+    def _remove_edge(self, location, direction):
+        neighbor = self.edges[location].pop(direction, None)
+        # Only trees that used the edge are affected.
+        for start, tree in list(self.trees.items()):
+            step = tree.get(neighbor)
+            if step is not None and step[1] is location and step[2] == direction:
+                del self.trees[start]
+
+    def _shortest_path_tree(self, start):
+        tree = {start: (0, None, None)}
+        queue = deque([start])
+        while queue:
+            location = queue.popleft()
+            if location.end_game and location is not start:
+                continue
+            distance = tree[location][0] + 1
+            for direction, neighbor in self.edges.get(location, {}).items():
+                if neighbor not in tree:
+                    tree[neighbor] = (distance, location, direction)
+                    queue.append(neighbor)
+        return tree
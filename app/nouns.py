@@ -0,0 +1,137 @@
+import re
+
+from .fuzzy import BKTree, tolerance
+
+# A word is a run of letters, digits and apostrophes.
+WORD = re.compile(r"[\w']+")
+
+
+def tokenize(text):
+    """Split text into lowercase words, dropping punctuation."""
+    return WORD.findall(text.lower())
+
+
+class NounIndex:
+    """A NounIndex finds the item named in a command.  Every name and alias of
+    every item is indexed by its first word, so a command is matched by
+    looking up each of its words once rather than by searching every item.
+    When several names match, the one with the most words wins, so
+    "examine unconcious guard" finds the unconcious guard and not the guard.
+    Whole words must match, so "rose" doesn't match inside "rosebush".
+    Items coming and going are indexed with add and remove, so the index
+    never has to be rebuilt.
+    """
+
+    def __init__(self, items):
+        # Dictionary mapping from the first word of a name to a list of
+        # (words of the name, item) pairs, longest names first
+        self.names = {}
+        # The number of words in the longest name that has been indexed
+        self.longest = 0
+        # BKTree of the names, and a dictionary mapping from each name to its
+        # items, built the first time a misspelled name is looked up
+        self._tree = None
+        self._named = None
+        for item in items:
+            self.add(item)
+
+    def add(self, item):
+        """Index the names of an item."""
+        for words in self._item_names(item):
+            candidates = self.names.setdefault(words[0], [])
+            # Keep the longest names first.
+            position = len(candidates)
+            while position and len(candidates[position - 1][0]) < len(words):
+                position -= 1
+            candidates.insert(position, (words, item))
+            if len(words) > self.longest:
+                self.longest = len(words)
+            if self._tree is not None:
+                self._name_item(words, item)
+
+    def remove(self, item):
+        """Stop indexing the names of an item."""
+        for words in self._item_names(item):
+            candidates = self.names.get(words[0])
+            if candidates is None:
+                continue
+            for i, candidate in enumerate(candidates):
+                if candidate[1] is item and candidate[0] == words:
+                    del candidates[i]
+                    break
+            if not candidates:
+                del self.names[words[0]]
+            if self._tree is not None:
+                # A BKTree can't forget a name, so the name stays in it
+                # without any items.
+                items = self._named.get(" ".join(words), [])
+                if item in items:
+                    items.remove(item)
+
+    @staticmethod
+    def _item_names(item):
+        """Yields the words of each name and alias of an item."""
+        for name in (item.name,) + tuple(item.aliases):
+            words = tuple(tokenize(name))
+            if words:
+                yield words
+
+    def _name_item(self, words, item):
+        name = " ".join(words)
+        items = self._named.get(name)
+        if items is None:
+            items = self._named[name] = []
+            self._tree.add(name)
+        if item not in items:
+            items.append(item)
+
+    def find(self, words):
+        """Returns (item, number of words matched) for the longest item name
+        found in a list of words, or (None, 0) if none is found."""
+        best_item = None
+        best_length = 0
+        names = self.names
+        for position, word in enumerate(words):
+            candidates = names.get(word)
+            if candidates is None:
+                continue
+            for name, item in candidates:
+                length = len(name)
+                if length <= best_length:
+                    break
+                if tuple(words[position:position + length]) == name:
+                    best_item = item
+                    best_length = length
+                    break
+        return best_item, best_length
+
+    def find_misspelled(self, words, min_words=1):
+        """Returns (item, number of words, number of typos) for the item name
+        closest to a run of at least min_words of the words, allowing a few
+        typos (see fuzzy.tolerance), or (None, 0, 0) if there is no single
+        closest name.  Closer names win, and then longer ones."""
+        if self._tree is None:
+            self._named = {}
+            self._tree = BKTree()
+            for candidates in self.names.values():
+                for name, item in candidates:
+                    self._name_item(name, item)
+        best = None
+        tied = False
+        for length in range(max(1, min_words), min(len(words), self.longest + 1) + 1):
+            for position in range(len(words) - length + 1):
+                text = " ".join(words[position:position + length])
+                for distance, name in self._tree.search(text, tolerance(text)):
+                    items = self._named[name]
+                    if not items:
+                        continue
+                    rank = (distance, -length)
+                    if best is None or rank < best[0]:
+                        best = (rank, items[0])
+                        tied = len(items) > 1
+                    elif rank == best[0] and items[0] is not best[1]:
+                        tied = True
+        if best is None or tied:
+            return None, 0, 0
+        (distance, negative_length), item = best
+        return item, -negative_length, distance
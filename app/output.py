@@ -0,0 +1,83 @@
+import sys
+
+
+class OutputSink:
+    """An OutputSink collects the text the game produces during one turn and
+    writes it out in a single flush.  Subclasses decide where the flushed text
+    goes by overriding emit()."""
+
+    def __init__(self):
+        # The pieces of text written since the last flush.
+        self.buffer = []
+
+    def write(self, *values, sep=" ", end="\n"):
+        """Buffer some text.  Takes the same arguments as print()."""
+        self.buffer.append(sep.join([str(value) for value in values]) + end)
+
+    def flush(self):
+        """Send everything buffered this turn to the backend, and return it."""
+        if not self.buffer:
+            return ""
+        text = "".join(self.buffer)
+        self.buffer.clear()
+        self.emit(text)
+        return text
+
+    def emit(self, text):
+        """Deliver one turn's worth of text."""
+        raise NotImplementedError
+
+
+class StdoutSink(OutputSink):
+    """Writes each turn to standard output."""
+
+    def emit(self, text):
+        sys.stdout.write(text)
+        sys.stdout.flush()
+
+
+class MemorySink(OutputSink):
+    """Keeps each turn's text in memory, for tests and for frontends that
+    collect the response to a command before sending it on."""
+
+    def __init__(self):
+        super().__init__()
+        # The text of every flushed turn that hasn't been taken yet.
+        self.turns = []
+
+    def emit(self, text):
+        self.turns.append(text)
+
+    def take(self):
+        """Return all of the flushed text and forget it."""
+        text = "".join(self.turns)
+        self.turns.clear()
+        return text
+
+
+class StreamSink(OutputSink):
+    """Writes each turn to a file-like object.  Binary streams are sent UTF-8."""
+
+    def __init__(self, stream, encoding="utf-8"):
+        super().__init__()
+        self.stream = stream
+        self.encoding = encoding
+
+    def emit(self, text):
+        try:
+            self.stream.write(text)
+        except TypeError:
+            self.stream.write(text.encode(self.encoding))
+        self.stream.flush()
+
+
+class SocketSink(OutputSink):
+    """Sends each turn over a connected socket."""
+
+    def __init__(self, sock, encoding="utf-8"):
+        super().__init__()
+        self.sock = sock
+        self.encoding = encoding
+
+    def emit(self, text):
+        self.sock.sendall(text.encode(self.encoding))
@@ -0,0 +1,318 @@
+"""Paged worlds: worlds too big to keep in memory.
+
+A paged world file holds a compiled world (see world_loader.compile_world)
+as one record per location and per item, with an index of where each record
+starts and a packed table of every location's neighbours.  A PagedWorld
+memory-maps the file and builds a Location (with its items and blocks) only
+when it is needed: the locations within `radius` moves of the player are
+built as soon as the player arrives, so moving never waits on the disk.
+
+Locations that are no longer near any player are kept in a least recently
+used cache until the size of their records passes `memory_budget`, and then
+dropped.  The budget only limits the locations that no game refers to: a
+game keeps every location its player has visited (Game.visited, and the
+Navigator's map), and every location whose items have changed, for as long
+as the game lasts, so those are never freed while it is being played.  The
+same Location object is always returned for the same location, so games
+never see two copies of one room.
+
+Records are written with marshal, whose format belongs to the version of
+Python that wrote it and which is not safe to read from untrusted sources.
+Paged world files are a cache for worlds you have compiled yourself: only
+open files you made, and rebuild them after upgrading Python.
+
+Connections between paged locations are Exits that hold location numbers
+rather than Location objects, so building one location doesn't pull in the
+rest of the world.
+
+    python -m app.paged_world app/worlds/action_castle.json action_castle.pages
+"""
+import argparse
+import json
+import marshal
+import mmap
+import struct
+import sys
+import weakref
+from collections import OrderedDict, deque
+
+from .game import Game
+from .items import Item
+from .locations import REVERSE_DIRECTIONS, Exits, Location
+from .world import freeze
+from .world_loader import ACTION_FUNCTIONS, build_arguments, build_preconditions, compile_world
+
+# The first bytes of a paged world file, padded so the tables that follow are
+# aligned.
+PAGED_MAGIC = b"PAGEDWORLD v2\n\0\0"
+
+# The header: number of locations, number of items, the start location and the
+# number of connections.
+HEADER = struct.Struct("<QQQQ")
+
+
+def write_paged_world(plan, path):
+    """Write a compiled world plan (see world_loader.compile_world) as a paged
+    world file."""
+    version, location_plans, item_plans, connections, actions, blocks, start = plan
+    # Work out the exits of each location the way Location.add_connection does,
+    # including the connections back.
+    exits = [{} for _ in location_plans]
+    for origin, direction, destination, travel_description in connections:
+        exits[origin][direction] = (destination, travel_description)
+        if direction in REVERSE_DIRECTIONS:
+            exits[destination][REVERSE_DIRECTIONS[direction]] = (origin, "")
+    starting_items = [[] for _ in location_plans]
+    for i, item_plan in enumerate(item_plans):
+        if item_plan[4] is not None:
+            starting_items[item_plan[4]].append(i)
+    location_blocks = [{} for _ in location_plans]
+    for location, direction, description, preconditions in blocks:
+        location_blocks[location][direction] = (direction, description, preconditions)
+    item_actions = [[] for _ in item_plans]
+    for item, command, (name, arguments), preconditions in actions:
+        item_actions[item].append((command, name, arguments, preconditions))
+
+    location_count = len(location_plans)
+    item_count = len(item_plans)
+    connection_count = sum(len(location_exits) for location_exits in exits)
+    tables_start = len(PAGED_MAGIC) + HEADER.size
+    records_start = tables_start + 8 * (2 * (location_count + 1) + item_count + 1) + 4 * connection_count
+    location_offsets = []
+    item_offsets = []
+    with open(path, 'wb') as pagefile:
+        pagefile.seek(records_start)
+        for i, (name, description, end_game) in enumerate(location_plans):
+            location_offsets.append(pagefile.tell())
+            directions = tuple(exits[i])
+            travel = tuple(exits[i][direction][1] for direction in directions)
+            pagefile.write(marshal.dumps(
+                (name, description, end_game, directions,
+                 tuple(exits[i][direction][0] for direction in directions),
+                 travel if any(travel) else None,
+                 tuple(location_blocks[i].values()), tuple(starting_items[i]))))
+        location_offsets.append(pagefile.tell())
+        for i, (name, description, examine_text, take_text, start_at, gettable, end_game,
+                aliases) in enumerate(item_plans):
+            item_offsets.append(pagefile.tell())
+            pagefile.write(marshal.dumps(
+                (name, description, examine_text, take_text, gettable, end_game, aliases,
+                 tuple(item_actions[i]))))
+        item_offsets.append(pagefile.tell())
+
+        pagefile.seek(0)
+        pagefile.write(PAGED_MAGIC)
+        pagefile.write(HEADER.pack(location_count, item_count, start, connection_count))
+        pagefile.write(struct.pack("<%dQ" % len(location_offsets), *location_offsets))
+        pagefile.write(struct.pack("<%dQ" % len(item_offsets), *item_offsets))
+        adjacency_offsets = [0]
+        for location_exits in exits:
+            adjacency_offsets.append(adjacency_offsets[-1] + len(location_exits))
+        pagefile.write(struct.pack("<%dQ" % len(adjacency_offsets), *adjacency_offsets))
+        for location_exits in exits:
+            pagefile.write(struct.pack("<%dI" % len(location_exits),
+                                       *(destination for destination, _ in location_exits.values())))
+
+
+def compile_paged_world(world_file, path):
+    """Compile a world file (JSON) into a paged world file."""
+    with open(world_file, 'rb') as worldfile:
+        spec = json.loads(worldfile.read())
+    write_paged_world(compile_world(spec), path)
+
+
+class PagedExits(Exits):
+    """The exits of a paged location.  Its destinations are location numbers,
+    which are turned into Locations when they are looked up.  Looking up an
+    exit's destination means the player is about to go there, so the
+    locations around it are built ahead of time."""
+
+    __slots__ = ("world",)
+
+    def __init__(self, directions, destinations, travel, world):
+        Exits.__init__(self, directions, destinations, travel)
+        self.world = world
+
+    def __getitem__(self, direction):
+        try:
+            number = self.destinations[self.directions.index(direction)]
+        except ValueError:
+            raise KeyError(direction)
+        self.world.enter(number)
+        return self.world.location(number)
+
+    def values(self):
+        return [self.world.location(number) for number in self.destinations]
+
+    def items(self):
+        return zip(self.directions, self.values())
+
+
+class _Sequence:
+    """A read-only sequence of a paged world's locations or items, built when
+    they are indexed."""
+
+    def __init__(self, get, length):
+        self._get = get
+        self._length = length
+
+    def __getitem__(self, i):
+        if not 0 <= i < self._length:
+            raise IndexError(i)
+        return self._get(i)
+
+    def __len__(self):
+        return self._length
+
+
+class PagedWorld:
+    """A world read from a paged world file.  Like a WorldTemplate, any number
+    of games can be played in it at once, and it can save and restore them:
+    it has the same start_at, locations, items, location_ids, item_ids,
+    new_game and restore_game."""
+
+    def __init__(self, path, radius=2, memory_budget=64 * 1024 * 1024):
+        self.path = path
+        self.radius = radius
+        # The largest total size of the records of the cached locations
+        self.memory_budget = memory_budget
+        with open(path, 'rb') as pagefile:
+            self._map = mmap.mmap(pagefile.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:len(PAGED_MAGIC)] != PAGED_MAGIC:
+            raise ValueError("%s is not a paged world file" % path)
+        location_count, item_count, start, connection_count = HEADER.unpack_from(self._map, len(PAGED_MAGIC))
+        view = self._view = memoryview(self._map)
+        position = len(PAGED_MAGIC) + HEADER.size
+
+        def table(length, code, size):
+            nonlocal position
+            values = view[position:position + length * size].cast(code)
+            position += length * size
+            return values
+
+        self._location_offsets = table(location_count + 1, "Q", 8)
+        self._item_offsets = table(item_count + 1, "Q", 8)
+        self._adjacency_offsets = table(location_count + 1, "Q", 8)
+        self._adjacency = table(connection_count, "I", 4)
+        # The Location and Item objects that exist, by number, and their numbers
+        self._live_locations = weakref.WeakValueDictionary()
+        self._live_items = weakref.WeakValueDictionary()
+        self._location_numbers = weakref.WeakKeyDictionary()
+        self._item_numbers = weakref.WeakKeyDictionary()
+        # The least recently used cache: location number -> (Location, record size)
+        self._cache = OrderedDict()
+        self.cached_bytes = 0
+        self.locations = _Sequence(self.location, location_count)
+        self.items = _Sequence(self.item, item_count)
+        self.location_ids = self._location_numbers
+        self.item_ids = self._item_numbers
+        self.start_at = self.location(start)
+        self.enter(start)
+
+    def new_game(self, output=None):
+        """Start a new game in this world."""
+        return Game(self.start_at, output, world=self)
+
+    def restore_game(self, data, output=None):
+        """Start a game in this world from a snapshot made by Game.snapshot."""
+        game = self.new_game(output)
+        game.restore(data)
+        self.enter(self._location_numbers[game.curr_location])
+        return game
+
+    def neighbours(self, number):
+        """Returns the numbers of the locations a location connects to."""
+        return self._adjacency[self._adjacency_offsets[number]:self._adjacency_offsets[number + 1]]
+
+    def enter(self, number):
+        """Build every location within `radius` moves of a location."""
+        seen = {number}
+        pending = deque([(number, 0)])
+        while pending:
+            number, distance = pending.popleft()
+            self.location(number)
+            if distance < self.radius:
+                for neighbour in self.neighbours(number):
+                    if neighbour not in seen:
+                        seen.add(neighbour)
+                        pending.append((neighbour, distance + 1))
+
+    def location(self, number):
+        """Returns the Location with this number, building it if needed."""
+        location = self._live_locations.get(number)
+        if location is None:
+            location = self._build_location(number)
+        if number in self._cache:
+            self._cache.move_to_end(number)
+        else:
+            size = self._location_offsets[number + 1] - self._location_offsets[number]
+            self._cache[number] = (location, size)
+            self.cached_bytes += size
+            while self.cached_bytes > self.memory_budget and len(self._cache) > 1:
+                _, (_, size) = self._cache.popitem(last=False)
+                self.cached_bytes -= size
+        return location
+
+    def item(self, number):
+        """Returns the Item with this number, building it if needed."""
+        item = self._live_items.get(number)
+        if item is None:
+            item = self._build_item(number)
+        return item
+
+    def _record(self, offsets, number):
+        return marshal.loads(self._map[offsets[number]:offsets[number + 1]])
+
+    def _build_location(self, number):
+        (name, description, end_game, directions, destinations, travel, blocks,
+         item_numbers) = self._record(self._location_offsets, number)
+        location = Location(name, description, end_game=end_game)
+        # Registered before its items and blocks are built, since they may
+        # refer back to it.
+        self._live_locations[number] = location
+        self._location_numbers[location] = number
+        location.connections = PagedExits(tuple(sys.intern(direction) for direction in directions),
+                                          destinations, travel, self)
+        for item_number in item_numbers:
+            item = self.item(item_number)
+            location.add_item(item.name, item)
+        for direction, block_description, preconditions in blocks:
+            location.add_block(direction, block_description,
+                               build_preconditions(preconditions, self.locations, self.items))
+        location.items = freeze(location.items)
+        location.blocks = freeze(location.blocks)
+        return location
+
+    def _build_item(self, number):
+        (name, description, examine_text, take_text, gettable, end_game, aliases,
+         actions) = self._record(self._item_offsets, number)
+        item = Item(name, description, examine_text, take_text, gettable=gettable,
+                    end_game=end_game, aliases=aliases)
+        self._live_items[number] = item
+        self._item_numbers[item] = number
+        for command, function_name, arguments, preconditions in actions:
+            item.add_action(command, ACTION_FUNCTIONS[function_name][0],
+                            build_arguments(function_name, arguments, self.items),
+                            preconditions=build_preconditions(preconditions, self.locations, self.items))
+        item.commands = freeze(item.commands)
+        return item
+
+    def close(self):
+        self._location_offsets.release()
+        self._item_offsets.release()
+        self._adjacency_offsets.release()
+        self._adjacency.release()
+        self._view.release()
+        self._map.close()
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Compile a world file into a paged world file.")
+    arg_parser.add_argument("world", help="world file (JSON)")
+    arg_parser.add_argument("out", help="paged world file to write")
+    args = arg_parser.parse_args(argv)
+    compile_paged_world(args.world, args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Preconditions are the puzzles of the game: a block stays in place, and a
+special action can't be performed, until all of its preconditions are met.
+They are written as dictionaries such as
+
+    {"inventory_contains": fish, "location_has_item": troll}
+
+and compiled once, when the block or action is added, into a Preconditions
+object that can be checked quickly on every turn.
+
+Preconditions are checked at a location: the player's current location for
+special actions, and the location that has the block for blocks, which may
+be somewhere else when a route across the map is planned.
+"""
+
+
+def _inventory_contains(game, item, location):
+    return item.name in game.inventory
+
+
+def _in_location(game, value, location):
+    return location is value
+
+
+def _location_has_item(game, item, location):
+    return item.name in game.items_at(location)
+
+
+def _block_gone(game, item, location):
+    return item.name not in game.items_at(location)
+
+
+# Dictionary mapping from each kind of precondition to the function that tests
+# it and the message shown when it fails.
+PRECONDITION_KINDS = {
+    "inventory_contains": (_inventory_contains, "You don't have the %s"),
+    "in_inventory": (_inventory_contains, "You don't have the %s"),
+    "in_location": (_in_location, "You aren't in the correct location"),
+    "location_has_item": (_location_has_item, "The %s isn't in this location"),
+    "block_gone": (_block_gone, "The %s is still blocking the way"),
+}
+
+
+class Preconditions:
+    """A compiled set of preconditions.  Checking stops at the first one that
+    fails."""
+
+    __slots__ = ("source", "checks")
+
+    def __init__(self, preconditions=None):
+        # The dictionary the preconditions were compiled from
+        self.source = dict(preconditions or {})
+        # A tuple of (test, value, failure message) for each precondition
+        self.checks = tuple(compile_precondition(kind, value) for kind, value in self.source.items())
+
+    def check(self, game, print_failure_reasons=False, location=None):
+        """Returns True if every precondition is met at a location (by default
+        the current location).  If print_failure_reasons is True, the reason
+        the first failed precondition failed is shown to the player."""
+        if location is None:
+            location = game.curr_location
+        for test, value, failure in self.checks:
+            if not test(game, value, location):
+                if print_failure_reasons:
+                    game.say(failure % value.name if "%s" in failure else failure)
+                return False
+        return True
+
+    def __len__(self):
+        return len(self.checks)
+
+    def __repr__(self):
+        return "Preconditions(%r)" % self.source
+
+
+def compile_precondition(kind, value):
+    """Returns the (test, value, failure message) tuple for one precondition.
+    The failure message is shared by every precondition of the kind, and the
+    item's name is filled in when it is shown.  Raises a ValueError for an
+    unknown kind of precondition."""
+    if kind not in PRECONDITION_KINDS:
+        raise ValueError("Unknown precondition %r (expected one of %s)"
+                         % (kind, ", ".join(sorted(PRECONDITION_KINDS))))
+    test, failure = PRECONDITION_KINDS[kind]
+    return test, value, failure
+
+
+def compile_preconditions(preconditions):
+    """Returns a Preconditions object for a dictionary of preconditions (or
+    the same object, if it is already compiled)."""
+    if isinstance(preconditions, Preconditions):
+        return preconditions
+    if not preconditions:
+        return NO_PRECONDITIONS
+    return Preconditions(preconditions)
+
+
+# The preconditions of every action and block that has none.
+NO_PRECONDITIONS = Preconditions()
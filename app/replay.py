@@ -0,0 +1,143 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from .action_castle import build_game
+from .class_parser import Parser
+from .output import MemorySink
+
+
+class ReplayResult:
+    """The outcome of replaying one transcript."""
+
+    def __init__(self, name):
+        # The name of the transcript (usually its file name)
+        self.name = name
+        # The commands that were run, in order
+        self.commands = []
+        # Seconds spent on each command
+        self.timings = []
+        # The text the game produced, starting with the opening description
+        self.output = ""
+        # True if a command ended the game
+        self.ended = False
+        # The name of the location the player finished in
+        self.final_location = None
+        # Commands left over after the game ended, which were not run
+        self.unplayed = 0
+        # The error message if the replay crashed, otherwise None
+        self.error = None
+
+    def to_dict(self, include_output=False):
+        result = {
+            "name": self.name,
+            "commands": len(self.commands),
+            "ended": self.ended,
+            "final_location": self.final_location,
+            "unplayed": self.unplayed,
+            "total_seconds": sum(self.timings),
+            "max_seconds": max(self.timings) if self.timings else 0.0,
+            "error": self.error,
+        }
+        if include_output:
+            result["timings"] = self.timings
+            result["output"] = self.output
+        return result
+
+
+def read_transcript(path):
+    """Returns the commands in a transcript file, one per line.  Blank lines
+    and lines starting with '#' are skipped, and a leading '>' prompt is
+    removed."""
+    commands = []
+    with open(path, 'r') as transcript:
+        for line in transcript:
+            line = line.strip()
+            if line.startswith(">"):
+                line = line[1:].strip()
+            if line and not line.startswith("#"):
+                commands.append(line)
+    return commands
+
+
+def replay(commands, name="", new_game=build_game):
+    """Run a list of commands in a fresh game without a terminal, and return a
+    ReplayResult.  Replay stops at the first command that ends the game."""
+    result = ReplayResult(name)
+    sink = MemorySink()
+    game = new_game(sink)
+    parser = Parser(game)
+    game.describe()
+    game.output.flush()
+    try:
+        for position, command in enumerate(commands):
+            result.commands.append(command)
+            start = time.perf_counter()
+            end_game = parser.parse_command(command)
+            result.timings.append(time.perf_counter() - start)
+            if end_game:
+                result.ended = True
+                result.unplayed = len(commands) - position - 1
+                break
+    except Exception as e:
+        result.error = "%s: %s" % (type(e).__name__, e)
+    game.output.flush()
+    result.output = sink.take()
+    result.final_location = game.curr_location.name
+    return result
+
+
+def replay_file(path):
+    """Replay one transcript file."""
+    return replay(read_transcript(path), name=path)
+
+
+def find_transcripts(paths):
+    """Expand a list of files and directories into a sorted list of transcript
+    files.  Directories are searched recursively for *.txt files."""
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                found.extend(os.path.join(root, f) for f in files if f.endswith(".txt"))
+        else:
+            found.append(path)
+    return sorted(found)
+
+
+def replay_files(paths, workers=None, chunksize=64):
+    """Replay many transcript files, spread over a pool of worker processes.
+    Yields a ReplayResult for each file, in order.  With workers=1 everything
+    runs in this process."""
+    if workers == 1 or len(paths) < 2:
+        for path in paths:
+            yield replay_file(path)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for result in pool.map(replay_file, paths, chunksize=chunksize):
+            yield result
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Replay recorded command transcripts.")
+    arg_parser.add_argument("paths", nargs="+", help="transcript files or directories of *.txt files")
+    arg_parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per core)")
+    arg_parser.add_argument("--output", action="store_true", help="include game text and per-command timings")
+    args = arg_parser.parse_args(argv)
+
+    paths = find_transcripts(args.paths)
+    start = time.perf_counter()
+    errors = 0
+    for result in replay_files(paths, workers=args.workers):
+        errors += result.error is not None
+        print(json.dumps(result.to_dict(include_output=args.output)))
+    elapsed = time.perf_counter() - start
+    print("Replayed %d transcripts in %.2fs (%d errors)" % (len(paths), elapsed, errors), file=sys.stderr)
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,353 @@
+import argparse
+import asyncio
+import json
+import secrets
+import time
+
+from .action_castle import build_game
+from .class_parser import Parser
+from .instrumentation import TurnMetrics
+from .journal import Journal, replay_directory
+from .output import MemorySink
+
+
+# The largest request body the JSON endpoint accepts, in bytes.  A command
+# is a few words, so this leaves plenty of room.
+MAX_BODY_BYTES = 64 * 1024
+
+# The most header lines, and header bytes, accepted in one HTTP request.
+MAX_HEADERS = 100
+MAX_HEADER_BYTES = 16 * 1024
+
+
+class SessionLimitError(Exception):
+    """Raised when a new session is requested but the server is full."""
+
+
+class Session:
+    """One player's game: a Game, the Parser driving it, and the sink that
+    collects the text of each turn."""
+
+    def __init__(self, session_id, game, observers=()):
+        self.session_id = session_id
+        self.game = game
+        self.parser = Parser(game)
+        for observer in observers:
+            self.parser.add_observer(observer)
+        # True once a command has ended the game.
+        self.ended = False
+        # When the player last sent a command, used to expire idle sessions.
+        self.last_active = time.monotonic()
+
+    def start(self):
+        """Describe the starting location and return the text."""
+        self.game.describe()
+        self.game.output.flush()
+        return self.game.output.take()
+
+    def run_command(self, command):
+        """Run one command and return the text it produced."""
+        self.last_active = time.monotonic()
+        if self.parser.parse_command(command):
+            self.ended = True
+        return self.game.output.take()
+
+
+class SessionManager:
+    """Hosts many concurrent game sessions in one process.  Sessions are
+    created on demand up to max_sessions, and any session that has been
+    idle for longer than idle_timeout seconds is dropped.  If metrics (a
+    TurnMetrics) is given, every turn of every session is recorded in it.
+    If journal (a Journal) is given, every session and turn is recorded in
+    it, and recover brings the sessions back after a restart.  JSON
+    requests with a body larger than max_body_bytes are refused."""
+
+    def __init__(self, new_game=build_game, max_sessions=10000, idle_timeout=600, metrics=None,
+                 journal=None, max_body_bytes=MAX_BODY_BYTES):
+        # Function that builds a fresh Game for a new session.
+        self.new_game = new_game
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.max_body_bytes = max_body_bytes
+        self.metrics = metrics
+        self.journal = journal
+        # Dictionary mapping from session id to Session
+        self.sessions = {}
+
+    def create(self):
+        """Start a new session.  Returns the Session and its opening text."""
+        if len(self.sessions) >= self.max_sessions:
+            raise SessionLimitError("The server is full. Please try again later.")
+        session_id = secrets.token_hex(8)
+        session = Session(session_id, self.new_game(MemorySink()),
+                          observers=() if self.metrics is None else (self.metrics,))
+        self.sessions[session_id] = session
+        if self.journal is not None:
+            self.journal.start_session(session_id, session.game)
+        return session, session.start()
+
+    def recover(self):
+        """Bring back the sessions recorded in the journal.  Returns how many
+        sessions were recovered."""
+        states = replay_directory(self.journal.directory)
+        for session_id, state in states.items():
+            game = self.new_game(MemorySink())
+            game.restore_state(state)
+            self.sessions[session_id] = Session(
+                session_id, game, observers=() if self.metrics is None else (self.metrics,))
+            self.journal.start_session(session_id, game)
+        return len(states)
+
+    def get(self, session_id):
+        """Returns the session with this id, or None."""
+        return self.sessions.get(session_id)
+
+    def close(self, session_id):
+        """Forget a session."""
+        if self.sessions.pop(session_id, None) is not None and self.journal is not None:
+            self.journal.end_session(session_id)
+
+    def run_command(self, session_id, command):
+        """Run a command in a session.  Returns (text, ended), and drops the
+        session once its game has ended."""
+        session = self.sessions[session_id]
+        text = session.run_command(command)
+        if self.journal is not None:
+            self.journal.record_turn(session_id, command, session.game)
+        if session.ended:
+            self.close(session_id)
+        return text, session.ended
+
+    def expire_idle(self):
+        """Drop every session that has been idle too long.  Returns how many
+        sessions were dropped."""
+        cutoff = time.monotonic() - self.idle_timeout
+        expired = [session_id for session_id, session in self.sessions.items()
+                   if session.last_active < cutoff]
+        for session_id in expired:
+            self.close(session_id)
+        return len(expired)
+
+    async def reap_idle_sessions(self, interval=None):
+        """Periodically expire idle sessions.  Runs until cancelled."""
+        if interval is None:
+            interval = max(1, self.idle_timeout / 4)
+        while True:
+            await asyncio.sleep(interval)
+            self.expire_idle()
+
+    '''
+    LINE PROTOCOL
+    '''
+    async def handle_line_client(self, reader, writer):
+        """Serve one game over a plain text connection: every line the client
+        sends is a command, and the reply is followed by a '>' prompt."""
+        try:
+            session, text = self.create()
+        except SessionLimitError as e:
+            writer.write((str(e) + "\n").encode())
+            await close_writer(writer)
+            return
+        try:
+            writer.write((text + ">").encode())
+            await writer.drain()
+            while True:
+                try:
+                    line = await asyncio.wait_for(reader.readline(), self.idle_timeout)
+                except asyncio.TimeoutError:
+                    writer.write(b"\nYou have been idle too long. Goodbye.\n")
+                    break
+                if not line:
+                    break
+                command = line.decode("utf-8", "replace").strip()
+                if command.lower() in ("exit", "q", "quit"):
+                    break
+                if self.get(session.session_id) is None:
+                    # The reaper dropped the session while we were waiting.
+                    writer.write(b"You have been idle too long. Goodbye.\n")
+                    break
+                text, ended = self.run_command(session.session_id, command)
+                if ended:
+                    writer.write((text + "THE GAME HAS ENDED.\n").encode())
+                    break
+                writer.write((text + ">").encode())
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.close(session.session_id)
+            await close_writer(writer)
+
+    '''
+    JSON ENDPOINT
+    '''
+    def handle_json_request(self, method, path, body):
+        """Route one JSON request.  Returns (status, response dictionary).
+
+        POST   /sessions        start a game
+        POST   /sessions/<id>   run {"command": ...} in a game
+        DELETE /sessions/<id>   end a game
+        GET    /stats           session counts, and turn metrics if recorded
+        GET    /metrics         turn metrics in the Prometheus text format
+
+        The response is a dictionary, or a string for /metrics.
+        """
+        parts = [part for part in path.split("/") if part]
+        if method == "GET" and parts == ["stats"]:
+            stats = {"sessions": len(self.sessions), "max_sessions": self.max_sessions}
+            if self.metrics is not None:
+                stats["turns"] = self.metrics.to_dict()
+            return 200, stats
+        if method == "GET" and parts == ["metrics"] and self.metrics is not None:
+            return 200, self.metrics.to_prometheus()
+        if not parts or parts[0] != "sessions" or len(parts) > 2:
+            return 404, {"error": "not found"}
+        if len(parts) == 1:
+            if method != "POST":
+                return 405, {"error": "method not allowed"}
+            try:
+                session, text = self.create()
+            except SessionLimitError as e:
+                return 503, {"error": str(e)}
+            return 201, {"session": session.session_id, "output": text}
+        session_id = parts[1]
+        if self.get(session_id) is None:
+            return 404, {"error": "no such session"}
+        if method == "DELETE":
+            self.close(session_id)
+            return 200, {"session": session_id, "ended": True}
+        if method != "POST":
+            return 405, {"error": "method not allowed"}
+        try:
+            command = json.loads(body or b"{}")["command"]
+        except (ValueError, KeyError, TypeError):
+            return 400, {"error": 'expected a JSON body like {"command": "look"}'}
+        text, ended = self.run_command(session_id, str(command))
+        return 200, {"session": session_id, "output": text, "ended": ended}
+
+    async def handle_http_client(self, reader, writer):
+        """Serve JSON requests over HTTP/1.1 on one connection."""
+        try:
+            while True:
+                try:
+                    request_line = await asyncio.wait_for(reader.readline(), self.idle_timeout)
+                except asyncio.TimeoutError:
+                    break
+                if not request_line.strip():
+                    break
+                method, path, version = request_line.decode("latin-1").split(None, 2)
+                headers = {}
+                header_lines = header_bytes = 0
+                while True:
+                    line = await reader.readline()
+                    if not line.strip():
+                        break
+                    header_lines += 1
+                    header_bytes += len(line)
+                    if header_lines > MAX_HEADERS or header_bytes > MAX_HEADER_BYTES:
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                if line.strip():
+                    # The rest of the headers are never read, so the
+                    # connection can't be reused.
+                    write_http_response(writer, 431, {"error": "too many request headers"}, False)
+                    await writer.drain()
+                    break
+                length = int(headers.get("content-length", 0))
+                if not 0 <= length <= self.max_body_bytes:
+                    # The body is never read, so the connection can't be reused.
+                    if length < 0:
+                        write_http_response(writer, 400, {"error": "bad Content-Length"}, False)
+                    else:
+                        write_http_response(writer, 413, {"error": "request body too large (at most %d bytes)"
+                                                                   % self.max_body_bytes}, False)
+                    await writer.drain()
+                    break
+                body = await reader.readexactly(length) if length else b""
+                status, response = self.handle_json_request(method.upper(), path, body)
+                keep_alive = (version.strip().upper() == "HTTP/1.1"
+                              and headers.get("connection", "").lower() != "close")
+                write_http_response(writer, status, response, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ValueError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            await close_writer(writer)
+
+
+HTTP_REASONS = {200: "OK", 201: "Created", 400: "Bad Request", 404: "Not Found",
+                405: "Method Not Allowed", 413: "Payload Too Large",
+                431: "Request Header Fields Too Large", 503: "Service Unavailable"}
+
+
+def write_http_response(writer, status, response, keep_alive):
+    """Write an HTTP response: JSON for a dictionary, plain text for a
+    string."""
+    if isinstance(response, str):
+        payload = response.encode()
+        content_type = "text/plain; version=0.0.4"
+    else:
+        payload = json.dumps(response).encode()
+        content_type = "application/json"
+    writer.write(("HTTP/1.1 %d %s\r\n"
+                  "Content-Type: %s\r\n"
+                  "Content-Length: %d\r\n"
+                  "Connection: %s\r\n\r\n"
+                  % (status, HTTP_REASONS.get(status, ""), content_type, len(payload),
+                     "keep-alive" if keep_alive else "close")).encode() + payload)
+
+
+async def close_writer(writer):
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except ConnectionError:
+        pass
+
+
+async def serve(manager, host="127.0.0.1", port=4000, http_port=None):
+    """Run the line protocol server (and the JSON server if http_port is
+    given) until cancelled."""
+    servers = [await asyncio.start_server(manager.handle_line_client, host, port)]
+    if http_port is not None:
+        servers.append(await asyncio.start_server(manager.handle_http_client, host, http_port))
+    reaper = asyncio.ensure_future(manager.reap_idle_sessions())
+    try:
+        await asyncio.gather(*[server.serve_forever() for server in servers])
+    finally:
+        reaper.cancel()
+        for server in servers:
+            server.close()
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Serve Action Castle to many players at once.")
+    arg_parser.add_argument("--host", default="127.0.0.1")
+    arg_parser.add_argument("--port", type=int, default=4000, help="port for the line protocol")
+    arg_parser.add_argument("--http-port", type=int, default=None, help="port for the JSON endpoint")
+    arg_parser.add_argument("--max-sessions", type=int, default=10000)
+    arg_parser.add_argument("--idle-timeout", type=float, default=600, help="seconds")
+    arg_parser.add_argument("--metrics", action="store_true",
+                            help="record turn latencies (served at /stats and /metrics)")
+    arg_parser.add_argument("--journal", help="directory of the journal used to recover sessions")
+    args = arg_parser.parse_args(argv)
+    journal = Journal(args.journal) if args.journal else None
+    manager = SessionManager(max_sessions=args.max_sessions, idle_timeout=args.idle_timeout,
+                             metrics=TurnMetrics() if args.metrics else None, journal=journal)
+    if journal is not None:
+        manager.recover()
+        journal.compact()
+    try:
+        asyncio.run(serve(manager, args.host, args.port, args.http_port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if journal is not None:
+            journal.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+"""A solver that checks whether a world can be won.
+
+The solver searches the states a game can reach, breadth first, so the first
+win it finds is a shortest one.  A state is the player's location, their
+inventory and the items at every location that has changed; which locations
+have been visited doesn't matter.  Each state is stored once, in a
+transposition table keyed by a canonical form of the state, along with the
+command that first reached it.
+
+From each state the solver tries every exit, taking every gettable item in
+the location, every special command in scope and, optionally, dropping each
+item carried.  Games that end through win_game are wins; games that end any
+other way (the cliff, the poisonous potion) are losses.  Each level of the
+search can be spread over a pool of worker processes.
+
+    python -m app.solver                          # Action Castle
+    python -m app.solver app/worlds/other.json --workers 8
+"""
+import argparse
+import json
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from .class_parser import Parser
+from .output import MemorySink
+from .world import WorldTemplate
+
+
+class SolveResult:
+    """What the solver found out about a world."""
+
+    def __init__(self):
+        # The shortest list of commands that wins the game, or None
+        self.winning_transcript = None
+        # Transcripts that end the game without winning, one per losing state
+        self.losing_transcripts = []
+        # Transcripts that reach states from which the game can't be won
+        self.dead_end_transcripts = []
+        # Names of the locations and items the player can never reach
+        self.unreachable_locations = []
+        self.unreachable_items = []
+        # The number of distinct states found
+        self.states = 0
+        # True if the whole state space was searched
+        self.complete = False
+        self.seconds = 0.0
+
+    def to_dict(self, examples=20):
+        """Returns the result as a dictionary, with at most `examples` of the
+        shortest losing and dead-end transcripts."""
+        return {
+            "winnable": self.winning_transcript is not None,
+            "winning_transcript": self.winning_transcript,
+            "losing_states": len(self.losing_transcripts),
+            "losing_transcripts": self.losing_transcripts[:examples],
+            "dead_end_states": len(self.dead_end_transcripts),
+            "dead_end_transcripts": self.dead_end_transcripts[:examples],
+            "unreachable_locations": self.unreachable_locations,
+            "unreachable_items": self.unreachable_items,
+            "states": self.states,
+            "complete": self.complete,
+            "seconds": self.seconds,
+        }
+
+
+# The world used by expand() in this process, set up by _use_world.
+_template = None
+
+# The keys of the states this process has already reported.  Their snapshots
+# have been sent once, so they aren't made and sent again.
+_reported = set()
+
+
+def _use_world(build_world):
+    global _template
+    _template = WorldTemplate(build_world)
+    _reported.clear()
+
+
+def state_key(game):
+    """Returns a canonical, hashable form of a game's state: its location,
+    the items carried, and the items at each location whose items differ
+    from the start of the game."""
+    location_ids = game.world.location_ids
+    item_ids = game.world.item_ids
+    changed = []
+    for location, items in game.location_items.items():
+        if [id(item) for item in items.values()] != [id(item) for item in location.items.values()]:
+            changed.append((location_ids[location], tuple(sorted(item_ids[item] for item in items.values()))))
+    return (location_ids[game.curr_location],
+            tuple(sorted(item_ids[item] for item in game.inventory.values())),
+            tuple(sorted(changed)))
+
+
+def possible_commands(game, allow_drop=False):
+    """Returns the commands worth trying in a game's current state."""
+    commands = list(game.curr_location.connections)
+    for item in game.items_at().values():
+        if item.gettable:
+            commands.append("take " + item.name)
+    commands.extend(sorted(game.special_commands))
+    if allow_drop:
+        commands.extend("drop " + item.name for item in game.inventory.values())
+    return commands
+
+
+def expand(snapshot, allow_drop=False):
+    """Try every possible command from a saved state.  Returns a list of
+    (command, outcome, key, snapshot of the new state, location id, ids of
+    the items in scope) where outcome is "win", "lose" or "play".  The
+    snapshot is None for states this process has reported before."""
+    results = []
+    sink = MemorySink()
+    start = _template.restore_game(snapshot, sink)
+    for command in possible_commands(start, allow_drop):
+        game = _template.restore_game(snapshot, sink)
+        end_game = Parser(game).parse_command(command)
+        sink.take()
+        if end_game:
+            outcome = "win" if game.won else "lose"
+        else:
+            outcome = "play"
+        key = state_key(game)
+        if outcome == "play" and key in _reported:
+            results.append((command, outcome, key, None, None, ()))
+            continue
+        _reported.add(key)
+        scope = [_template.item_ids[item] for item in game.get_items_in_scope()]
+        results.append((command, outcome, key, game.snapshot(),
+                        _template.location_ids[game.curr_location], scope))
+    return results
+
+
+def _expand_batch(batch):
+    snapshots, allow_drop = batch
+    return [expand(snapshot, allow_drop) for snapshot in snapshots]
+
+
+def solve(build_world, workers=1, max_states=1000000, allow_drop=False, stop_at_win=False,
+          batch_size=256):
+    """Search a world for wins, losses and dead ends.  build_world is a
+    function that builds the world and returns the starting Location; with
+    workers > 1 it must be picklable (a module-level function).  The search
+    stops after max_states states, or at the first win if stop_at_win is
+    True, in which case the result is not complete."""
+    started = time.perf_counter()
+    _use_world(build_world)
+    template = _template
+    result = SolveResult()
+
+    first = template.new_game(MemorySink())
+    root = state_key(first)
+    # The transposition table: state key -> (parent key, command, snapshot)
+    table = {root: (None, None, first.snapshot())}
+    # The keys of the states each state leads to, for finding dead ends
+    children = {}
+    wins = set()
+    losses = set()
+    reached_locations = {template.location_ids[first.curr_location]}
+    reached_items = {template.item_ids[item] for item in first.get_items_in_scope()}
+
+    pool = ProcessPoolExecutor(workers, initializer=_use_world, initargs=(build_world,)) if workers > 1 else None
+    try:
+        frontier = [root]
+        while frontier and len(table) < max_states and not (stop_at_win and wins):
+            snapshots = [table[key][2] for key in frontier]
+            if pool and len(frontier) > batch_size:
+                batches = [(snapshots[i:i + batch_size], allow_drop) for i in range(0, len(snapshots), batch_size)]
+                expansions = [expansion for batch in pool.map(_expand_batch, batches) for expansion in batch]
+            else:
+                expansions = [expand(snapshot, allow_drop) for snapshot in snapshots]
+            next_frontier = []
+            for parent, expansion in zip(frontier, expansions):
+                children[parent] = []
+                for command, outcome, key, snapshot, location_id, scope in expansion:
+                    if outcome != "play":
+                        # Every ending is its own state, reached from its parent.
+                        key = (outcome, parent, command)
+                        (wins if outcome == "win" else losses).add(key)
+                    children[parent].append(key)
+                    if snapshot is None:
+                        continue
+                    reached_locations.add(location_id)
+                    reached_items.update(scope)
+                    if key not in table:
+                        table[key] = (parent, command, snapshot)
+                        if outcome == "play":
+                            next_frontier.append(key)
+            frontier = next_frontier
+        result.complete = not frontier
+    finally:
+        if pool:
+            pool.shutdown()
+
+    def transcript(key):
+        commands = []
+        while key is not None:
+            parent, command, snapshot = table[key]
+            if command is not None:
+                commands.append(command)
+            key = parent
+        return commands[::-1]
+
+    if wins:
+        result.winning_transcript = min((transcript(key) for key in wins), key=len)
+    result.losing_transcripts = sorted((transcript(key) for key in losses), key=len)
+    if result.complete:
+        # A dead end is a state from which no win can be reached: walk the
+        # moves backwards from every win to find the states that can win.
+        parents = {}
+        for parent, keys in children.items():
+            for key in keys:
+                parents.setdefault(key, []).append(parent)
+        can_win = set(wins)
+        pending = list(wins)
+        while pending:
+            for parent in parents.get(pending.pop(), ()):
+                if parent not in can_win:
+                    can_win.add(parent)
+                    pending.append(parent)
+        result.dead_end_transcripts = sorted(
+            (transcript(key) for key in children if key not in can_win), key=len)
+    result.unreachable_locations = [location.name for i, location in enumerate(template.locations)
+                                    if i not in reached_locations]
+    result.unreachable_items = [item.name for i, item in enumerate(template.items)
+                                if i not in reached_items]
+    result.states = len(table)
+    result.seconds = time.perf_counter() - started
+    return result
+
+
+class WorldFile:
+    """A picklable build_world function for a world file."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def __call__(self):
+        from .world_loader import load_world
+        return load_world(self.path)
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Check that a world can be won.")
+    arg_parser.add_argument("world", nargs="?", help="world file (default: Action Castle)")
+    arg_parser.add_argument("--workers", type=int, default=1)
+    arg_parser.add_argument("--max-states", type=int, default=1000000)
+    arg_parser.add_argument("--allow-drop", action="store_true", help="also try dropping items")
+    arg_parser.add_argument("--first-win", action="store_true", help="stop at the first win")
+    args = arg_parser.parse_args(argv)
+    if args.world:
+        build_world = WorldFile(args.world)
+    else:
+        from .action_castle import build_world
+    result = solve(build_world, workers=args.workers, max_states=args.max_states,
+                   allow_drop=args.allow_drop, stop_at_win=args.first_win)
+    print(json.dumps(result.to_dict(), indent=2))
+    return 0 if result.winning_transcript is not None else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
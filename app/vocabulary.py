@@ -0,0 +1,185 @@
+"""Loading word lists for the TAP parser.
+
+Word lists have one word (or multi-word entry) per line, and lines that begin
+with '#' are comments.  They are read by memory-mapping the file and walking
+it line by line, so no list of lines is ever built, and they are sorted with
+an external merge sort, so lists larger than memory can be sorted.
+
+A set of word lists can be compiled into a single vocabulary file that loads
+straight into a TAP.GameDictionary without parsing any text.  The file holds
+the dictionary's trie written with marshal, so it can only be read by the
+version of Python that wrote it, and like any marshal data it must come from
+a source you trust.  The trie is checked as it is loaded, so a damaged file
+is reported rather than turned into a broken dictionary.
+"""
+import heapq
+import marshal
+import mmap
+import os
+import tempfile
+
+from .TAP import GameDictionary, PARTS_OF_SPEECH
+
+# The first bytes of a compiled vocabulary file, including the format version.
+VOCABULARY_MAGIC = b"TAPVOCAB2\n"
+
+# The most sorted chunks that are merged at once.  More chunks than this are
+# merged in several passes, so sorting never needs more open files.
+MAX_FAN_IN = 64
+
+
+def iter_words(file):
+    """Yields the words in a word file, lowercased, one at a time.  Blank lines
+    and lines that begin with a '#' are skipped."""
+    with open(file, 'rb') as wordfile:
+        if os.fstat(wordfile.fileno()).st_size == 0:
+            return
+        with mmap.mmap(wordfile.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            for line in iter(mapped.readline, b""):
+                line = line.strip()
+                if line and not line.startswith(b"#"):
+                    yield line.decode("utf-8").lower()
+
+
+def read_word_file(file):
+    """
+    Reads a file full of words (one word per line) and puts them into a list.  Any lines that begin with a '#'
+    character are ignored.
+    :rtype: List of words read in from the file.
+    """
+    return list(iter_words(file))
+
+
+def sort_file(infile, outfile=None, chunk_size=100000, fan_in=MAX_FAN_IN):
+    """
+    Reads in a file line by line, and sorts the lines alphabetically.  At most chunk_size words are held in
+    memory at once: each chunk is sorted and spilled to a temporary file, and the chunks are merged, at most
+    fan_in at a time.
+    :param infile -  the name of the file that has lines to be sorted.
+    :param outfile - the name of the file to write the data to, if no file is provided writes to the same
+                     file name as inflie.
+    :return: None -  but does write out the sorted file
+    """
+    out = infile if outfile is None else outfile
+    directory = os.path.dirname(os.path.abspath(out))
+    chunk_files = []
+    try:
+        chunk = []
+        for word in iter_words(infile):
+            chunk.append(word)
+            if len(chunk) >= chunk_size:
+                chunk_files.append(_spill(sorted(chunk), directory))
+                chunk = []
+        chunk.sort()
+        # Merge the spilled chunks in passes until the rest can be merged with
+        # the last chunk at once.
+        while len(chunk_files) >= fan_in:
+            group = chunk_files[:fan_in]
+            merged = _spill(heapq.merge(*[_read_spilled(path) for path in group]), directory)
+            chunk_files = chunk_files[fan_in:] + [merged]
+            for path in group:
+                _remove(path)
+        streams = [_read_spilled(path) for path in chunk_files] + [iter(chunk)]
+        # Write to a temporary file first, because out may be the input file.
+        temp_path = _spill(heapq.merge(*streams), directory, suffix=".sorting")
+        os.replace(temp_path, out)
+    finally:
+        for path in chunk_files:
+            _remove(path)
+
+
+def _spill(words, directory, suffix=".chunk"):
+    """Write sorted words to a temporary file and return its path."""
+    fd, path = tempfile.mkstemp(dir=directory, suffix=suffix)
+    try:
+        with os.fdopen(fd, 'w', encoding="utf-8") as chunkfile:
+            for word in words:
+                chunkfile.write(word)
+                chunkfile.write("\n")
+    except BaseException:
+        _remove(path)
+        raise
+    return path
+
+
+def _read_spilled(path):
+    with open(path, 'r', encoding="utf-8") as chunkfile:
+        for line in chunkfile:
+            yield line[:-1]
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def load_word_files(word_files, dictionary=None):
+    """Build (or add to) a GameDictionary from word files.  word_files is a
+    dictionary mapping from a part of speech ("noun", "verb", ...) to a
+    file name or a list of file names."""
+    if dictionary is None:
+        dictionary = GameDictionary()
+    for part_of_speech, files in word_files.items():
+        if part_of_speech not in PARTS_OF_SPEECH:
+            raise ValueError("Unknown part of speech %r" % part_of_speech)
+        if isinstance(files, (str, bytes, os.PathLike)):
+            files = [files]
+        for file in files:
+            dictionary.add_words(part_of_speech, iter_words(file))
+    return dictionary
+
+
+def compile_vocabulary(word_files, outfile):
+    """Load word files (see load_word_files) and save the resulting dictionary
+    as a compiled vocabulary file.  Returns the GameDictionary."""
+    dictionary = load_word_files(word_files)
+    save_vocabulary(dictionary, outfile)
+    return dictionary
+
+
+def save_vocabulary(dictionary, outfile):
+    """Save a GameDictionary as a compiled vocabulary file."""
+    with open(outfile, 'wb') as vocabfile:
+        vocabfile.write(VOCABULARY_MAGIC)
+        marshal.dump((dictionary.size, dictionary.root), vocabfile)
+
+
+def load_vocabulary(file):
+    """Load a compiled vocabulary file into a GameDictionary."""
+    with open(file, 'rb') as vocabfile:
+        if vocabfile.read(len(VOCABULARY_MAGIC)) != VOCABULARY_MAGIC:
+            raise ValueError("%s is not a compiled vocabulary file" % file)
+        try:
+            size, root = marshal.load(vocabfile)
+        except (EOFError, ValueError, TypeError):
+            raise ValueError("%s is not a valid compiled vocabulary file" % file)
+        if not isinstance(size, int) or _count_entries(root) != size:
+            raise ValueError("%s is not a valid compiled vocabulary file" % file)
+    dictionary = GameDictionary()
+    dictionary.size = size
+    dictionary.root = root
+    return dictionary
+
+
+def _count_entries(root):
+    """Returns the number of entries in a trie loaded from a vocabulary file,
+    or None if it isn't shaped like a GameDictionary's trie: dictionaries
+    from words to nodes, with sets of parts of speech under the key None."""
+    if not isinstance(root, dict):
+        return None
+    count = 0
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        for word, child in node.items():
+            if word is None:
+                if not isinstance(child, set) or not child or not all(tag in PARTS_OF_SPEECH for tag in child):
+                    return None
+                count += 1
+            elif isinstance(word, str) and isinstance(child, dict):
+                stack.append(child)
+            else:
+                return None
+    return count
@@ -0,0 +1,97 @@
+from types import MappingProxyType
+
+from .game import Game
+from .items import Item
+from .locations import Location
+from .preconditions import Preconditions
+
+
+class WorldTemplate:
+    """A WorldTemplate is a world that is built once and then shared by every
+    game played in it.  Games record their changes in their own overlays
+    (see Game.location_items), so starting a new game doesn't rebuild any
+    Location or Item objects.
+
+    Once the template is built its locations and items are frozen: their
+    dictionaries are replaced by read-only views, so anything that tries to
+    change the shared world raises a TypeError instead of leaking state
+    between games.
+    """
+
+    def __init__(self, build_world):
+        # build_world is a function that builds the world and returns the
+        # Location where the player starts
+        self.start_at = build_world()
+        # Every Location and Item in the world, in a stable discovery order
+        self.locations, self.items = discover(self.start_at)
+        # Dictionaries mapping each Location and Item to its position in the
+        # lists above, which is how saved games refer to them
+        self.location_ids = {location: i for i, location in enumerate(self.locations)}
+        self.item_ids = {item: i for i, item in enumerate(self.items)}
+        # Connections are already read-only (see locations.Exits).
+        for location in self.locations:
+            location.items = freeze(location.items)
+            location.blocks = freeze(location.blocks)
+        for item in self.items:
+            item.commands = freeze(item.commands)
+
+    def new_game(self, output=None):
+        """Start a new game in this world."""
+        return Game(self.start_at, output, world=self)
+
+    def restore_game(self, data, output=None):
+        """Start a game in this world from a snapshot made by Game.snapshot."""
+        game = self.new_game(output)
+        game.restore(data)
+        return game
+
+
+# The read-only empty dictionary shared by every frozen Location and Item that
+# has nothing in it.  It is not locations.EMPTY, which adding to replaces.
+FROZEN_EMPTY = MappingProxyType({})
+
+
+def freeze(dictionary):
+    """Returns a read-only view of a dictionary."""
+    if not dictionary:
+        return FROZEN_EMPTY
+    return MappingProxyType(dictionary)
+
+
+def discover(start_at):
+    """Returns lists of every Location and Item reachable from start_at, in the
+    order they are found: locations by following connections breadth first,
+    and items by their locations and by the arguments and preconditions of
+    the actions and blocks that mention them."""
+    locations = []
+    items = []
+    seen = set()
+
+    def visit(value):
+        if isinstance(value, (Location, Item)):
+            if id(value) not in seen:
+                seen.add(id(value))
+                (locations if isinstance(value, Location) else items).append(value)
+                pending.append(value)
+        elif isinstance(value, (tuple, list)):
+            for member in value:
+                visit(member)
+        elif isinstance(value, dict):
+            for member in value.values():
+                visit(member)
+        elif isinstance(value, Preconditions):
+            visit(value.source)
+
+    pending = []
+    visit(start_at)
+    position = 0
+    while position < len(pending):
+        value = pending[position]
+        position += 1
+        if isinstance(value, Location):
+            visit(list(value.connections.values()))
+            visit(list(value.items.values()))
+            visit(list(value.blocks.values()))
+        else:
+            visit(list(value.commands.values()))
+    return locations, items
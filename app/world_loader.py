@@ -0,0 +1,330 @@
+"""Loading worlds from world files.
+
+A world file is JSON describing the locations, items, connections, actions
+and blocks of an adventure (see worlds/action_castle.json):
+
+    {
+      "format": 1,
+      "name": "Action Castle",
+      "start": "cottage",
+      "locations": {"cottage": {"name": "Cottage", "description": "..."}, ...},
+      "connections": [["cottage", "out", "garden_path"], ...],
+      "items": {
+        "lantern": {"name": "lantern", "description": "an oil lantern",
+                    "examine_text": "...", "start_at": "cottage",
+                    "actions": {"light lantern": {"function": "destroy_item", "item": "darkness",
+                                                  "text": "...", "preconditions": {...}}}},
+        ...
+      },
+      "blocks": [["drawbridge", "east", "There is a troll...", {"block_gone": "troll"}], ...]
+    }
+
+Locations and items are referred to by their keys.  Loading validates the
+file and compiles it into a plan of plain tuples that refer to locations and
+items by number.  The plan is cached in the user's cache directory (see
+default_cache_dir), under the SHA-256 of the file's contents, so later loads
+of an unchanged file skip parsing and validation and go straight to building
+the Location and Item objects.  Plans are saved with marshal, whose format
+belongs to the version of Python that wrote it, so the cache is private to
+the user and a cached plan that can't be read or built is ignored.
+"""
+import hashlib
+import json
+import marshal
+import os
+
+from .game import Game
+from .items import Item
+from .locations import Location
+from .preconditions import PRECONDITION_KINDS
+
+# The world file format this loader understands.
+WORLD_FORMAT = 1
+
+# Bumped whenever the compiled plan changes shape, so stale caches are ignored.
+PLAN_VERSION = 1
+
+# The special functions that actions may use, and the fields each one takes.
+ACTION_FUNCTIONS = {
+    "add_item_to_inventory": (Game.add_item_to_inventory, ("item", "text", "already_done")),
+    "create_item": (Game.create_item, ("item", "text", "already_done")),
+    "describe_something": (Game.describe_something, ("text",)),
+    "destroy_item": (Game.destroy_item, ("item", "text", "already_done")),
+    "end_game": (Game.end_game, ("text",)),
+    "perform_multiple_actions": (Game.perform_multiple_actions, ("actions",)),
+    "win_game": (Game.win_game, ("text",)),
+}
+
+# Preconditions whose value is a location rather than an item.
+LOCATION_PRECONDITIONS = {"in_location"}
+
+LOCATION_FIELDS = {"name", "description", "end_game"}
+ITEM_FIELDS = {"name", "description", "examine_text", "take_text", "start_at", "gettable",
+               "end_game", "aliases", "actions"}
+
+
+class WorldFormatError(ValueError):
+    """Raised when a world file is not valid."""
+
+
+def default_cache_dir():
+    """Returns the directory compiled plans are cached in: action_castle/worlds
+    in $XDG_CACHE_HOME, or in ~/.cache."""
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache_home, "action_castle", "worlds")
+
+
+def load_world(path, use_cache=True, cache_dir=None):
+    """Load a world file and return the Location where the player starts.
+    Compiled plans are cached in cache_dir (by default, default_cache_dir())."""
+    with open(path, 'rb') as worldfile:
+        data = worldfile.read()
+    cache_path = None
+    if use_cache:
+        digest = hashlib.sha256(data).hexdigest()
+        if cache_dir is None:
+            cache_dir = default_cache_dir()
+        cache_path = os.path.join(cache_dir, "%s.v%d.plan" % (digest, PLAN_VERSION))
+        plan = _read_cache(cache_path)
+        if plan is not None:
+            try:
+                return build_from_plan(plan)
+            except (TypeError, ValueError, IndexError, KeyError):
+                # A damaged cache; compile the world again.
+                pass
+    try:
+        spec = json.loads(data)
+    except ValueError as e:
+        raise WorldFormatError("%s is not valid JSON: %s" % (path, e))
+    plan = compile_world(spec)
+    if cache_path:
+        _write_cache(cache_path, plan)
+    return build_from_plan(plan)
+
+
+def build_world_from_spec(spec):
+    """Validate a world specification (a parsed world file) and build it.
+    Returns the Location where the player starts."""
+    return build_from_plan(compile_world(spec))
+
+
+def compile_world(spec):
+    """Validate a world specification and compile it into a plan: a tuple of
+    (PLAN_VERSION, locations, items, connections, actions, blocks, start)
+    where locations and items are referred to by their position in the
+    locations and items tuples.
+    Raises WorldFormatError if the specification is not valid."""
+    if not isinstance(spec, dict):
+        raise WorldFormatError("A world must be a JSON object")
+    if spec.get("format") != WORLD_FORMAT:
+        raise WorldFormatError("Unsupported world format %r (expected %d)" % (spec.get("format"), WORLD_FORMAT))
+    location_specs = _require(spec, "locations", dict, "the world")
+    item_specs = spec.get("items", {})
+    if not isinstance(item_specs, dict):
+        raise WorldFormatError("items must be an object")
+    location_ids = {key: i for i, key in enumerate(location_specs)}
+    item_ids = {key: i for i, key in enumerate(item_specs)}
+
+    def location_ref(key, where):
+        if not isinstance(key, str) or key not in location_ids:
+            raise WorldFormatError("%s refers to unknown location %r" % (where, key))
+        return location_ids[key]
+
+    def item_ref(key, where):
+        if not isinstance(key, str) or key not in item_ids:
+            raise WorldFormatError("%s refers to unknown item %r" % (where, key))
+        return item_ids[key]
+
+    def compile_preconditions(preconditions, where):
+        if not isinstance(preconditions, dict):
+            raise WorldFormatError("%s: preconditions must be an object" % where)
+        compiled = []
+        for kind, key in preconditions.items():
+            if kind not in PRECONDITION_KINDS:
+                raise WorldFormatError("%s: unknown precondition %r" % (where, kind))
+            if kind in LOCATION_PRECONDITIONS:
+                compiled.append((kind, "location", location_ref(key, where)))
+            else:
+                compiled.append((kind, "item", item_ref(key, where)))
+        return tuple(compiled)
+
+    def compile_action(action, where, step=False):
+        if not isinstance(action, dict):
+            raise WorldFormatError("%s must be an object" % where)
+        name = action.get("function")
+        if name not in ACTION_FUNCTIONS:
+            raise WorldFormatError("%s: unknown function %r" % (where, name))
+        fields = ACTION_FUNCTIONS[name][1]
+        # Only a whole action has preconditions, not the steps of one.
+        unknown = set(action) - set(fields) - ({"function"} if step else {"function", "preconditions"})
+        if unknown:
+            raise WorldFormatError("%s: unexpected fields %s" % (where, ", ".join(sorted(unknown))))
+        if fields == ("actions",):
+            steps = action.get("actions")
+            if not isinstance(steps, list):
+                raise WorldFormatError("%s: actions must be a list" % where)
+            arguments = tuple(compile_action(step, "%s step %d" % (where, n), step=True) for n, step in enumerate(steps))
+        elif fields == ("text",):
+            arguments = _text(action, "text", where)
+        else:
+            arguments = (item_ref(action.get("item"), where),
+                         _text(action, "text", where),
+                         _text(action, "already_done", where, default=""))
+        return (name, arguments)
+
+    locations = []
+    for key, location in location_specs.items():
+        where = "location %r" % key
+        _check_fields(location, LOCATION_FIELDS, where)
+        locations.append((_text(location, "name", where, default=key),
+                          _text(location, "description", where),
+                          bool(location.get("end_game", False))))
+
+    items = []
+    actions = []
+    for key, item in item_specs.items():
+        where = "item %r" % key
+        _check_fields(item, ITEM_FIELDS, where)
+        start_at = item.get("start_at")
+        aliases = item.get("aliases", [])
+        if not isinstance(aliases, list) or not all(isinstance(alias, str) for alias in aliases):
+            raise WorldFormatError("%s: aliases must be a list of strings" % where)
+        items.append((_text(item, "name", where, default=key),
+                      _text(item, "description", where),
+                      _text(item, "examine_text", where, default=""),
+                      _text(item, "take_text", where, default=""),
+                      None if start_at is None else location_ref(start_at, where),
+                      bool(item.get("gettable", True)),
+                      bool(item.get("end_game", False)),
+                      tuple(aliases)))
+        item_actions = item.get("actions", {})
+        if not isinstance(item_actions, dict):
+            raise WorldFormatError("%s: actions must be an object" % where)
+        for command, action in item_actions.items():
+            action_where = "%s action %r" % (where, command)
+            compiled = compile_action(action, action_where)
+            preconditions = compile_preconditions(action.get("preconditions", {}), action_where)
+            actions.append((item_ids[key], command, compiled, preconditions))
+
+    connections = []
+    for n, connection in enumerate(spec.get("connections", [])):
+        where = "connection %d" % n
+        if not isinstance(connection, list) or len(connection) not in (3, 4):
+            raise WorldFormatError("%s must be [from, direction, to] or [from, direction, to, travel description]" % where)
+        travel_description = connection[3] if len(connection) == 4 else ""
+        connections.append((location_ref(connection[0], where), str(connection[1]),
+                            location_ref(connection[2], where), str(travel_description)))
+
+    blocks = []
+    for n, block in enumerate(spec.get("blocks", [])):
+        where = "block %d" % n
+        if not isinstance(block, list) or len(block) != 4:
+            raise WorldFormatError("%s must be [location, direction, description, preconditions]" % where)
+        blocks.append((location_ref(block[0], where), str(block[1]), str(block[2]),
+                       compile_preconditions(block[3], where)))
+
+    start = location_ref(_require(spec, "start", str, "the world"), "start")
+    return (PLAN_VERSION, tuple(locations), tuple(items), tuple(connections),
+            tuple(actions), tuple(blocks), start)
+
+
+def build_from_plan(plan):
+    """Build the Location and Item objects described by a compiled plan and
+    return the Location where the player starts."""
+    version, location_plans, item_plans, connections, actions, blocks, start = plan
+    locations = [Location(name, description, end_game=end_game)
+                 for name, description, end_game in location_plans]
+    items = [Item(name, description, examine_text, take_text,
+                  start_at=None if start_at is None else locations[start_at],
+                  gettable=gettable, end_game=end_game, aliases=aliases)
+             for name, description, examine_text, take_text, start_at, gettable, end_game, aliases in item_plans]
+    for origin, direction, destination, travel_description in connections:
+        locations[origin].add_connection(direction, locations[destination], travel_description)
+    for item, command, (name, arguments), preconditions in actions:
+        items[item].add_action(command, ACTION_FUNCTIONS[name][0], build_arguments(name, arguments, items),
+                               preconditions=build_preconditions(preconditions, locations, items))
+    for location, direction, description, preconditions in blocks:
+        locations[location].add_block(direction, description,
+                                      build_preconditions(preconditions, locations, items))
+    return locations[start]
+
+
+def build_preconditions(preconditions, locations, items):
+    """Returns the preconditions dictionary for compiled preconditions.
+    locations and items are sequences of the world's Location and Item
+    objects, indexed by number."""
+    return {kind: (locations if refers_to == "location" else items)[i]
+            for kind, refers_to, i in preconditions}
+
+
+def build_arguments(name, arguments, items):
+    """Returns the arguments of the special function `name` for compiled
+    arguments."""
+    fields = ACTION_FUNCTIONS[name][1]
+    if fields == ("actions",):
+        return [(ACTION_FUNCTIONS[step][0], build_arguments(step, step_arguments, items))
+                for step, step_arguments in arguments]
+    if fields == ("text",):
+        return arguments
+    item, text, already_done = arguments
+    return (items[item], text, already_done)
+
+
+def _require(spec, field, kind, where):
+    if field not in spec:
+        raise WorldFormatError("%s is missing %r" % (where, field))
+    if not isinstance(spec[field], kind):
+        raise WorldFormatError("%s: %r must be a %s" % (where, field, kind.__name__))
+    return spec[field]
+
+
+def _text(spec, field, where, default=None):
+    value = spec.get(field, default)
+    if value is None:
+        raise WorldFormatError("%s is missing %r" % (where, field))
+    if not isinstance(value, str):
+        raise WorldFormatError("%s: %r must be a string" % (where, field))
+    return value
+
+
+def _check_fields(spec, allowed, where):
+    if not isinstance(spec, dict):
+        raise WorldFormatError("%s must be an object" % where)
+    unknown = set(spec) - allowed
+    if unknown:
+        raise WorldFormatError("%s: unexpected fields %s" % (where, ", ".join(sorted(unknown))))
+
+
+def _read_cache(cache_path):
+    try:
+        with open(cache_path, 'rb') as cachefile:
+            plan = marshal.load(cachefile)
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    if not isinstance(plan, tuple) or len(plan) != 7 or plan[0] != PLAN_VERSION:
+        return None
+    return plan
+
+
+def _write_cache(cache_path, plan):
+    """Save a plan to the cache.  Failing to write the cache is not an error."""
+    import tempfile
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(cache_path))
+    except OSError:
+        return
+    try:
+        try:
+            with os.fdopen(fd, 'wb') as cachefile:
+                marshal.dump(plan, cachefile)
+            os.replace(temp_path, cache_path)
+        except BaseException:
+            # Don't leave a half-written temporary file behind.
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
+            raise
+    except (OSError, ValueError):
+        pass
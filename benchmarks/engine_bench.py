@@ -0,0 +1,333 @@
+"""Benchmarks for the hot paths of the engine.
+
+Install the package first (pip install -e .), then run from the repository
+root:
+
+    python benchmarks/engine_bench.py --sizes 10 1000 100000 --out bench.json
+    python benchmarks/engine_bench.py --compare bench.json
+
+Results are written as JSON.  Every timing is the median time of one
+operation in nanoseconds, and server throughputs are in commands per
+second.  With --compare, any benchmark that got slower by more than
+--threshold is reported and the exit status is 1.
+"""
+import argparse
+import asyncio
+import contextlib
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from app.action_castle import build_world
+from app.class_parser import Parser
+from app.game import Game
+from app.items import Item
+from app.locations import Location
+from app.output import MemorySink
+from app.server import SessionManager
+from app.world import WorldTemplate
+
+
+def build_scaled_world(size, crowded=False):
+    """Build a world of `size` locations laid out in a grid, with `size` items.
+    Each item can be examined and taken, and has a special action guarded by
+    preconditions.  Every tenth location is blocked from the west until its
+    item is gone.  If crowded is True all of the items start in the first
+    location, otherwise there is one item per location."""
+    width = max(1, int(size ** 0.5))
+    locations = [Location("Room %d" % i, "You are in room %d." % i) for i in range(size)]
+    for i, location in enumerate(locations):
+        if i % width and i - 1 >= 0:
+            locations[i - 1].add_connection("east", location)
+        if i >= width:
+            locations[i - width].add_connection("south", location)
+    for i in range(size):
+        home = locations[0] if crowded else locations[i]
+        item = Item("item%d" % i, "item number %d" % i, "IT IS ITEM %d." % i, start_at=home)
+        item.add_action("use item%d" % i, Game.describe_something, ("You use item %d." % i),
+                        preconditions={"inventory_contains": item, "in_location": home})
+        if i % 10 == 5 and not crowded:
+            locations[i].add_block("west", "Item %d is in the way." % i, {"block_gone": item})
+    return locations[0]
+
+
+def measure(operation, budget=0.2, min_runs=5):
+    """Returns the median time in nanoseconds of one call of operation,
+    running it repeatedly for about `budget` seconds."""
+    samples = []
+    deadline = time.perf_counter() + budget
+    while len(samples) < min_runs or time.perf_counter() < deadline:
+        start = time.perf_counter_ns()
+        operation()
+        samples.append(time.perf_counter_ns() - start)
+    samples.sort()
+    return samples[len(samples) // 2]
+
+
+def bench_intents(template):
+    """Time parse_command for each intent in a world whose first location
+    has an item called item0 and an exit east or south."""
+    game = template.new_game(MemorySink())
+    parser = Parser(game)
+    exit = "east" if "east" in game.curr_location.connections else "south"
+    back = "west" if exit == "east" else "north"
+
+    def run(*commands):
+        def operation():
+            for command in commands:
+                parser.parse_command(command)
+            parser.command_history.clear()
+            game.output.take()
+        return operation
+
+    def ns_per_command(*commands):
+        return measure(run(*commands)) // len(commands)
+
+    results = {
+        "redescribe": ns_per_command("look"),
+        "inventory": ns_per_command("inventory"),
+        "examine": ns_per_command("examine item0"),
+        "take_drop": ns_per_command("take item0", "drop item0"),
+        "unknown": ns_per_command("dance a jig"),
+    }
+    parser.parse_command("take item0")
+    results["special"] = ns_per_command("use item0")
+    parser.parse_command("drop item0")
+    if exit in game.curr_location.connections:
+        results["direction"] = ns_per_command(exit, back)
+        results["sequence"] = ns_per_command("%s, %s" % (exit, back))
+    return results
+
+
+def bench_get_direction(template):
+    parser = Parser(template.new_game(MemorySink()))
+    return {
+        "alias": measure(lambda: parser.get_direction("n")),
+        "go_phrase": measure(lambda: parser.get_direction("go north")),
+        "miss": measure(lambda: parser.get_direction("examine the northern wall")),
+    }
+
+
+def bench_preconditions(template):
+    game = template.new_game(MemorySink())
+    location = game.curr_location
+    item = game.items_at()["item0"]
+    function, arguments, preconditions = item.commands["use item0"]
+    return {
+        "item_action_fail": measure(
+            lambda: Location.check_preconditions(preconditions, game, print_failure_reasons=False)),
+        "is_blocked": measure(lambda: [location.is_blocked(d, game) for d in location.connections]),
+    }
+
+
+def bench_session_memory(template, sessions=1000):
+    """Returns the bytes allocated per idle session (a Game and a Parser)."""
+    sessions = max(10, min(sessions, 10 ** 5 // max(1, len(template.items))))
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    games = [Parser(template.new_game(MemorySink())) for _ in range(sessions)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    allocated = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    del games
+    return allocated // sessions
+
+
+def bench_cold_start(runs=7):
+    """Returns the time from starting `python -m app` to its first prompt,
+    and the time to start a bare interpreter for comparison."""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    def first_prompt():
+        start = time.perf_counter_ns()
+        game = subprocess.Popen([sys.executable, "-m", "app"], cwd=root,
+                                stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        output = b""
+        while not output.rstrip().endswith(b">"):
+            chunk = os.read(game.stdout.fileno(), 4096)
+            if not chunk:
+                break
+            output += chunk
+        elapsed = time.perf_counter_ns() - start
+        game.stdin.close()
+        game.wait()
+        game.stdout.close()
+        return elapsed
+
+    def bare_interpreter():
+        start = time.perf_counter_ns()
+        subprocess.run([sys.executable, "-c", "pass"], check=True)
+        return time.perf_counter_ns() - start
+
+    return {
+        "first_prompt_ns": sorted(first_prompt() for _ in range(runs))[runs // 2],
+        "interpreter_ns": sorted(bare_interpreter() for _ in range(runs))[runs // 2],
+    }
+
+
+# A round trip of commands that leaves a session where it started.
+SERVER_COMMANDS = ("look", "take pole", "i", "drop pole", "go out", "go in")
+
+
+def bench_server(sessions=1000, clients=100, rounds=5):
+    """Measure the capacity of one server process (so one core).
+    Returns:
+      session_bytes      memory per idle session in a SessionManager
+      manager_turns_per_s  commands per second run through SessionManager,
+                         round robin over `sessions` live sessions
+      line_turns_per_s   commands per second over the line protocol, with
+                         `clients` connections sending at once; the
+                         clients run in the same process, so this is a
+                         lower bound"""
+    manager = SessionManager(max_sessions=sessions + clients)
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    ids = [manager.create()[0].session_id for _ in range(sessions)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    session_bytes = sum(stat.size_diff for stat in after.compare_to(before, "filename")) // sessions
+
+    start = time.perf_counter_ns()
+    for _ in range(rounds):
+        for command in SERVER_COMMANDS:
+            for session_id in ids:
+                manager.run_command(session_id, command)
+    elapsed = time.perf_counter_ns() - start
+    manager_turns = rounds * len(SERVER_COMMANDS) * sessions * 1e9 / elapsed
+    for session_id in ids:
+        manager.close(session_id)
+
+    async def play(port):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        await reader.readuntil(b">")
+        for _ in range(rounds):
+            for command in SERVER_COMMANDS:
+                writer.write(command.encode() + b"\n")
+                await reader.readuntil(b">")
+        writer.close()
+
+    async def line_protocol():
+        server = await asyncio.start_server(manager.handle_line_client, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        start = time.perf_counter_ns()
+        await asyncio.gather(*[play(port) for _ in range(clients)])
+        elapsed = time.perf_counter_ns() - start
+        server.close()
+        await server.wait_closed()
+        return rounds * len(SERVER_COMMANDS) * clients * 1e9 / elapsed
+
+    return {
+        "session_bytes": session_bytes,
+        "manager_turns_per_s": int(manager_turns),
+        "line_turns_per_s": int(asyncio.run(line_protocol())),
+    }
+
+
+def bench_world(name, build_world, quick=False):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter_ns()
+    template = WorldTemplate(build_world)
+    build_ns = time.perf_counter_ns() - start
+    world_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    result = {
+        "locations": len(template.locations),
+        "items": len(template.items),
+        "build_ns": build_ns,
+        "world_bytes": world_bytes,
+        "new_game_ns": measure(template.new_game),
+        "session_bytes": bench_session_memory(template),
+    }
+    if not quick:
+        result["intents_ns"] = bench_intents(template)
+        result["get_direction_ns"] = bench_get_direction(template)
+        result["preconditions_ns"] = bench_preconditions(template)
+    return result
+
+
+def run(sizes):
+    results = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "worlds": {},
+    }
+    results["cold_start"] = bench_cold_start()
+    results["server"] = bench_server()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        castle = bench_world("action_castle", build_world, quick=True)
+        castle["build_game_ns"] = measure(lambda: WorldTemplate(build_world))
+        results["worlds"]["action_castle"] = castle
+        for size in sizes:
+            for crowded in (False, True):
+                name = "%s_%d" % ("crowded" if crowded else "grid", size)
+                results["worlds"][name] = bench_world(
+                    name, lambda: build_scaled_world(size, crowded))
+    return results
+
+
+def flatten(results, prefix=""):
+    """Flatten nested result dictionaries into {"a.b.c": number}."""
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, prefix + key + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[prefix + key] = value
+    return flat
+
+
+def compare(old, new, threshold):
+    """Returns a list of (name, old, new) for every timing or memory figure
+    that grew, and every throughput that fell, by more than threshold (a
+    fraction)."""
+    old_flat = flatten(old)
+    regressions = []
+    for name, value in sorted(flatten(new).items()):
+        if name not in old_flat or old_flat[name] <= 0:
+            continue
+        if name.endswith("_ns") or "ns." in name or name.endswith("bytes"):
+            if value > old_flat[name] * (1 + threshold):
+                regressions.append((name, old_flat[name], value))
+        elif name.endswith("_per_s"):
+            if value < old_flat[name] / (1 + threshold):
+                regressions.append((name, old_flat[name], value))
+    return regressions
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Benchmark the text adventure engine.")
+    arg_parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1000, 100000],
+                            help="number of locations and items in the synthetic worlds")
+    arg_parser.add_argument("--out", help="write the results to this JSON file")
+    arg_parser.add_argument("--compare", help="compare against an earlier results file")
+    arg_parser.add_argument("--threshold", type=float, default=0.25,
+                            help="slowdown that counts as a regression (default 0.25 = 25%%)")
+    args = arg_parser.parse_args(argv)
+
+    results = run(args.sizes)
+    text = json.dumps(results, indent=2, sort_keys=True)
+    if args.out:
+        with open(args.out, "w") as out:
+            out.write(text + "\n")
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), results, args.threshold)
+        for name, old, new in regressions:
+            print("REGRESSION %s: %s -> %s" % (name, old, new), file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
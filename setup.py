@@ -1,19 +1,25 @@
 try:
     from setuptools import setup
-except ImportError
+except ImportError:
     from distutils.core import setup
 
 config = {
-    'description': 'My Project'
-    'author': 'Joseph Catterson'
-    'url': 'URL to get it at'
-    'download_url': 'Where to download it.'
-    'author_email': 'Joe_catterson@hotmail.com'
-    'version': '0.1'
-    'install_requires': ['nose']
-    'packages': ['NAME']
-    'scripts': []
-    'name': 'projectname'
+    'description': 'A text adventure engine, and the Action Castle adventure',
+    'author': 'Joseph Catterson',
+    'url': 'URL to get it at',
+    'download_url': 'Where to download it.',
+    'author_email': 'Joe_catterson@hotmail.com',
+    'version': '0.1',
+    'install_requires': [],
+    'packages': ['app'],
+    'package_data': {'app': ['worlds/*.json']},
+    'entry_points': {
+        'console_scripts': [
+            'action-castle = app.action_castle:main',
+            'action-castle-server = app.server:main',
+        ],
+    },
+    'name': 'textgenadventures',
 }
 
-setup(**config)
\ No newline at end of file
+setup(**config)
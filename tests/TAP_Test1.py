@@ -1,4 +1,4 @@
-import TAP
+from app import TAP
 
 
 def read_word_file(file):
@@ -49,9 +49,10 @@ commands = ['quit']
 nouns = ['goblin', 'rock']
 prepositions = ['above', 'at', 'with']
 verbs = ['throw', 'attack', 'look']
-game_dictionary = taps.GameDictionary(adjectives, commands, nouns, prepositions, verbs)
+game_dictionary = TAP.GameDictionary(adjectives, commands, nouns, prepositions, verbs)
 
 # Create Parser
 ip = TAP.InputParser(game_dictionary)
 
-# Parse Sentence.
\ No newline at end of file
+# Parse Sentence.
+ip.parse_input(sentence)
@@ -0,0 +1,82 @@
+import pytest
+
+from app.action_castle import build_game, build_world
+from app.class_parser import Parser
+from app.game import Game
+from app.items import Item
+from app.locations import Location
+from app.output import MemorySink
+from app.world import WorldTemplate
+
+
+@pytest.fixture(autouse=True)
+def world_cache(monkeypatch, tmp_path_factory):
+    """Keep compiled world plans out of the user's cache directory."""
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path_factory.mktemp("cache")))
+
+
+@pytest.fixture
+def castle():
+    """A new game of Action Castle whose output is kept in a MemorySink."""
+    return build_game(MemorySink())
+
+
+@pytest.fixture
+def castle_parser(castle):
+    """A Parser for the castle game."""
+    return Parser(castle)
+
+
+@pytest.fixture
+def castle_template():
+    """A WorldTemplate of Action Castle of its own."""
+    return WorldTemplate(build_world)
+
+
+@pytest.fixture
+def garden_game():
+    """A hall with a lamp, a garden north of it with a rosebush that a rose
+    can be picked from, and a shed out of the garden."""
+    hall = Location("Hall", "You are in a hall.")
+    garden = Location("Garden", "You are in a garden.")
+    shed = Location("Shed", "You are in a shed.")
+    hall.add_connection("north", garden)
+    garden.add_connection("out", shed)
+    lamp = Item("lamp", "a lamp", "AN OLD LAMP.", start_at=hall)
+    rosebush = Item("rosebush", "a rosebush", "IT HAS ONE ROSE.", start_at=garden, gettable=False)
+    rose = Item("rose", "a red rose", "IT SMELLS GOOD.")
+    rosebush.add_action("Pick Rose", Game.add_item_to_inventory, (rose, "You pick the rose.", "Already picked."))
+    lamp.add_action("light lamp", Game.describe_something, ("The lamp glows."))
+    return Game(hall, MemorySink())
+
+
+@pytest.fixture
+def bridge_game():
+    """A hall, a garden north of it, and a bridge east of the garden that a
+    troll blocks until it is hit.  The tower beyond the bridge can also be
+    reached from the hall through a pit, which ends the game."""
+    hall = Location("Hall", "You are in a hall.")
+    garden = Location("Garden", "You are in a garden.")
+    bridge = Location("Bridge", "You are on a bridge.")
+    tower = Location("Tower", "You are in a tower.")
+    pit = Location("Pit", "You fall into a pit. THE END.", end_game=True)
+    hall.add_connection("north", garden)
+    garden.add_connection("east", bridge)
+    bridge.add_connection("east", tower)
+    hall.add_connection("down", pit)
+    pit.add_connection("up", tower)
+    troll = Item("troll", "a troll", "A MEAN TROLL.", start_at=bridge, gettable=False)
+    troll.add_action("hit troll", Game.destroy_item, (troll, "The troll runs away.", ""))
+    bridge.add_block("east", "The troll won't let you pass.", preconditions={"block_gone": troll})
+    return Game(hall, output=MemorySink())
+
+
+@pytest.fixture
+def throne_room():
+    """A hall with a throne that can only be sat on with the crown.  Returns
+    (game, crown, throne)."""
+    hall = Location("Hall", "You are in a hall.")
+    crown = Item("crown", "a crown")
+    throne = Item("throne", "a throne", start_at=hall, gettable=False)
+    throne.add_action("sit on throne", Game.end_game, ("You rule!"), preconditions={"in_inventory": crown})
+    return Game(hall, MemorySink()), crown, throne
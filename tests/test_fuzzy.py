@@ -0,0 +1,79 @@
+from app import fuzzy
+from app.class_parser import Parser
+from app.fuzzy import BKTree, edit_distance
+from app.game import Game
+from app.items import Item
+from app.locations import Location
+from app.output import MemorySink
+
+
+def test_bk_tree_finds_close_words():
+    assert edit_distance("kitten", "sitting") == 3
+    assert edit_distance("", "abc") == 3
+    words = ["look", "lock", "inventory", "pick rose", "catch fish with pole", "north"]
+    tree = BKTree(words + ["look"])
+    assert tree.size == len(words)
+    assert tree.search("lok", 1) == [(1, "lock"), (1, "look")]
+    assert tree.best("lok", 1) is None
+    assert tree.best("pick rse", 2) == "pick rose"
+    assert tree.best("cath fish with pole", 2) == "catch fish with pole"
+    assert tree.best("south", 1) is None
+    for word in ["lo", "nrth", "inventroy", "zzz"]:
+        expected = sorted((edit_distance(word, other), other) for other in words
+                          if edit_distance(word, other) <= 2)
+        assert tree.search(word, 2) == expected
+
+
+def test_parser_corrects_misspelled_commands_and_nouns(castle, castle_parser):
+    game, parser = castle, castle_parser
+    parser.parse_command("tkae pole")
+    assert "pole" in game.inventory
+    assert game.output.take() == "(take pole)\nYou take the pole.\n"
+    parser.parse_command("otu")
+    assert game.curr_location.name == "Garden Path"
+    game.output.take()
+    parser.parse_command("pick rse")
+    assert "rose" in game.inventory
+    parser.parse_command("drop rosse")
+    assert "rose" not in game.inventory
+    assert game.output.take().endswith("(rose)\nYou drop the rose.\n")
+    parser.parse_command("dance wildly")
+    assert game.output.take() == "I'm not sure what you want to do.\n"
+
+
+def test_corrections_are_remembered(monkeypatch, castle, castle_parser):
+    game, parser = castle, castle_parser
+    # A sequence reuses the classification of a repeated command, and its
+    # correction is shown each time.
+    parser.parse_command("tkae pole, drop pole, tkae pole")
+    assert game.output.take().count("(take pole)\nYou take the pole.\n") == 2
+    parser.parse_command("dance wildly")
+    distances = []
+    monkeypatch.setattr(fuzzy, "edit_distance", lambda a, b: distances.append((a, b)) or edit_distance(a, b))
+    parser.parse_command("dance wildly")
+    assert distances == []
+    assert game.output.take() == "I'm not sure what you want to do.\n" * 2
+
+
+def test_misspelled_names_beat_shorter_exact_ones():
+    hall = Location("Hall", "You are in a hall.")
+    Item("guard", "a guard", "HE IS AWAKE.", start_at=hall, gettable=False)
+    Item("unconcious guard", "a sleeping guard", "HE IS ASLEEP.", start_at=hall, gettable=False)
+    game = Game(hall, MemorySink())
+    parser = Parser(game)
+    parser.parse_command("examine unconscious guard")
+    assert game.output.take() == "(unconcious guard)\nHE IS ASLEEP.\n"
+    parser.parse_command("examine the guard")
+    assert game.output.take() == "HE IS AWAKE.\n"
+
+
+def test_longer_inventory_names_win_when_taking():
+    hall = Location("Hall", "You are in a hall.")
+    Item("guard", "a guard", "HE IS AWAKE.", start_at=hall, gettable=False)
+    game = Game(hall, MemorySink())
+    game.add_to_inventory(Item("guard key", "a key"))
+    parser = Parser(game)
+    parser.parse_command("take guard key")
+    assert game.output.take() == "You already have the guard key.\n"
+    parser.parse_command("take guard")
+    assert game.output.take() == "You cannot take the guard.\n"
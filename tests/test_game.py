@@ -0,0 +1,102 @@
+from app import action_castle, nouns
+from app.game import Game
+from app.items import Item
+from app.locations import Location
+from app.output import MemorySink
+
+
+def test_special_command_index_tracks_scope():
+    hall = Location("Hall", "You are in a hall.")
+    cellar = Location("Cellar", "You are in a cellar.")
+    hall.add_connection("down", cellar)
+    candle = Item("candle", "a candle", start_at=hall)
+    ghost = Item("ghost", "a ghost", start_at=cellar, gettable=False)
+    crown = Item("crown", "a crown")
+    candle.add_action("light candle", Game.describe_something, ("It flickers."))
+    ghost.add_action("light candle", Game.create_item, (crown, "The ghost flees.", ""))
+    game = Game(hall)
+
+    assert game.find_special_command("light candle") == (candle, "light candle")
+    game.add_to_inventory(candle)
+    game.remove_item_from_location(candle)
+    assert list(game.special_commands) == ["light candle"]
+
+    game.curr_location = cellar
+    assert game.find_special_command("light candle") == (ghost, "light candle")
+    game.remove_item_from_location(ghost)
+    assert game.find_special_command("light candle") == (candle, "light candle")
+    game.remove_from_inventory(candle)
+    assert game.special_commands == {}
+
+
+def test_turn_output_is_buffered_until_flushed():
+    hall = Location("Hall", "You are in a hall.")
+    hall.add_connection("north", Location("Garden", "You are in a garden."))
+    hall.add_connection("east", Location("Study", "You are in a study."))
+    Item("lamp", "a lamp", start_at=hall)
+    sink = MemorySink()
+    game = Game(hall, output=sink)
+
+    game.describe()
+    assert sink.turns == []
+    assert sink.flush() == "You are in a hall.\nExits: North, East\nYou see: \na lamp\n"
+    assert sink.take() == "You are in a hall.\nExits: North, East\nYou see: \na lamp\n"
+    assert sink.take() == ""
+
+
+def test_location_renderings_are_cached_until_something_changes():
+    hall = Location("Hall", "You are in a hall.")
+    cellar = Location("Cellar", "You are in a cellar.")
+    hall.add_connection("down", cellar)
+    candle = Item("candle", "a candle", start_at=hall)
+    candle.add_action("light candle", Game.describe_something, ("It flickers."))
+    game = Game(hall, MemorySink())
+
+    game.describe()
+    game.output.flush()
+    text = "You are in a hall.\nExits: Down\nYou see: \na candle\n\t light candle\n"
+    assert game.output.take() == text
+    assert game.render_location() is game.render_location() is hall.rendered[1]
+
+    game.print_commands = False
+    assert game.render_location() == "You are in a hall.\nExits: Down\nYou see: \na candle\n"
+    game.remove_item_from_location(candle)
+    assert game.render_location() == "You are in a hall.\nExits: Down\n"
+    assert hall.rendered[1] != game.render_location()
+    hall.add_connection("up", cellar)
+    assert game.render_location() == "You are in a hall.\nExits: Down, Up\n"
+
+
+def test_noun_indexes_are_updated_in_place(monkeypatch):
+    hall = Location("Hall", "You are in a hall.")
+    for i in range(2000):
+        Item("coin %d" % i, "coin number %d" % i, start_at=hall)
+    game = Game(hall)
+    coin = game.find_item_at(["coin", "7"])[0]
+    game.remove_item_from_location(coin)
+    game.add_to_inventory(coin)
+    assert game.find_item_at(["coin", "8"])[0].name == "coin 8"
+    assert game.find_item_in_inventory(["coin", "7"]) == (coin, 2)
+    # Now both indexes exist, and taking and dropping only indexes the one item.
+    tokenized = []
+    monkeypatch.setattr(nouns, "tokenize", lambda text: tokenized.append(text) or text.split())
+    game.remove_from_inventory(coin)
+    game.add_item_to_location(coin)
+    assert game.find_item_at(["coin", "7"]) == (coin, 2)
+    assert game.find_item_in_inventory(["coin", "7"]) == (None, 0)
+    assert tokenized == ["coin 7", "coin 7"]
+
+
+def test_game_loop_quits_and_stops_at_end_of_input(monkeypatch, capsys):
+    for lines in (["look", "Q", "look"], ["look"]):
+        commands = iter(lines)
+
+        def fake_input(prompt):
+            for command in commands:
+                return command
+            raise EOFError
+
+        monkeypatch.setattr("builtins.input", fake_input)
+        action_castle.main()
+        assert capsys.readouterr().out.endswith("THE GAME HAS ENDED.\n")
+        assert list(commands) == lines[2:]
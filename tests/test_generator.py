@@ -0,0 +1,27 @@
+import json
+
+import pytest
+
+from app.generator import generate_world, generate_world_spec
+from app.world import WorldTemplate
+
+
+def test_generated_worlds_are_reproducible_and_connected():
+    spec = generate_world_spec(size=200, branching=3, item_density=2, block_density=0.2, seed=7)
+    assert spec == generate_world_spec(size=200, branching=3, item_density=2, block_density=0.2, seed=7)
+    assert spec != generate_world_spec(size=200, branching=3, item_density=2, block_density=0.2, seed=8)
+    assert json.loads(json.dumps(spec)) == spec
+
+    template = WorldTemplate(lambda: generate_world(size=200, branching=3, item_density=2,
+                                                    block_density=0.2, seed=7))
+    assert len(template.locations) == 200
+    exits = sum(len(location.connections) for location in template.locations)
+    assert 2.5 <= exits / 200.0 <= 3.0
+    blocks = sum(len(location.blocks) for location in template.locations)
+    assert blocks == len(spec["blocks"]) > 0
+
+
+def test_worlds_need_a_location():
+    assert len(generate_world_spec(size=1)["locations"]) == 1
+    with pytest.raises(ValueError, match="at least one location"):
+        generate_world_spec(size=0)
@@ -0,0 +1,74 @@
+from app.instrumentation import BUCKET_BOUNDS, Histogram, TurnMetrics, TurnObserver
+
+
+class Recorder(TurnObserver):
+    def __init__(self):
+        self.commands = []
+        self.turns = []
+
+    def before_turn(self, parser, command):
+        self.commands.append(command)
+
+    def after_turn(self, parser, turn):
+        self.turns.append(turn)
+
+
+def test_observers_see_each_turn(castle, castle_parser):
+    game, parser = castle, castle_parser
+    recorder = Recorder()
+    parser.add_observer(recorder)
+    parser.parse_command("light lantern")
+    parser.parse_command("take pole")
+    parser.parse_command("dance")
+    parser.remove_observer(recorder)
+    parser.parse_command("look")
+
+    assert recorder.commands == ["light lantern", "take pole", "dance"]
+    special, take, unknown = recorder.turns
+    assert special.intent == "special" and special.item.name == "lantern"
+    assert special.preconditions_met is False
+    assert take.intent == "take" and take.item.name == "pole" and take.preconditions_met is None
+    assert "pole" in game.inventory
+    assert unknown.intent is None and unknown.item is None
+    assert list(take.phases) == ["classify", "resolve", "execute", "render"]
+    assert take.total_ns == sum(take.phases.values())
+
+
+def test_histograms_and_exports(castle_parser):
+    histogram = Histogram()
+    for value in range(1, 101):
+        histogram.record(value * 1000)
+    assert histogram.count == 100 and histogram.max == 100000
+    assert 50000 <= histogram.quantile(0.5) <= 60000
+    assert 99000 <= histogram.quantile(0.99) <= 100000
+    assert Histogram().quantile(0.5) == 0
+
+    metrics = TurnMetrics()
+    parser = castle_parser
+    parser.add_observer(metrics)
+    parser.parse_command("light lantern")
+    parser.parse_command("take pole, light lantern")
+    summary = metrics.to_dict()
+    assert summary["intents"]["special"]["total"]["count"] == 1
+    assert summary["intents"]["sequence"]["execute"]["count"] == 1
+    assert summary["preconditions"] == {"special": {"failed": 1}}
+    text = metrics.to_prometheus()
+    assert "# TYPE adventure_turn_phase_seconds histogram" in text
+    assert 'adventure_preconditions_total{intent="special",outcome="failed"} 1' in text
+    assert text.count('le="+Inf"} 1') == 10
+    # Every series has every bucket, so the set of series never changes.
+    buckets = [line for line in text.splitlines() if 'intent="special",phase="total"' in line and "_bucket" in line]
+    assert len(buckets) == len(BUCKET_BOUNDS) + 1
+    counts = [int(line.rsplit(" ", 1)[1]) for line in buckets]
+    assert counts == sorted(counts) and counts[-1] == 1
+
+
+def test_items_are_resolved_once_per_turn(monkeypatch, castle, castle_parser):
+    game, parser = castle, castle_parser
+    parser.add_observer(TurnMetrics())
+    lookups = []
+    find_item_at = game.find_item_at
+    monkeypatch.setattr(game, "find_item_at", lambda words: lookups.append(words) or find_item_at(words))
+    parser.parse_command("take pole")
+    assert lookups == [["take", "pole"]]
+    assert "pole" in game.inventory
@@ -0,0 +1,59 @@
+from app.journal import Journal, apply_delta, read_records, replay_directory, state_delta
+from app.server import SessionManager
+
+
+def test_sessions_are_recovered_from_the_journal(tmp_path):
+    journal = Journal(str(tmp_path), commit_interval=0)
+    manager = SessionManager(journal=journal)
+    first, _ = manager.create()
+    second, _ = manager.create()
+    ended, _ = manager.create()
+    manager.run_command(first.session_id, "take pole")
+    manager.run_command(first.session_id, "out")
+    manager.run_command(first.session_id, "pick rose")
+    manager.run_command(second.session_id, "take lantern")
+    manager.run_command(ended.session_id, "take potion")
+    journal.wait()
+    # The process "crashes" here: the journal is never closed.
+
+    recovered = SessionManager(journal=Journal(str(tmp_path), commit_interval=0))
+    assert recovered.recover() == 2
+    game = recovered.get(first.session_id).game
+    assert game.curr_location.name == "Garden Path"
+    assert sorted(game.inventory) == ["pole", "rose"]
+    assert "pole" not in game.items_at(game.world.start_at)
+    assert recovered.get(second.session_id).game.visited == second.game.visited
+    assert recovered.get(ended.session_id) is None
+    text, _ = recovered.run_command(first.session_id, "i")
+    assert text.startswith("You have:")
+    recovered.journal.close()
+
+
+def test_compaction_and_torn_records(tmp_path):
+    journal = Journal(str(tmp_path), segment_bytes=200, commit_interval=0)
+    manager = SessionManager(journal=journal)
+    session, _ = manager.create()
+    for command in ["take pole", "out", "s", "n", "in", "drop pole", "take pole"]:
+        manager.run_command(session.session_id, command)
+    journal.wait()
+    assert len(journal.segments()) >= 2
+    before = replay_directory(str(tmp_path))
+    compacted = journal.compact()
+    assert [record["s"] for record in read_records(compacted)] == [session.session_id]
+    assert replay_directory(str(tmp_path)) == before
+    journal.close()
+
+    # A record cut short by a crash is ignored.
+    with open(journal.segments()[-1], 'ab') as segment:
+        segment.write(b'{"s": "%s", "end"' % session.session_id.encode())
+    assert replay_directory(str(tmp_path)) == before
+
+
+def test_deltas_hold_only_changes():
+    old = {"v": 1, "at": 0, "inv": [], "items": {"0": [1]}, "seen": [0], "quiet": 1}
+    new = {"v": 1, "at": 2, "inv": [3], "items": {"0": [1], "2": []}, "seen": [0, 2]}
+    delta = state_delta(old, new)
+    assert delta == {"at": 2, "inv": [3], "items": {"2": []}, "seen": [2], "quiet": 0}
+    apply_delta(old, delta)
+    assert {key: value for key, value in old.items() if key != "quiet"} == new
+    assert state_delta(new, new) == {}
@@ -0,0 +1,66 @@
+from app.class_parser import Parser
+from app.game import Game
+from app.items import Item
+from app.locations import Location
+from app.output import MemorySink
+
+
+def test_travel_uses_shortest_open_path(bridge_game):
+    game = bridge_game
+    parser = Parser(game)
+    parser.parse_command("n, e")
+    game.output.take()
+    assert parser.get_player_intent("go to the hall") == "travel"
+    parser.parse_command("go to the hall")
+    assert game.curr_location.name == "Hall"
+    assert "You travel west, south." in game.output.take()
+    parser.parse_command("travel to tower")
+    assert game.curr_location.name == "Hall"
+    assert "You don't know the way to tower." in game.output.take()
+
+
+def test_routes_follow_blocks_and_avoid_end_game_locations(bridge_game):
+    game = bridge_game
+    parser = Parser(game)
+    parser.parse_command("n, e")
+    route = parser.navigator.route
+    bridge = game.curr_location
+    hall = bridge.connections["west"].connections["south"]
+    # The tower hasn't been visited yet, and the troll blocks the way.
+    assert route(hall, bridge) == ["north", "east"]
+    parser.parse_command("hit troll")
+    parser.parse_command("e")
+    tower = game.curr_location
+    assert tower.name == "Tower"
+    # The route through the pit is shorter, but the pit ends the game.
+    assert route(hall, tower) == ["north", "east", "east"]
+    trees = len(parser.navigator.trees)
+    parser.parse_command("go to hall")
+    assert len(parser.navigator.trees) == trees + 1
+    assert parser.parse_command("go to tower") is False
+    assert game.curr_location is tower
+
+
+def test_blocks_in_other_locations_are_checked_where_they_are():
+    entrance = Location("Entrance", "You are at the entrance.")
+    antechamber = Location("Antechamber", "You are in an antechamber.")
+    bedroom = Location("Bedroom", "You are in a bedroom.")
+    closet = Location("Closet", "You are in a closet.")
+    den = Location("Den", "You are in a den.")
+    entrance.add_connection("east", antechamber)
+    antechamber.add_connection("east", bedroom)
+    antechamber.add_connection("north", closet)
+    closet.add_connection("east", den)
+    den.add_connection("south", bedroom)
+    troll = Item("troll", "a troll", "A MEAN TROLL.", start_at=antechamber, gettable=False)
+    antechamber.add_block("east", "The troll won't let you pass.", preconditions={"block_gone": troll})
+    game = Game(entrance, output=MemorySink())
+    parser = Parser(game)
+    parser.parse_command("e, n, e, s, n, w, s, w")
+    assert game.curr_location is entrance
+    # The troll is still in the antechamber, even though the player isn't.
+    assert antechamber.is_blocked("east", game)
+    game.output.take()
+    parser.parse_command("go to bedroom")
+    assert game.curr_location is bedroom
+    assert "You travel east, north, east, south." in game.output.take()
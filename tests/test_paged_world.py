@@ -0,0 +1,53 @@
+import gc
+
+from app.action_castle import WORLD_FILE
+from app.class_parser import Parser
+from app.generator import generate_world_spec
+from app.output import MemorySink
+from app.paged_world import PagedWorld, compile_paged_world, write_paged_world
+from app.world_loader import compile_world
+
+WINNING_TRANSCRIPT = ["take pole", "out", "south", "catch fish with pole", "eat fish"]
+
+
+def play(world, commands):
+    game = world.new_game(MemorySink())
+    parser = Parser(game)
+    outputs = []
+    for command in commands:
+        parser.parse_command(command)
+        outputs.append(game.output.take())
+    return game, outputs
+
+
+def test_paged_world_plays_like_the_template(tmp_path, castle_template):
+    path = str(tmp_path / "castle.pages")
+    compile_paged_world(WORLD_FILE, path)
+    paged = PagedWorld(path, radius=1)
+    commands = ["look", "out", "x rosebush", "pick rose", "n", "s", "in", "i"] + WINNING_TRANSCRIPT
+    paged_game, paged_outputs = play(paged, commands)
+    template_game, template_outputs = play(castle_template, commands)
+    assert paged_outputs == template_outputs
+    assert paged_game.won and template_game.won
+    assert sorted(paged_game.inventory) == sorted(template_game.inventory)
+    restored = paged.restore_game(paged_game.snapshot(), MemorySink())
+    assert restored.curr_location is paged_game.curr_location
+    assert paged.locations[0] is paged.start_at
+
+
+def test_only_nearby_locations_are_built_and_cold_ones_are_dropped(tmp_path):
+    path = str(tmp_path / "generated.pages")
+    write_paged_world(compile_world(generate_world_spec(size=2000, item_density=0.2, seed=4)), path)
+    paged = PagedWorld(path, radius=1, memory_budget=2000)
+    assert len(paged._live_locations) < 50
+    game = paged.new_game(MemorySink())
+    parser = Parser(game)
+    first = game.curr_location
+    for _ in range(30):
+        parser.parse_command(next(iter(game.curr_location.connections)))
+    assert paged.cached_bytes <= 2000 or len(paged._cache) == 1
+    gc.collect()
+    # Locations the game refers to are kept, and never built twice.
+    assert game.curr_location in game.visited and first in game.visited
+    assert paged.locations[paged.location_ids[first]] is first
+    assert len(paged._live_locations) < 200
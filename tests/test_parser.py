@@ -0,0 +1,99 @@
+from app.class_parser import Parser
+from app.game import Game
+from app.items import Item
+from app.locations import Location
+from app.output import MemorySink
+
+
+def test_phrase_and_verb_intents(garden_game):
+    parser = Parser(garden_game)
+    assert parser.get_player_intent("look") == "redescribe"
+    assert parser.get_player_intent("I") == "inventory"
+    assert parser.get_player_intent("x lamp") == "examine"
+    assert parser.get_player_intent("get  lamp") == "take"
+    assert parser.get_player_intent("drop lamp") == "drop"
+    assert parser.get_player_intent("n, look") == "sequence"
+    assert parser.get_player_intent("dance") is None
+
+
+def test_direction_aliases_match_whole_commands(garden_game):
+    parser = Parser(garden_game)
+    assert parser.get_direction("N") == "north"
+    assert parser.get_direction("go north") == "north"
+    assert parser.get_direction("northeast") is None
+    assert parser.get_direction("eat the feast") is None
+
+
+def test_custom_exits_and_special_commands_follow_scope(garden_game):
+    game = garden_game
+    parser = Parser(game)
+    assert parser.get_player_intent("light lamp") == "special"
+    assert parser.get_player_intent("pick rose") is None
+    parser.parse_command("take lamp")
+    parser.parse_command("north")
+    assert game.curr_location.name == "Garden"
+    assert parser.get_direction("go out") == "out"
+    assert parser.get_player_intent("pick rose") == "special"
+    assert parser.get_player_intent("light lamp") == "special"
+    parser.parse_command("pick rose")
+    assert "rose" in game.inventory
+
+
+def test_exit_resolver_is_rebuilt_when_connections_change():
+    hall = Location("Hall", "You are in a hall.")
+    loft = Location("Loft", "You are in a loft.")
+    assert hall.resolve_exit("ladder") is None
+    hall.add_connection("ladder", loft)
+    assert hall.resolve_exit("go ladder") == "ladder"
+    assert loft.resolve_exit("n") is None
+    hall.add_connection("south", loft)
+    assert loft.resolve_exit("go n") == "north"
+    assert loft.resolve_exit("north") == "north"
+    assert loft.resolve_exit("northwest") is None
+
+
+def test_nouns_match_whole_words_and_prefer_longer_names():
+    hall = Location("Hall", "You are in a hall.")
+    Item("rosebush", "a rosebush", "IT HAS ONE ROSE.", start_at=hall, gettable=False)
+    Item("guard", "a guard", "HE IS AWAKE.", start_at=hall, gettable=False)
+    Item("unconcious guard", "a sleeping guard", "HE IS ASLEEP.", start_at=hall, gettable=False)
+    Item("lantern", "a lantern", "IT IS OLD.", start_at=hall, aliases=["lamp"])
+    game = Game(hall, MemorySink())
+    parser = Parser(game)
+
+    parser.parse_command("take rose")
+    assert game.output.take() == "You can't find it.\n"
+    parser.parse_command("examine the unconcious guard")
+    assert game.output.take() == "HE IS ASLEEP.\n"
+    parser.parse_command("examine guard")
+    assert game.output.take() == "HE IS AWAKE.\n"
+    parser.parse_command("examine nothing")
+    assert game.output.take() == "You don't see anything special.\n"
+    parser.parse_command("get lamp")
+    assert "lantern" in game.inventory and "lantern" not in game.items_at()
+    parser.parse_command("take lantern")
+    assert game.output.take() == "You take the lantern.\nYou already have the lantern.\n"
+    parser.parse_command("drop lamp")
+    assert "lantern" in game.items_at()
+
+
+def test_sequences_run_as_one_turn_and_stop_when_the_game_ends():
+    hall = Location("Hall", "You are in a hall.")
+    cliff = Location("Cliff", "You fall off the cliff. THE END.", end_game=True)
+    hall.add_connection("east", cliff)
+    Item("lamp", "a lamp", "AN OLD LAMP.", start_at=hall)
+    game = Game(hall, MemorySink())
+    parser = Parser(game)
+
+    assert parser.parse_command("x lamp, , x lamp, e, take lamp") is True
+    assert parser.command_history == ["x lamp, , x lamp, e, take lamp"]
+    assert "lamp" not in game.inventory
+    assert len(game.output.turns) == 1
+    output = game.output.take()
+    assert output.startswith("AN OLD LAMP.\nAN OLD LAMP.\n")
+    assert output.rstrip().endswith("THE END.")
+
+    cache = {}
+    assert parser.classify("look", cache) == ("redescribe", "look")
+    assert parser.classify("dance", cache) == (None, "dance")
+    assert list(cache) == ["look"]
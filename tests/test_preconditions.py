@@ -0,0 +1,26 @@
+import pytest
+
+from app.preconditions import Preconditions
+
+
+def test_in_inventory_is_enforced(throne_room):
+    game, crown, throne = throne_room
+    assert not throne.do_action("sit on throne", game)
+    assert game.output.flush() == "You don't have the crown\nCannot perform the action sit on throne\n"
+    game.add_to_inventory(crown)
+    assert throne.do_action("sit on throne", game)
+
+
+def test_checks_are_silent_and_stop_at_the_first_failure(throne_room):
+    game, crown, throne = throne_room
+    calls = []
+    preconditions = Preconditions({"inventory_contains": crown, "location_has_item": throne})
+    preconditions.checks = ((lambda g, v, l: calls.append(v) or False, crown, "no"),) + preconditions.checks
+    assert not preconditions.check(game)
+    assert calls == [crown]
+    assert game.output.flush() == ""
+
+
+def test_unknown_preconditions_are_rejected():
+    with pytest.raises(ValueError, match="wearing"):
+        Preconditions({"wearing": None})
@@ -0,0 +1,23 @@
+from app.replay import find_transcripts, read_transcript, replay, replay_files
+
+
+def test_replay_stops_at_the_end_of_the_game():
+    result = replay(["take pole", "go out", "w", "look"], name="cliff")
+    assert result.ended
+    assert result.final_location == "Cliff"
+    assert result.unplayed == 1
+    assert len(result.timings) == 3
+    assert result.output.startswith("You are standing in a small cottage.")
+    assert result.error is None
+
+
+def test_replay_files_in_a_pool(tmp_path):
+    (tmp_path / "a.txt").write_text("# a comment\n>take lantern\n\ngo out\n")
+    (tmp_path / "nested").mkdir()
+    (tmp_path / "nested" / "b.txt").write_text("take potion\n")
+    paths = find_transcripts([str(tmp_path)])
+    assert read_transcript(paths[0]) == ["take lantern", "go out"]
+
+    results = list(replay_files(paths, workers=2, chunksize=1))
+    assert [r.final_location for r in results] == ["Garden Path", "Cottage"]
+    assert [r.ended for r in results] == [False, True]
@@ -0,0 +1,121 @@
+import asyncio
+import json
+
+import pytest
+
+from app.instrumentation import TurnMetrics
+from app.server import MAX_HEADERS, SessionLimitError, SessionManager
+
+
+def test_sessions_are_independent_and_limited():
+    manager = SessionManager(max_sessions=2)
+    first, text = manager.create()
+    assert text.startswith("You are standing in a small cottage.")
+    second, _ = manager.create()
+    with pytest.raises(SessionLimitError):
+        manager.create()
+
+    text, ended = manager.run_command(first.session_id, "take pole")
+    assert text == "You take the pole.\n" and not ended
+    assert "pole" in first.game.inventory
+    assert "pole" not in second.game.inventory
+
+    text, ended = manager.run_command(second.session_id, "take potion")
+    assert ended and manager.get(second.session_id) is None
+
+
+def test_idle_sessions_expire():
+    manager = SessionManager(idle_timeout=60)
+    session, _ = manager.create()
+    session.last_active -= 120
+    assert manager.expire_idle() == 1
+    assert manager.sessions == {}
+
+
+def test_line_and_json_protocols():
+    async def scenario():
+        manager = SessionManager()
+        line_server = await asyncio.start_server(manager.handle_line_client, "127.0.0.1", 0)
+        http_server = await asyncio.start_server(manager.handle_http_client, "127.0.0.1", 0)
+        line_port = line_server.sockets[0].getsockname()[1]
+        http_port = http_server.sockets[0].getsockname()[1]
+
+        reader, writer = await asyncio.open_connection("127.0.0.1", line_port)
+        greeting = await reader.readuntil(b">")
+        writer.write(b"i\n")
+        reply = await reader.readuntil(b">")
+        writer.close()
+
+        async def post(path, payload=None):
+            reader, writer = await asyncio.open_connection("127.0.0.1", http_port)
+            body = json.dumps(payload).encode() if payload is not None else b""
+            writer.write(b"POST %s HTTP/1.1\r\nConnection: close\r\nContent-Length: %d\r\n\r\n"
+                         % (path.encode(), len(body)) + body)
+            response = await reader.read()
+            writer.close()
+            head, _, body = response.partition(b"\r\n\r\n")
+            return int(head.split()[1]), json.loads(body)
+
+        status, created = await post("/sessions")
+        status2, moved = await post("/sessions/" + created["session"], {"command": "go out"})
+        # A body that is too big is refused before it is read.
+        reader, writer = await asyncio.open_connection("127.0.0.1", http_port)
+        writer.write(b"POST /sessions/%s HTTP/1.1\r\nContent-Length: 1000000000\r\n\r\n"
+                     % created["session"].encode())
+        head, _, body = (await reader.read()).partition(b"\r\n\r\n")
+        writer.close()
+        status3, refused = int(head.split()[1]), json.loads(body)
+        line_server.close()
+        http_server.close()
+        return greeting, reply, status, created, status2, moved, status3, refused
+
+    greeting, reply, status, created, status2, moved, status3, refused = asyncio.run(scenario())
+    assert greeting.startswith(b"You are standing in a small cottage.")
+    assert reply == b"You don't have anything.\n>"
+    assert status == 201 and created["output"].startswith("You are standing")
+    assert status2 == 200 and moved["output"].startswith("You are standing on a lush garden path.")
+    assert status3 == 413 and "too large" in refused["error"]
+
+
+def test_line_clients_are_told_when_their_session_expires():
+    async def scenario():
+        manager = SessionManager(idle_timeout=60)
+        server = await asyncio.start_server(manager.handle_line_client, "127.0.0.1", 0)
+        reader, writer = await asyncio.open_connection("127.0.0.1", server.sockets[0].getsockname()[1])
+        await reader.readuntil(b">")
+        # The reaper drops the session while the client is between commands.
+        for session in manager.sessions.values():
+            session.last_active -= 120
+        manager.expire_idle()
+        writer.write(b"i\n")
+        goodbye = await reader.read()
+        writer.close()
+        server.close()
+        return goodbye
+
+    assert asyncio.run(scenario()) == b"You have been idle too long. Goodbye.\n"
+
+
+def test_too_many_headers_are_refused():
+    async def scenario():
+        manager = SessionManager()
+        server = await asyncio.start_server(manager.handle_http_client, "127.0.0.1", 0)
+        reader, writer = await asyncio.open_connection("127.0.0.1", server.sockets[0].getsockname()[1])
+        writer.write(b"POST /sessions HTTP/1.1\r\n" + b"X-Padding: x\r\n" * (MAX_HEADERS + 1))
+        head, _, body = (await reader.read()).partition(b"\r\n\r\n")
+        writer.close()
+        server.close()
+        return int(head.split()[1]), json.loads(body)
+
+    status, refused = asyncio.run(scenario())
+    assert status == 431 and "headers" in refused["error"]
+
+
+def test_turn_metrics_are_served():
+    manager = SessionManager(metrics=TurnMetrics())
+    session, _ = manager.create()
+    manager.run_command(session.session_id, "take pole")
+    status, stats = manager.handle_json_request("GET", "/stats", b"")
+    assert stats["turns"]["intents"]["take"]["total"]["count"] == 1
+    status, text = manager.handle_json_request("GET", "/metrics", b"")
+    assert 'adventure_turn_phase_seconds_count{intent="take",phase="execute"} 1' in text
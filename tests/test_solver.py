@@ -0,0 +1,58 @@
+from app.action_castle import build_world
+from app.generator import generate_world_spec
+from app.solver import solve
+from app.world_loader import build_world_from_spec
+
+
+def test_action_castle_is_winnable():
+    result = solve(build_world)
+    assert result.complete
+    assert result.winning_transcript == ["take pole", "out", "south", "catch fish with pole", "eat fish"]
+    assert ["take potion"] in result.losing_transcripts
+    assert ["out", "west"] in result.losing_transcripts
+    assert result.unreachable_locations == [] and result.unreachable_items == []
+
+
+SPEC = {
+    "format": 1,
+    "start": "hall",
+    "locations": {
+        "hall": {"name": "Hall", "description": "A hall."},
+        "vault": {"name": "Vault", "description": "A vault."},
+        "attic": {"name": "Attic", "description": "An attic nobody can reach."},
+    },
+    "connections": [["hall", "north", "vault"], ["hall", "up", "attic"]],
+    "blocks": [["hall", "up", "The ladder is broken.", {"block_gone": "ladder"}]],
+    "items": {
+        "gem": {"name": "gem", "description": "a gem", "start_at": "vault",
+                "actions": {"sell gem": {"function": "win_game", "text": "Rich!",
+                                         "preconditions": {"inventory_contains": "gem"}},
+                            "swallow gem": {"function": "destroy_item", "item": "gem", "text": "Gulp."}}},
+        "hat": {"name": "hat", "description": "a hat", "start_at": "attic"},
+        "ladder": {"name": "ladder", "description": "a broken ladder", "start_at": "hall", "gettable": False},
+    },
+}
+
+
+def build_small_world():
+    return build_world_from_spec(SPEC)
+
+
+def build_generated_world():
+    return build_world_from_spec(generate_world_spec(size=12, item_density=0.2, seed=4))
+
+
+def test_dead_ends_and_unreachable_parts():
+    result = solve(build_small_world)
+    assert result.winning_transcript == ["north", "take gem", "sell gem"]
+    assert result.unreachable_locations == ["Attic"]
+    assert result.unreachable_items == ["hat"]
+    assert min(result.dead_end_transcripts, key=len) == ["north", "swallow gem"]
+
+
+def test_parallel_search_matches_serial_search():
+    serial = solve(build_generated_world)
+    parallel = solve(build_generated_world, workers=2, batch_size=4)
+    assert serial.complete and parallel.complete
+    assert parallel.states == serial.states
+    assert len(parallel.winning_transcript) == len(serial.winning_transcript)
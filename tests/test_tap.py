@@ -0,0 +1,44 @@
+from app import TAP
+from app.class_parser import Parser
+from app.output import MemorySink
+
+
+def make_parser():
+    dictionary = TAP.GameDictionary(adjectives=["dirty", "shiny", "old"], commands=["quit"],
+                                    nouns=["goblin", "rock", "fishing pole", "old"],
+                                    prepositions=["above", "at", "with"],
+                                    verbs=["throw", "attack", "look"])
+    return TAP.InputParser(dictionary)
+
+
+def test_parse_sentence_into_slots():
+    parsed = make_parser().parse_input("Throw Dirty rock at that mangey old goblin")
+    assert parsed.verb == "throw"
+    assert parsed.adjectives == ["dirty"]
+    assert parsed.noun == "rock"
+    assert parsed.preposition == "at"
+    assert parsed.object_adjectives == ["old"]
+    assert parsed.object == "goblin"
+    assert parsed.unknown == ["that", "mangey"]
+    assert parsed.canonical() == "throw rock at goblin"
+
+
+def test_multi_word_entries_commands_and_merging():
+    parser = make_parser()
+    assert parser.parse_input("attack with the fishing pole").object == "fishing pole"
+    assert parser.parse_input("QUIT").command == "quit"
+    assert parser.parse_input("attack the old").noun == "old"
+
+    other = TAP.GameDictionary(nouns=["troll"], verbs=["throw"])
+    merged = parser.game_dictionary.merge(other)
+    assert "troll" in merged and "fishing pole" in merged and "fishing" not in merged
+
+
+def test_parser_front_end_reduces_wordy_commands(castle_template):
+    template = castle_template
+    game = template.new_game(MemorySink())
+    parser = Parser(game, TAP.InputParser(TAP.dictionary_for_world(template)))
+    parser.parse_command("please take the fishing pole")
+    assert "pole" in game.inventory
+    parser.parse_command("now examine my pole")
+    assert game.output.take().endswith("A SIMPLE FISHING POLE.\n")
@@ -0,0 +1,55 @@
+import marshal
+
+import pytest
+
+from app import TAP
+from app.vocabulary import VOCABULARY_MAGIC, compile_vocabulary, iter_words, load_vocabulary, read_word_file, sort_file
+
+
+def test_read_and_external_sort(tmp_path):
+    words = tmp_path / "nouns.txt"
+    words.write_text("# nouns\nRock\n\ngoblin\nfishing pole\napple\nzebra\n  \nbanana\n")
+    assert read_word_file(str(words)) == ["rock", "goblin", "fishing pole", "apple", "zebra", "banana"]
+    sort_file(str(words), chunk_size=2)
+    assert words.read_text() == "apple\nbanana\nfishing pole\ngoblin\nrock\nzebra\n"
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["nouns.txt"]
+
+    # More chunks than can be merged at once are merged in several passes.
+    words.write_text("".join("word%03d\n" % i for i in reversed(range(50))))
+    sort_file(str(words), chunk_size=3, fan_in=4)
+    assert words.read_text() == "".join("word%03d\n" % i for i in range(50))
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["nouns.txt"]
+
+    empty = tmp_path / "empty.txt"
+    empty.write_text("")
+    assert list(iter_words(str(empty))) == []
+
+
+def test_compiled_vocabulary_round_trip(tmp_path):
+    (tmp_path / "nouns.txt").write_text("goblin\nrock\n")
+    (tmp_path / "more_nouns.txt").write_text("troll\n")
+    (tmp_path / "verbs.txt").write_text("throw\n")
+    (tmp_path / "preps.txt").write_text("at\n")
+    compiled = tmp_path / "vocab.bin"
+    compile_vocabulary({"noun": [str(tmp_path / "nouns.txt"), str(tmp_path / "more_nouns.txt")],
+                        "verb": str(tmp_path / "verbs.txt"),
+                        "preposition": str(tmp_path / "preps.txt")}, str(compiled))
+
+    dictionary = load_vocabulary(str(compiled))
+    assert len(dictionary) == 5 and "troll" in dictionary
+    parsed = TAP.InputParser(dictionary).parse_input("throw rock at troll")
+    assert parsed.canonical() == "throw rock at troll"
+
+
+@pytest.mark.parametrize("trie", [
+    (1, {"rock": []}),
+    (1, {"rock": {None: {"weapon"}}}),
+    (1, {7: {None: {"noun"}}}),
+    (2, {"rock": {None: {"noun"}}}),
+    (1, {"rock": {None: {"noun"}}}, None),
+])
+def test_damaged_vocabulary_files_are_rejected(tmp_path, trie):
+    damaged = tmp_path / "vocab.bin"
+    damaged.write_bytes(VOCABULARY_MAGIC + marshal.dumps(trie))
+    with pytest.raises(ValueError):
+        load_vocabulary(str(damaged))
@@ -0,0 +1,84 @@
+import pytest
+
+from app.action_castle import build_game
+from app.class_parser import Parser
+from app.game import Game
+from app.locations import EMPTY, NO_EXITS, Location
+from app.output import MemorySink
+from app.world import WorldTemplate
+
+
+def test_games_share_the_template_without_sharing_state(castle_template):
+    template = castle_template
+    first = template.new_game(MemorySink())
+    second = template.new_game(MemorySink())
+    assert first.curr_location is second.curr_location
+
+    Parser(first).parse_command("take lantern")
+    assert "lantern" in first.inventory
+    assert "lantern" not in first.items_at()
+    assert "lantern" in second.items_at()
+    assert "lantern" in template.start_at.items
+    assert list(first.location_items) == [template.start_at]
+    assert second.location_items == {}
+
+
+def test_template_is_read_only_and_fully_discovered(castle_template):
+    template = castle_template
+    assert len(template.locations) == 14
+    names = [item.name for item in template.items]
+    assert "rose" in names and "crown" in names and names.count("princess") == 3
+    with pytest.raises(TypeError):
+        template.start_at.add_item("rose", template.items[0])
+
+
+def test_build_game_reuses_one_world():
+    assert build_game(MemorySink()).curr_location is build_game(MemorySink()).curr_location
+
+
+def test_snapshot_round_trip(castle_template):
+    template = castle_template
+    game = template.new_game(MemorySink())
+    parser = Parser(game)
+    for command in ["take pole", "take lantern", "go out", "s", "catch fish with pole", "n"]:
+        parser.parse_command(command)
+    data = game.snapshot()
+    assert len(data) < 100
+
+    restored = template.restore_game(data, MemorySink())
+    assert restored.curr_location is game.curr_location
+    assert list(restored.inventory) == ["pole", "lantern", "fish"]
+    assert restored.visited == game.visited
+    assert restored.location_items == game.location_items
+    assert restored.special_commands.keys() == game.special_commands.keys()
+    assert restored.snapshot() == data
+    assert template.restore_game(template.new_game().snapshot()).location_items == {}
+
+
+def test_snapshots_keep_the_win(castle_template):
+    game = castle_template.new_game(MemorySink())
+    game.won = True
+    assert castle_template.restore_game(game.snapshot(), MemorySink()).won
+    game.restore(castle_template.new_game(MemorySink()).snapshot())
+    assert not game.won
+
+    hall = Location("Hall", "You are in a hall.")
+    with pytest.raises(ValueError):
+        Game(hall, MemorySink()).snapshot()
+
+
+def test_locations_and_items_are_compact():
+    hall = Location("Hall", "You are in a hall.")
+    cellar = Location("Cellar", "You are in a cellar.")
+    assert not hasattr(hall, "__dict__")
+    assert hall.connections is NO_EXITS and hall.items is EMPTY and hall.blocks is EMPTY
+    hall.add_connection("down", cellar, "You climb down.")
+    hall.add_connection("ladder", cellar)
+    assert list(hall.connections.items()) == [("down", cellar), ("ladder", cellar)]
+    assert hall.travel_descriptions == {"down": "You climb down.", "ladder": ""}
+    assert cellar.connections["up"] is hall and "down" not in cellar.connections
+    assert cellar.resolve_exit("u") == "up"
+    assert Location("Attic", "").connections is NO_EXITS
+    template = WorldTemplate(lambda: hall)
+    assert template.locations == [hall, cellar]
+    assert not cellar.items and cellar.items is not EMPTY
@@ -0,0 +1,82 @@
+import json
+import marshal
+import os
+
+import pytest
+
+from app.world_loader import WorldFormatError, build_world_from_spec, load_world
+
+SPEC = {
+    "format": 1,
+    "start": "hall",
+    "locations": {
+        "hall": {"name": "Hall", "description": "You are in a hall."},
+        "pit": {"name": "Pit", "description": "You fall into a pit.", "end_game": True},
+    },
+    "connections": [["hall", "down", "pit", "You jump."]],
+    "items": {
+        "rope": {"name": "rope", "description": "a rope", "start_at": "hall",
+                 "actions": {"tie rope": {"function": "describe_something", "text": "Tied.",
+                                          "preconditions": {"inventory_contains": "rope",
+                                                            "in_location": "hall"}}}},
+    },
+    "blocks": [["hall", "down", "It's too deep.", {"inventory_contains": "rope"}]],
+}
+
+
+def test_build_world_from_spec():
+    hall = build_world_from_spec(SPEC)
+    assert hall.connections["down"].end_game
+    assert hall.connections["down"].connections["up"] is hall
+    assert hall.travel_descriptions["down"] == "You jump."
+    rope = hall.items["rope"]
+    assert list(rope.commands) == ["tie rope"]
+    assert hall.get_block_description("down") == "It's too deep."
+
+
+def test_invalid_worlds_are_rejected():
+    for change, message in [
+            ({"start": "attic"}, "unknown location 'attic'"),
+            ({"format": 2}, "Unsupported world format"),
+            ({"blocks": [["hall", "down", "x", {"wearing": "rope"}]]}, "unknown precondition"),
+            ({"items": {"rope": {"name": "rope", "description": "a rope", "colour": "red"}}}, "unexpected fields colour"),
+            ({"items": {"rope": {"description": "a rope", "actions": {"x": {"function": "explode"}}}}}, "unknown function"),
+            ({"items": {"rope": {"description": "a rope", "aliases": ["cord", 7]}}}, "aliases must be a list of strings"),
+            ({"start": ["hall"]}, "'start' must be a str"),
+            ({"connections": [["hall", "up", ["hall"]]]}, "unknown location ['hall']"),
+            ({"items": {"rope": {"description": "a rope", "start_at": {"hall": 1}}}}, "unknown location"),
+            ({"items": {"rope": {"description": "a rope", "actions": {"x": {
+                "function": "perform_multiple_actions",
+                "actions": [{"function": "describe_something", "text": "x", "preconditions": {}}]}}}}},
+             "unexpected fields preconditions"),
+    ]:
+        with pytest.raises(WorldFormatError) as error:
+            build_world_from_spec(dict(SPEC, **change))
+        assert message in str(error.value)
+
+
+def test_compiled_worlds_are_cached_by_content(tmp_path):
+    path = tmp_path / "world.json"
+    cache_dir = str(tmp_path / "cache")
+    path.write_text(json.dumps(SPEC))
+    assert load_world(str(path), cache_dir=cache_dir).name == "Hall"
+    cached = os.listdir(cache_dir)
+    assert len(cached) == 1
+
+    # Changing the file changes its hash, so it is compiled and cached again.
+    path.write_text(json.dumps(dict(SPEC, locations=dict(SPEC["locations"], hall={"name": "Attic", "description": "x"}))))
+    assert load_world(str(path), cache_dir=cache_dir).name == "Attic"
+    assert len(os.listdir(cache_dir)) == 2
+
+
+def test_damaged_caches_are_ignored(tmp_path):
+    path = tmp_path / "world.json"
+    cache_dir = str(tmp_path / "cache")
+    path.write_text(json.dumps(SPEC))
+    load_world(str(path), cache_dir=cache_dir)
+    cache_path = os.path.join(cache_dir, os.listdir(cache_dir)[0])
+    for damage in (b"\x80\x04\x95 not a plan", marshal.dumps((1, (), (), (), (), (), 5))):
+        with open(cache_path, "wb") as cachefile:
+            cachefile.write(damage)
+        assert load_world(str(path), cache_dir=cache_dir).name == "Hall"
+    assert os.listdir(cache_dir) == [os.path.basename(cache_path)]